@@ -0,0 +1,42 @@
+# app/lib/clustering.py
+# 按缩放级别在服务端把车位聚成网格簇：格子按 Web Mercator 像素坐标切，
+# 每个格子在屏幕上约 cell_px 像素见方，不管搜索半径多大，发到浏览器的点数都有上限。
+import numpy as np
+import pandas as pd
+
+TILE_SIZE = 256
+CLUSTER_COLUMNS = ["lat", "lon", "bays", "free", "occupied"]
+
+def mercator_px(lat, lon, zoom):
+    """经纬度 -> 该缩放级别下的世界像素坐标（和 Leaflet 的 EPSG:3857 一致）"""
+    scale = TILE_SIZE * 2.0 ** zoom
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0 * scale
+    s = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)) * scale
+    return x, y
+
+def grid_clusters(df, zoom, cell_px=60):
+    """
+    车位 -> 每个非空格子一行：位置是格子里车位的平均坐标，bays / free / occupied 是数量。
+    按车位数从多到少排列。
+    """
+    if df.empty:
+        return pd.DataFrame({c: pd.Series(dtype=float if c in ("lat", "lon") else int) for c in CLUSTER_COLUMNS})
+    lat = df["lat"].to_numpy(dtype=float)
+    lon = df["lon"].to_numpy(dtype=float)
+    occ = df["is_occupied"].fillna(False).to_numpy(dtype=bool)
+    x, y = mercator_px(lat, lon, zoom)
+    cx = np.floor(x / cell_px).astype(np.int64)
+    cy = np.floor(y / cell_px).astype(np.int64)
+    _, cell = np.unique(cx * (1 << 31) + cy, return_inverse=True)
+    bays = np.bincount(cell)
+    occupied = np.bincount(cell, weights=occ).astype(np.int64)
+    out = pd.DataFrame({
+        "lat": np.bincount(cell, weights=lat) / bays,
+        "lon": np.bincount(cell, weights=lon) / bays,
+        "bays": bays,
+        "free": bays - occupied,
+        "occupied": occupied,
+    })
+    return out.sort_values("bays", ascending=False, kind="stable").reset_index(drop=True)
@@ -1,60 +1,202 @@
 # app/lib/db.py
-import os
-from pathlib import Path
-import streamlit as st
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
+import io
+import threading
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from sqlalchemy import text
 
-def _build_db_url() -> str:
+# URL / 连接池配置 / engine 创建在 db_config（不依赖 streamlit，ETL 也用它）
+from lib.db_config import TimedQueuePool, build_db_url, create_engine, setting
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """主库 engine：页面里需要读到最新数据的地方用它（ETL 用 etl/db_load.py 自己的 engine）"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                db_url = build_db_url()
+                if db_url is None:
+                    raise RuntimeError("No database URL configured - running in demo mode")
+                _engine = create_engine(db_url, setting("DB_STATEMENT_TIMEOUT_MS"))
+    return _engine
+
+# ---------- 只读副本 ----------
+_replica_engine = None
+_replica_lock = threading.Lock()
+_replica = {"url": None, "checked_at": 0.0, "healthy": False, "lag_s": None, "error": None}
+
+# 副本的 WAL 接收进程状态和复制延迟（秒）。primary_lsn 是检查前主库的 pg_current_wal_lsn()：
+#   - 已经回放到这个位置：没有落后
+#   - 拿不到主库位置（只配了副本）且收到的 WAL 都已回放：按多久没收到主库的消息算
+#   - 其它情况按最后回放的事务有多久
+# 不能只比较副本自己的 receive / replay 位置：接收进程断开后 receive 不再前进，replay 追上它就会一直显示 0。
+_LAG_SQL = """
+    SELECT pg_is_in_recovery(),
+           (SELECT status FROM pg_stat_wal_receiver),
+           CASE WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN %(primary_lsn)s::pg_lsn IS NOT NULL
+                     AND pg_last_wal_replay_lsn() >= %(primary_lsn)s::pg_lsn THEN 0
+                WHEN %(primary_lsn)s::pg_lsn IS NULL
+                     AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                     THEN extract(epoch FROM now() - (SELECT last_msg_receipt_time FROM pg_stat_wal_receiver))
+                ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+           END
+"""
+
+def _primary_lsn():
+    """主库当前的 WAL 位置；没配主库或连不上时返回 None（只按副本自己的信息判断）"""
+    try:
+        with get_engine().connect() as conn:
+            return conn.exec_driver_sql("SELECT pg_current_wal_lsn()::text").scalar()
+    except Exception:
+        return None
+
+def _check_replica():
     """
-    读取 DB URL 的优先级：
-    1) Streamlit secrets（Cloud 或本地 secrets.toml）
-    2) 项目根目录的 .env（显式加载）
-    3) 环境变量（兜底）
-    并统一追加 sslmode=require；兼容 postgres:// 前缀。
-    如果没有找到数据库URL，返回None以启用演示模式。
+    连上副本查复制延迟。以下情况都视为不可用：出错、WAL 接收进程不在 streaming 状态（断开或不存在）、
+    延迟超过 DB_REPLICA_MAX_LAG_S。
     """
-    # 1) 试图从 secrets 读取（本地没有 secrets.toml 时会抛异常，所以 try）
-    url = None
+    global _replica_engine
     try:
-        url = st.secrets.get("DATABASE_URL")
-    except Exception:
-        url = None
-
-    # 2) 如果没有，从项目根 .env 读取
-    if not url:
-        # db.py 位于 app/lib/db.py -> 项目根是上上级目录
-        project_root = Path(__file__).resolve().parents[2]
-        env_path = project_root / ".env"
-        if env_path.exists():
-            load_dotenv(env_path, override=False)
-        url = os.getenv("DATABASE_URL")
-
-    # 3) 兜底：环境变量（即使没加载 .env）
-    if not url:
-        url = os.getenv("DATABASE_URL")
-
-    # 如果仍然没有URL，返回None以启用演示模式
-    if not url or url.strip() == "":
+        if _replica_engine is None:
+            _replica_engine = create_engine(_replica["url"], setting("DB_STATEMENT_TIMEOUT_MS"))
+        primary_lsn = _primary_lsn()   # 先取主库位置，副本回放到它就说明没有落后
+        with _replica_engine.connect() as conn:
+            in_recovery, receiver, lag = conn.exec_driver_sql(_LAG_SQL, {"primary_lsn": primary_lsn}).one()
+        lag = float(lag) if lag is not None else None
+        if in_recovery and receiver != "streaming":
+            healthy, error = False, f"WAL receiver is {receiver or 'not running'}"
+        elif lag is None or lag > setting("DB_REPLICA_MAX_LAG_S"):
+            healthy, error = False, f"replica lag {lag}s exceeds limit"
+        else:
+            healthy, error = True, None
+        _replica.update(healthy=healthy, lag_s=lag, error=error)
+    except Exception as e:
+        _replica.update(healthy=False, lag_s=None, error=str(e)[:200])
+    _replica["checked_at"] = time.monotonic()
+
+def get_read_engine():
+    """
+    只读查询（页面上的搜索、历史、统计）用的 engine：
+    配置了 DATABASE_REPLICA_URL 且副本健康、延迟在允许范围内时走副本，否则回退到主库。
+    健康检查结果缓存 DB_REPLICA_CHECK_S 秒，不会每次查询都多一次往返。
+    """
+    if _replica["url"] is None:
+        _replica["url"] = build_db_url("DATABASE_REPLICA_URL") or ""
+    if not _replica["url"]:
+        return get_engine()
+    with _replica_lock:
+        if time.monotonic() - _replica["checked_at"] > setting("DB_REPLICA_CHECK_S"):
+            _check_replica()
+        healthy = _replica["healthy"]
+    if healthy:
+        return _replica_engine
+    try:
+        return get_engine()
+    except RuntimeError:
+        # 只配了副本没配主库：副本不健康也只能用它
+        if _replica_engine is None:
+            raise
+        return _replica_engine
+
+def replica_status():
+    """副本的最近一次健康检查结果；没有配置副本时返回 None"""
+    if not _replica["url"]:
         return None
+    return {"healthy": _replica["healthy"], "lag_s": _replica["lag_s"], "error": _replica["error"],
+            "checked_s_ago": time.monotonic() - _replica["checked_at"] if _replica["checked_at"] else None}
 
-    # 兼容 postgres://
-    if url.startswith("postgres://"):
-        url = url.replace("postgres://", "postgresql://", 1)
+def pool_stats(replica=False):
+    """当前连接池状态（replica=True 时看只读副本的池）；还没建过 engine（或演示模式）时返回 None"""
+    engine = _replica_engine if replica else _engine
+    if engine is None:
+        return None
+    pool = engine.pool
+    stats = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": setting("DB_MAX_OVERFLOW"),
+    }
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                "checkouts": pool.checkouts,
+                "timeouts": pool.timeouts,
+                "wait_ms_total": pool.wait_total * 1000,
+                "wait_ms_avg": pool.wait_total * 1000 / pool.checkouts if pool.checkouts else 0.0,
+                "wait_ms_max": pool.wait_max * 1000,
+            })
+    return stats
 
-    # 统一追加 SSL
-    if "sslmode=" not in url:
-        url += ("&" if "?" in url else "?") + "sslmode=require"
+# ---------- 列式读取 ----------
+# Postgres 类型 OID -> Arrow 类型；没列出的按字符串读
+_ARROW_TYPES = {
+    16: pa.bool_(),                    # bool
+    20: pa.int64(),                    # int8
+    21: pa.int16(),                    # int2
+    23: pa.int32(),                    # int4
+    700: pa.float32(),                 # float4
+    701: pa.float64(),                 # float8
+    1700: pa.float64(),                # numeric
+    1082: pa.date32(),                 # date
+    1114: pa.timestamp("us"),          # timestamp
+    1184: pa.timestamp("us", "UTC"),   # timestamptz（会话时区设成 UTC 输出）
+}
+FLOAT32_COLUMNS = ("lat", "lon")       # 只用来画图的坐标用 float32 就够（约 1 米精度），体积减半
+_describe_cache = {}                   # (查询文本（参数占位符形式）, float32_coords) -> [(列名, Arrow 类型)]
 
-    return url
+def _describe(cur, query, sql, float32_coords):
+    """结果集的列名和类型只和查询文本有关，和参数无关：每个查询只多问一次数据库"""
+    key = (query, float32_coords)
+    if key not in _describe_cache:
+        cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+        _describe_cache[key] = [
+            (c.name, pa.float32() if float32_coords and c.name in FLOAT32_COLUMNS and c.type_code == 701
+             else _ARROW_TYPES.get(c.type_code, pa.string()))
+            for c in cur.description
+        ]
+    return _describe_cache[key]
 
-_engine = None
+def read_frame(sql, params=None, engine=None, float32_coords=True):
+    """
+    代替 pd.read_sql：用 COPY (查询) TO STDOUT 把结果以 CSV 流出，pyarrow 直接解析成列，
+    不经过逐行的 Python 元组和 object 列。返回 Arrow 支持的 DataFrame（pd.ArrowDtype）：
+    bool、int32/int64、float32 坐标、UTC 时区的时间戳、Arrow 字符串。
+    sql 写法和 text() 一样用 :name 占位；engine 默认 get_read_engine()。
+    结果还要按距离过滤的（半径搜索缓存）传 float32_coords=False，坐标保持 float64，和数据库的判断一致。
+    """
+    engine = engine or get_read_engine()
+    clause = text(sql) if isinstance(sql, str) else sql
+    query = str(clause.compile(dialect=engine.dialect))   # :name -> %(name)s
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL TimeZone = 'UTC'; SET LOCAL DateStyle = 'ISO'")
+            bound = cur.mogrify(query, params or {}).decode()
+            columns = _describe(cur, query, bound, float32_coords)
+            buf = io.BytesIO()
+            cur.copy_expert(f"COPY ({bound}) TO STDOUT WITH (FORMAT csv)", buf)
+        conn.rollback()   # 只读；同时撤销 SET LOCAL
+    finally:
+        conn.close()      # 还回连接池
 
-def get_engine():
-    global _engine
-    if _engine is None:
-        db_url = _build_db_url()
-        if db_url is None:
-            raise RuntimeError("No database URL configured - running in demo mode")
-        _engine = create_engine(db_url, pool_pre_ping=True)
-    return _engine
+    schema = pa.schema(columns)
+    if buf.tell() == 0:
+        table = schema.empty_table()
+    else:
+        buf.seek(0)
+        table = pacsv.read_csv(
+            buf,
+            read_options=pacsv.ReadOptions(column_names=schema.names),
+            convert_options=pacsv.ConvertOptions(
+                column_types=schema, true_values=["t"], false_values=["f"],
+                null_values=[""], strings_can_be_null=True, quoted_strings_can_be_null=False),
+        )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,140 @@
+# app/lib/db_config.py
+# 数据库 URL、连接池参数和 engine 的创建，不依赖 streamlit：
+# 页面（lib/db.py）和 ETL（etl/db_load.py）共用同一套配置，ETL 进程不会因此加载 streamlit。
+# 配置项先读 Streamlit secrets（只在已经加载了 streamlit 的进程里），再读 .env / 环境变量。
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+
+def _secret(name):
+    """页面进程里读 st.secrets；没有导入 streamlit 的进程（ETL）直接跳过，不为了读配置去导入它"""
+    st = sys.modules.get("streamlit")
+    if st is None:
+        return None
+    try:
+        return st.secrets.get(name)
+    except Exception:
+        return None
+
+def build_db_url(name: str = "DATABASE_URL") -> str:
+    """
+    读取 DB URL（name 为配置项名，只读副本用 DATABASE_REPLICA_URL）的优先级：
+    1) Streamlit secrets（Cloud 或本地 secrets.toml）
+    2) 项目根目录的 .env（显式加载）
+    3) 环境变量（兜底）
+    并统一追加 sslmode=require；兼容 postgres:// 前缀。
+    如果没有找到数据库URL，返回None以启用演示模式。
+    """
+    # 1) 试图从 secrets 读取（本地没有 secrets.toml 时会抛异常，所以 try）
+    url = _secret(name)
+
+    # 2) 如果没有，从项目根 .env 读取
+    if not url:
+        # 本文件位于 app/lib/ -> 项目根是上上级目录
+        project_root = Path(__file__).resolve().parents[2]
+        env_path = project_root / ".env"
+        if env_path.exists():
+            load_dotenv(env_path, override=False)
+        url = os.getenv(name)
+
+    # 3) 兜底：环境变量（即使没加载 .env）
+    if not url:
+        url = os.getenv(name)
+
+    # 如果仍然没有URL，返回None以启用演示模式
+    if not url or url.strip() == "":
+        return None
+
+    # 兼容 postgres://
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+
+    # 统一追加 SSL
+    if "sslmode=" not in url:
+        url += ("&" if "?" in url else "?") + "sslmode=require"
+
+    return url
+
+# ---------- 连接池 ----------
+# 以下参数都可以在 secrets 或环境变量里配置（同名 key），不配就用默认值
+POOL_DEFAULTS = {
+    "DB_POOL_SIZE": 5,                 # 常驻连接数
+    "DB_MAX_OVERFLOW": 10,             # 高峰时最多再临时开多少个
+    "DB_POOL_TIMEOUT": 10,             # 池满时最多等几秒，超时抛错而不是一直卡住
+    "DB_POOL_RECYCLE": 1800,           # 连接用了多少秒后重建（云数据库/连接池会掐掉长时间的空闲连接）
+    "DB_PRE_PING": True,               # 每次取连接前先 ping 一下；有 recycle 兜底时可以关掉省一次往返
+    "DB_STATEMENT_TIMEOUT_MS": 30000,  # 服务端单条语句超时，0 表示不限制
+    "DB_APPLICATION_NAME": "parking-app",
+    "DB_REPLICA_MAX_LAG_S": 30,        # 只读副本落后主库超过这么多秒就不用它，回退到主库
+    "DB_REPLICA_CHECK_S": 15,          # 副本健康检查结果缓存多少秒
+}
+
+def setting(name, defaults=POOL_DEFAULTS):
+    """和数据库 URL 一样：先 secrets，再环境变量（build_db_url 已经加载过 .env）；按默认值的类型转换"""
+    default = defaults[name]
+    value = _secret(name)
+    if value is None:
+        value = os.getenv(name)
+    if value is None or str(value).strip() == "":
+        return default
+    if isinstance(default, bool):
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    return str(value)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool 加上取连接的等待时间统计（池满时排队多久、有多少次超时）"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - t0
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+def create_engine(db_url, statement_timeout_ms=0):
+    """
+    带统计的连接池 engine；statement_timeout_ms 在每个新建的物理连接上设置一次（0 表示不限制）。
+    页面用 DB_STATEMENT_TIMEOUT_MS，ETL 用自己的 ETL_STATEMENT_TIMEOUT_MS。
+    """
+    engine = sqlalchemy.create_engine(
+        db_url,
+        poolclass=TimedQueuePool,
+        pool_size=setting("DB_POOL_SIZE"),
+        max_overflow=setting("DB_MAX_OVERFLOW"),
+        pool_timeout=setting("DB_POOL_TIMEOUT"),
+        pool_recycle=setting("DB_POOL_RECYCLE"),
+        pool_pre_ping=setting("DB_PRE_PING"),
+        connect_args={"application_name": setting("DB_APPLICATION_NAME")},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_session_defaults(dbapi_conn, _record):
+        with dbapi_conn.cursor() as cur:
+            cur.execute(f"SET statement_timeout = {int(statement_timeout_ms)}")
+        dbapi_conn.commit()
+
+    return engine
@@ -0,0 +1,103 @@
+# app/lib/deck_layers.py
+# WebGL 渲染车位（pydeck / deck.gl）：点在显卡上画，几万个车位也能流畅平移缩放，不需要服务端聚合；
+# 可选 HexagonLayer 在浏览器端按六边形格子聚合。搜索中心、半径圈和颜色与 folium 视图（map_layers.py）一致。
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from lib.map_layers import FREE_COLOR, OCCUPIED_COLOR, bay_labels
+
+CENTER_COLOR = "#3b82f6"
+HEX_RADIUS_M = 50
+# folium 的底图样式 -> Carto 底图（不需要 token）
+MAP_STYLES = {"cartodbpositron": "light", "OpenStreetMap": "road", "cartodbdark_matter": "dark"}
+
+BAY_TOOLTIP = "<b>🅿️ Bay #{bay_id}</b> - {status}<br/><small>Last updated: {ts}</small>"
+HEX_TOOLTIP = "<b>{elevationValue} bays</b> in this area<br/><small>colour: share of bays occupied</small>"
+
+def rgba(hex_color, alpha=255):
+    """'#10b981' -> [16, 185, 129, alpha]"""
+    h = hex_color.lstrip("#")
+    return [int(h[i:i + 2], 16) for i in (0, 2, 4)] + [alpha]
+
+def deck_frame(df, tooltip=True):
+    """
+    结果 -> 图层用到的几列，整列一次转换；图层直接按 lon / lat 列取位置。
+    pydeck 按行序列化成 JSON，每个车位的字段越少，几万个点时发给浏览器的数据越小：
+    六边形聚合只需要位置和占用（tooltip=False），逐点显示时再带上提示框的字段。
+    """
+    occ = df["is_occupied"].fillna(False).astype(bool).to_numpy()
+    out = pd.DataFrame({
+        "lon": np.round(df["lon"].to_numpy(dtype=float), 6),
+        "lat": np.round(df["lat"].to_numpy(dtype=float), 6),
+        "occ": occ.astype("int8"),
+    })
+    if tooltip:
+        # 缺失的编号 / 时间和 folium 地图一样处理（map_layers.bay_labels）
+        out["bay_id"], out["ts"] = bay_labels(df)
+        out["status"] = np.where(occ, "Occupied", "Available")
+    return out
+
+def bay_deck(df, lat, lon, radius_m=None, zoom=16, hexagons=False, map_style="cartodbpositron",
+             hex_radius_m=HEX_RADIUS_M):
+    """
+    车位 + 搜索中心（+ 半径圈，radius_m 为 None 时不画）的 pdk.Deck。
+    hexagons=True 时车位按 hex_radius_m 米的六边形聚合：高度是车位数，颜色从绿到红是占用比例。
+    zoom 按 Leaflet 的级别给。
+    """
+    data = deck_frame(df, tooltip=not hexagons)
+    layers = []
+    if hexagons:
+        layers.append(pdk.Layer(
+            "HexagonLayer", data,
+            get_position=["lon", "lat"],
+            radius=hex_radius_m,
+            get_color_weight="occ",
+            color_aggregation=pdk.types.String("MEAN"),   # 普通字符串会被 pydeck 当成表达式
+            color_domain=[0, 1],
+            color_range=[rgba(FREE_COLOR), [132, 204, 22, 255], [250, 204, 21, 255],
+                         [249, 115, 22, 255], rgba(OCCUPIED_COLOR)],
+            elevation_scale=4,
+            extruded=True,
+            coverage=0.9,
+            opacity=0.6,
+            pickable=True,
+        ))
+    else:
+        layers.append(pdk.Layer(
+            "ScatterplotLayer", data,
+            get_position=["lon", "lat"],
+            get_fill_color=f"occ ? {rgba(OCCUPIED_COLOR, 200)} : {rgba(FREE_COLOR, 200)}",
+            get_radius=2,                 # 米（deck.gl 默认单位）
+            radius_min_pixels=3,
+            radius_max_pixels=10,
+            pickable=True,
+        ))
+    center = [{"lon": lon, "lat": lat}]
+    if radius_m is not None:
+        layers.append(pdk.Layer(
+            "ScatterplotLayer", center,
+            get_position=["lon", "lat"],
+            get_radius=radius_m,
+            filled=False,
+            stroked=True,
+            get_line_color=rgba(CENTER_COLOR, 205),
+            line_width_min_pixels=2,
+        ))
+    layers.append(pdk.Layer(
+        "ScatterplotLayer", center,
+        get_position=["lon", "lat"],
+        get_fill_color=rgba(CENTER_COLOR),
+        get_line_color=[255, 255, 255, 255],
+        stroked=True,
+        radius_min_pixels=8,
+        line_width_min_pixels=2,
+    ))
+    return pdk.Deck(
+        layers=layers,
+        # deck.gl / MapLibre 的缩放级别按 512 像素瓦片算，比 Leaflet 的同一视野小 1
+        initial_view_state=pdk.ViewState(latitude=lat, longitude=lon, zoom=zoom - 1, pitch=40 if hexagons else 0),
+        map_provider="carto",
+        map_style=MAP_STYLES.get(map_style, "light"),
+        tooltip={"html": HEX_TOOLTIP if hexagons else BAY_TOOLTIP},
+    )
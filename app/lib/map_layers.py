@@ -0,0 +1,155 @@
+# app/lib/map_layers.py
+# 大量车位一次性画到 folium 地图上：数据按列打包成一段 JSON，浏览器端循环创建 canvas 圆点，
+# 弹窗用同一个 HTML 模板、点开时才填入这一条的字段。
+# 代替逐行 folium.CircleMarker + folium.Popup：Python 端不再为每个车位渲染一段 HTML / JS，页面体积也小得多。
+import json
+
+import numpy as np
+import pandas as pd
+from folium.template import Template
+from branca.element import MacroElement
+
+FREE_COLOR = "#10b981"
+OCCUPIED_COLOR = "#ef4444"
+
+# {字段} 在浏览器端替换；字段见 BayLayer._template 里的 fields
+POPUP_TEMPLATE = """
+<div style="font-family: Arial, sans-serif; min-width: 250px;">
+    <div style="background: {bg}; padding: 10px; border-radius: 8px; margin-bottom: 10px;
+                border-left: 4px solid {color};">
+        <h4 style="margin: 0 0 8px 0; color: #1f2937;">🅿️ Bay #{bay_id}</h4>
+        <p style="margin: 4px 0; color: #374151;">
+            <b>Status:</b>
+            <span style="color: {color}; font-weight: bold;">{icon} {status}</span>
+        </p>
+        <p style="margin: 4px 0; color: #6b7280; font-size: 0.9em;">
+            <b>Last Updated:</b><br/>{ts}
+        </p>
+    </div>
+    <div style="text-align: center;">
+        <a href="https://www.google.com/maps/dir/?api=1&destination={lat},{lon}&travelmode=driving"
+           target="_blank"
+           style="display: inline-block; background: #3b82f6; color: white;
+                  padding: 8px 16px; text-decoration: none; border-radius: 6px; font-weight: bold;">
+            🧭 Navigate Here
+        </a>
+    </div>
+</div>
+"""
+
+MISSING = "—"   # 缺失的更新时间显示成这个
+
+def bay_labels(df):
+    """
+    车位编号和更新时间的显示值，folium（bay_columns）和 WebGL（deck_layers.deck_frame）两种地图共用：
+    编号转成可空的 Int64（Arrow 的 NA 直接转 int64 会报错），缺失的时间显示 MISSING（NaT 格式化出来是 "NaT"），
+    时间精确到分钟；空表也可以。返回 (Int64 数组, object 数组)。
+    """
+    ts = pd.to_datetime(df["status_timestamp"], utc=True).dt.tz_localize(None).to_numpy("datetime64[m]")
+    known = ~np.isnat(ts)
+    text = np.full(len(ts), MISSING, dtype=object)
+    if known.any():
+        text[known] = np.char.replace(np.datetime_as_string(ts[known], unit="m"), "T", " ")
+    return df["bay_id"].astype("Int64").array, text
+
+def bay_columns(df):
+    """DataFrame -> 按列的 dict（每列一个列表），整列一次转换，不逐行；缺失的编号为 null"""
+    ids, ts = bay_labels(df)
+    return {
+        "id": ids.to_numpy(dtype=object, na_value=None).tolist(),
+        "lat": np.round(df["lat"].to_numpy(dtype=float), 6).tolist(),
+        "lon": np.round(df["lon"].to_numpy(dtype=float), 6).tolist(),
+        "occ": df["is_occupied"].fillna(False).astype(bool).astype("int8").tolist(),
+        "ts": ts.tolist(),
+    }
+
+class BayLayer(MacroElement):
+    """所有车位一个图层：canvas 渲染的 L.circleMarker，弹窗内容点开时由模板生成"""
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var d = {{ this.data }};
+            var tpl = {{ this.popup_template|tojson }};
+            var renderer = L.canvas({padding: 0.5});
+            var group = L.featureGroup();
+            function label(i) { return d.id[i] === null ? {{ this.missing|tojson }} : d.id[i]; }
+            function popup(i) {
+                var occ = d.occ[i] === 1;
+                var fields = {
+                    bay_id: label(i), lat: d.lat[i], lon: d.lon[i], ts: d.ts[i],
+                    status: occ ? "Occupied" : "Available",
+                    icon: occ ? "🔴" : "🟢",
+                    color: occ ? {{ this.occupied_color|tojson }} : {{ this.free_color|tojson }},
+                    bg: occ ? "#fef2f2" : "#f0fdf4"
+                };
+                return tpl.replace(/\\{(\\w+)\\}/g, function(_, k) { return fields[k]; });
+            }
+            for (var i = 0; i < d.id.length; i++) {
+                var occ = d.occ[i] === 1;
+                var color = occ ? {{ this.occupied_color|tojson }} : {{ this.free_color|tojson }};
+                var marker = L.circleMarker([d.lat[i], d.lon[i]], {
+                    renderer: renderer, radius: {{ this.radius }}, weight: 2,
+                    color: color, fillColor: color, fillOpacity: 0.8
+                });
+                marker.bindTooltip("Bay #" + label(i) + " - " + (occ ? "Occupied" : "Available"));
+                marker.bindPopup(popup.bind(null, i), {maxWidth: 300});
+                group.addLayer(marker);
+            }
+            group.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, df, radius=6, popup_template=POPUP_TEMPLATE):
+        super().__init__()
+        self._name = "BayLayer"
+        # 直接嵌在 <script> 里，"</" 转义掉以免提前结束标签
+        self.data = json.dumps(bay_columns(df), separators=(",", ":"), ensure_ascii=False).replace("</", "<\\/")
+        self.popup_template = popup_template
+        self.radius = radius
+        self.free_color = FREE_COLOR
+        self.occupied_color = OCCUPIED_COLOR
+        self.missing = MISSING
+
+class ClusterLayer(MacroElement):
+    """
+    服务端聚好的网格簇（clustering.grid_clusters 的结果）：每个簇一个带数量的圆形图标，
+    颜色按空位比例从红到绿；点击放大两级（缩放变化会让页面按新的级别重新聚合）。
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var d = {{ this.data }};
+            var map = {{ this._parent.get_name() }};
+            var group = L.featureGroup();
+            for (var i = 0; i < d.n.length; i++) {
+                var n = d.n[i], free = d.free[i];
+                var hue = Math.round(120 * free / n);   // 0 红 ... 120 绿
+                var size = Math.round(26 + 14 * Math.min(Math.log10(n), 3));
+                var icon = L.divIcon({
+                    className: "",
+                    iconSize: [size, size],
+                    html: '<div style="width:' + size + 'px;height:' + size + 'px;line-height:' + size + 'px;' +
+                          'border-radius:50%;text-align:center;font:bold 12px Arial,sans-serif;color:#1f2937;' +
+                          'background:hsla(' + hue + ',70%,50%,0.75);border:2px solid hsl(' + hue + ',70%,35%);">' +
+                          n + '</div>'
+                });
+                var marker = L.marker([d.lat[i], d.lon[i]], {icon: icon});
+                marker.bindTooltip(n + (n === 1 ? " bay · " : " bays · ") + free + " available · " + (n - free) + " occupied");
+                marker.on("click", function(e) { map.setView(e.latlng, map.getZoom() + 2); });
+                group.addLayer(marker);
+            }
+            group.addTo(map);
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, clusters):
+        super().__init__()
+        self._name = "ClusterLayer"
+        self.data = json.dumps({
+            "lat": np.round(clusters["lat"].to_numpy(dtype=float), 6).tolist(),
+            "lon": np.round(clusters["lon"].to_numpy(dtype=float), 6).tolist(),
+            "n": clusters["bays"].astype("int64").tolist(),
+            "free": clusters["free"].astype("int64").tolist(),
+        }, separators=(",", ":"))
@@ -0,0 +1,59 @@
+# app/lib/occupancy.py
+import numpy as np
+import pandas as pd
+
+OCCUPANCY_COLUMNS = ["bay_id", "hour", "occupied_minutes", "observed_minutes", "change_count", "is_occupied"]
+
+def _naive(ts):
+    """带时区的统一转成 UTC 再去掉时区，方便和 numpy datetime64 一起算"""
+    ts = pd.to_datetime(ts)
+    if getattr(ts, "tz", None) is not None:
+        return ts.tz_convert("UTC").tz_localize(None)
+    if isinstance(ts, pd.Series) and ts.dt.tz is not None:
+        return ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    return ts
+
+def hourly_occupancy(hist, hours, now=None):
+    """
+    从原始快照（status_timestamp, is_occupied）算出和 SQL 函数 get_bay_occupancy 相同的逐小时结果
+    （演示模式用）：每条快照的状态持续到下一条快照，最后一条持续到 now，按时间加权。
+    """
+    now = _naive(pd.Timestamp.now() if now is None else pd.Timestamp(now))
+    lo = pd.date_range(end=now.floor("h"), periods=hours, freq="h").to_numpy()
+    hi = lo + np.timedelta64(1, "h")
+    if hist.empty:
+        return pd.DataFrame({"bay_id": None, "hour": lo, "occupied_minutes": 0.0, "observed_minutes": 0.0,
+                             "change_count": 0, "is_occupied": pd.array([None] * hours, dtype="boolean")})
+    bay_id = hist["bay_id"].iloc[0]
+
+    h = hist.sort_values("status_timestamp")
+    ts = _naive(h["status_timestamp"]).to_numpy(dtype="datetime64[ns]")
+    occ = h["is_occupied"].astype(bool).to_numpy()
+    seg_end = np.append(ts[1:], np.datetime64(now, "ns"))
+
+    # 每段快照 × 每个小时 的重叠分钟数（当前小时只算到 now）
+    overlap = np.minimum(seg_end[None, :], np.minimum(hi, np.datetime64(now, "ns"))[:, None]) \
+        - np.maximum(ts[None, :], lo[:, None])
+    overlap = np.clip(overlap / np.timedelta64(1, "m"), 0, None)
+
+    changed = np.append(False, occ[1:] != occ[:-1])
+    in_hour = (ts[None, :] >= lo[:, None]) & (ts[None, :] < hi[:, None])
+    # 小时结束时的状态：这个小时结束前的最后一条快照；之前完全没有数据时为空
+    last = np.searchsorted(ts, hi, side="left") - 1
+    state = pd.array([bool(occ[i]) if i >= 0 else None for i in last], dtype="boolean")
+
+    return pd.DataFrame({
+        "bay_id": bay_id,
+        "hour": lo,
+        "occupied_minutes": overlap @ occ.astype(float),
+        "observed_minutes": overlap.sum(axis=1),
+        "change_count": (in_hour & changed[None, :]).sum(axis=1),
+        "is_occupied": state,
+    })[OCCUPANCY_COLUMNS]
+
+def occupancy_summary(occ):
+    """逐小时结果 → (占用率 %, 占用小时数, 有状态的小时数, 状态变化次数)"""
+    observed = float(occ["observed_minutes"].sum())
+    occupied = float(occ["occupied_minutes"].sum())
+    rate = occupied / observed * 100 if observed > 0 else 0.0
+    return rate, occupied / 60, observed / 60, int(occ["change_count"].sum())
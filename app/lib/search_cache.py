@@ -0,0 +1,235 @@
+# app/lib/search_cache.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+M_PER_DEG_LAT = 111320.0
+COORD_SLACK_M = 1.0   # 结果里的坐标是 float64（read_frame 传 float32_coords=False），这里的距离和数据库的差在毫米级，算覆盖半径时留的余量
+
+def distance_m(lat0, lon0, lat, lon):
+    """
+    (lat0, lon0) 到一组点的距离（米），lat/lon 可以是数组。
+    用 WGS84 椭球在中点纬度的子午圈 / 卯酉圈曲率半径做局部平面近似，
+    几公里以内和 PostGIS geography 的 ST_Distance / ST_DWithin（椭球面）相差不到 1 毫米，
+    边界上的点和数据库的判断一致（球面 haversine 会差 0.3% 左右）。
+    """
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    mid = (lat + lat0) / 2
+    w = 1 - WGS84_E2 * np.sin(mid) ** 2
+    n = WGS84_A / np.sqrt(w)                     # 卯酉圈曲率半径
+    m = WGS84_A * (1 - WGS84_E2) / w ** 1.5      # 子午圈曲率半径
+    return np.hypot(m * (lat - lat0), n * np.cos(mid) * (lon - lon0))
+
+@dataclass
+class _Entry:
+    lat: float
+    lon: float
+    radius: float          # 这份结果保证完整覆盖的半径（被 limit 截断时是最远一条的距离）
+    df: pd.DataFrame
+    version: object
+    created: float
+
+@dataclass
+class _Tile:
+    df: pd.DataFrame
+    truncated: bool        # 瓦片里的车位超过了 limit，只拿到一部分
+    version: object
+    created: float
+
+class _ResultCache:
+    """两种缓存共用的部分：数据版本（ETL 水位线）变了或超过 ttl_s 的条目作废，条目数超过 max_entries 时丢最旧的"""
+    def __init__(self, fetch, version=None, ttl_s=300, version_ttl_s=30, max_entries=64):
+        self._fetch = fetch
+        self._version_fn = version
+        self.ttl_s = ttl_s
+        self.version_ttl_s = version_ttl_s
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _current_version(self):
+        """数据版本本身也缓存 version_ttl_s 秒，避免每次 rerun 都查库"""
+        if self._version_fn is None:
+            return None
+        now = time.monotonic()
+        if now - self._version_checked > self.version_ttl_s:
+            try:
+                self._version = self._version_fn()
+            except Exception:
+                pass   # 查不到版本时沿用上一次的，仍然有 ttl 兜底
+            self._version_checked = now
+        return self._version
+
+    def _expire(self, version):
+        now = time.monotonic()
+        stale = [k for k, e in self._entries.items() if e.version != version or now - e.created > self.ttl_s]
+        for k in stale:
+            del self._entries[k]
+        self.invalidations += len(stale)
+
+    def _store(self, key, entry):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k].created)
+                del self._entries[oldest]
+            self._entries[key] = entry
+
+class RadiusSearchCache(_ResultCache):
+    """
+    半径搜索的结果缓存（get_bays_within 的内存超集缓存）：
+      - 搜索中心按 snap_m 米的网格取整，取数时用格子中心、把半径放大半个格子对角线，
+        同一个格子里的任何中心点、不超过原半径的搜索都能从这份结果里过滤出来
+      - 新的搜索如果完全落在某个已缓存结果的覆盖圆里（更小的半径、附近的中心），直接在内存里过滤
+      - 数据版本（ETL 水位线）变了或超过 ttl_s 的缓存作废
+    fetch(lon, lat, radius, limit) -> DataFrame，按距离由近到远；version() -> 任意可比较的版本号
+    """
+    def __init__(self, fetch, version=None, snap_m=50, ttl_s=300, version_ttl_s=30, max_entries=64):
+        super().__init__(fetch, version, ttl_s, version_ttl_s, max_entries)
+        self.snap_m = snap_m
+        # self.hits 计的是同一个格子、同样的半径和 limit
+        self.superset_hits = 0   # 从更大的缓存结果里过滤
+
+    def _snap(self, lat, lon):
+        step_lat = self.snap_m / M_PER_DEG_LAT
+        step_lon = self.snap_m / (M_PER_DEG_LAT * float(np.cos(np.radians(lat))))
+        i, j = round(lat / step_lat), round(lon / step_lon)
+        return i * step_lat, j * step_lon, i, j
+
+    @staticmethod
+    def _answer(entry, lat, lon, radius, limit):
+        """
+        从缓存结果里过滤出 (lat, lon, radius, limit) 的答案；只有能保证和直接查库结果一致时才返回，否则 None：
+        需要的范围（半径，或者 limit 截断时第 limit 近那条的距离）加上两个中心的距离，不能超出缓存覆盖的半径。
+        """
+        offset = distance_m(entry.lat, entry.lon, lat, lon)
+        if offset >= entry.radius:
+            return None
+        d = distance_m(lat, lon, entry.df["lat"].to_numpy(), entry.df["lon"].to_numpy())
+        keep = np.flatnonzero(d <= radius)
+        order = keep[np.argsort(d[keep], kind="stable")][:limit]
+        needed = d[order[-1]] if len(order) == limit and limit > 0 else radius
+        if offset + needed > entry.radius:
+            return None
+        return entry.df.iloc[order].reset_index(drop=True)
+
+    def _load(self, lat, lon, radius, limit, version):
+        df = self._fetch(lon, lat, radius, limit).reset_index(drop=True)
+        dist = distance_m(lat, lon, df["lat"].to_numpy(), df["lon"].to_numpy())
+        # 被 limit 截断时，只有最远一条之内的范围是完整的
+        covered = radius if len(df) < limit else float(dist.max(initial=0.0)) - COORD_SLACK_M
+        return _Entry(lat, lon, covered, df, version, time.monotonic())
+
+    def search(self, lat, lon, radius, limit):
+        version = self._current_version()
+        clat, clon, ci, cj = self._snap(lat, lon)
+        key = (ci, cj, radius, limit)
+        with self._lock:
+            self._expire(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                df = self._answer(entry, lat, lon, radius, limit)
+                if df is not None:
+                    self.hits += 1
+                    return df
+            for entry in list(self._entries.values()):
+                df = self._answer(entry, lat, lon, radius, limit)
+                if df is not None:
+                    self.superset_hits += 1
+                    return df
+            self.misses += 1
+
+        # 以格子中心取数，半径放大半个格子对角线，limit 按面积同比放大，
+        # 这样同一格子里的其它中心点也能命中
+        pad = self.snap_m * np.sqrt(2) / 2
+        fetch_radius = float(np.ceil((radius + pad) / 10) * 10)
+        fetch_limit = int(np.ceil(limit * (fetch_radius / radius) ** 2))
+        entry = self._load(clat, clon, fetch_radius, fetch_limit, version)
+        self._store(key, entry)
+        df = self._answer(entry, lat, lon, radius, limit)
+        if df is None:
+            # 结果太密被截断、格子中心的结果覆盖不到这次的中心：按原参数再查一次
+            entry = self._load(lat, lon, radius, limit, version)
+            self._store((lat, lon, radius, limit), entry)
+            df = entry.df
+        return df
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.superset_hits + self.misses
+            return {
+                "hits": self.hits,
+                "superset_hits": self.superset_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.superset_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "invalidations": self.invalidations,
+                "version": self._version,
+            }
+
+class TileCache(_ResultCache):
+    """
+    视野加载模式的瓦片缓存：地图视野按固定缩放级别的瓦片（见 lib/viewport.py）取车位，
+    每个瓦片取一次，平移回已经加载过的区域时直接用缓存。
+    fetch(min_lon, min_lat, max_lon, max_lat, limit) -> DataFrame，会在多个线程里同时调用。
+    """
+    def __init__(self, fetch, version=None, tile_limit=5000, ttl_s=300, version_ttl_s=30, max_entries=512,
+                 fetch_workers=4):
+        super().__init__(fetch, version, ttl_s, version_ttl_s, max_entries)
+        self.tile_limit = tile_limit
+        self.fetch_workers = fetch_workers   # 缺的瓦片并行取，不超过连接池的常驻连接数（DB_POOL_SIZE 默认 5）
+
+    def load(self, tiles, bounds):
+        """
+        tiles：[(z, x, y)]，bounds：瓦片 -> (min_lon, min_lat, max_lon, max_lat) 的函数。
+        返回 (这些瓦片里的所有车位, 这次新取的瓦片数, 被 limit 截断的瓦片数)
+        """
+        version = self._current_version()
+        with self._lock:
+            self._expire(version)
+            cached = {t: self._entries.get(t) for t in tiles}
+        missing = [t for t in tiles if cached[t] is None]
+        if missing:
+            # 一屏可能缺十几块瓦片，逐块查要等十几次往返；并行取，耗时接近最慢的一块
+            def fetch(t):
+                df = self._fetch(*bounds(*t), self.tile_limit)
+                return _Tile(df, len(df) >= self.tile_limit, version, time.monotonic())
+            if len(missing) == 1 or self.fetch_workers <= 1:
+                loaded = [fetch(t) for t in missing]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(missing))) as pool:
+                    loaded = list(pool.map(fetch, missing))
+            for t, entry in zip(missing, loaded):
+                self._store(t, entry)
+                cached[t] = entry
+        fetched = len(missing)
+        frames = [cached[t].df for t in tiles]
+        truncated = sum(cached[t].truncated for t in tiles)
+        with self._lock:
+            self.hits += len(tiles) - fetched
+            self.misses += fetched
+        if not frames:
+            return pd.DataFrame(), 0, 0
+        # 正好落在瓦片边界上的车位两边都会取到
+        df = pd.concat(frames, ignore_index=True).drop_duplicates("bay_id")
+        return df.reset_index(drop=True), fetched, truncated
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self._entries), "invalidations": self.invalidations,
+                    "version": self._version}
@@ -0,0 +1,289 @@
+# app/lib/shared_cache.py
+# 多个 Streamlit 进程（负载均衡后面的几个 worker）共享的查询结果缓存：
+#   - 后端可选：本机磁盘目录（同一台机器上的 worker 共享）或 Redis 协议的服务（跨机器）
+#   - DataFrame 存成 Arrow IPC，其它结果（列表等）存 JSON
+#   - 每条缓存有 TTL；key 里带数据版本（etl_watermarks 里对应表的更新时间），ETL 写入后旧 key 自然失效
+#   - 拿不到数据版本（演示模式、连不上库）时不走共享缓存：演示数据不能写进所有 worker 共用的 key
+#   - 没有共享后端（CACHE_BACKEND=none）或不走共享缓存时，退回到进程内的 st.cache_data，不会每次 rerun 都查库
+import functools
+import hashlib
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from lib.db import get_read_engine
+from lib.db_config import setting
+
+CACHE_DEFAULTS = {
+    "CACHE_BACKEND": "disk",                    # disk / redis / none（none：不用共享缓存，只在进程内缓存）
+    "CACHE_DIR": "",                            # 空：系统临时目录下的 parking-app-cache
+    "CACHE_REDIS_URL": "redis://localhost:6379/0",
+    "CACHE_VERSION_CHECK_S": 15,                # 数据版本查一次缓存多少秒
+}
+KEY_PREFIX = "parking-app"
+LOCAL_MAX_ENTRIES = 256       # 进程内退路缓存（st.cache_data）每个 namespace 最多保留的条目数
+UNVERSIONED = "unversioned"   # 连上了库但 etl_watermarks 里还没有这些表的记录
+
+# ---------- 序列化 ----------
+def dumps(value):
+    if isinstance(value, pd.DataFrame):
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(value)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return b"A" + sink.getvalue().to_pybytes()
+    return b"J" + json.dumps(value, default=str).encode()
+
+def loads(blob):
+    if blob[:1] == b"A":
+        return pa.ipc.open_stream(pa.py_buffer(blob[1:])).read_all().to_pandas()
+    return json.loads(blob[1:])
+
+# ---------- 磁盘后端 ----------
+class DiskBackend:
+    """一个 key 一个文件：8 字节过期时间 + 内容；先写临时文件再 rename，读的进程不会读到半个文件"""
+    name = "disk"
+    PRUNE_EVERY = 100   # 每写这么多次顺手清理一遍过期文件
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._writes = 0
+
+    def _path(self, key):
+        return self.dir / (hashlib.sha1(key.encode()).hexdigest() + ".bin")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        (expires,) = struct.unpack("<d", data[:8])
+        if expires < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return data[8:]
+
+    def set(self, key, value, ttl_s):
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(struct.pack("<d", time.time() + ttl_s) + value)
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        now = time.time()
+        for path in self.dir.glob("*.bin"):
+            try:
+                with path.open("rb") as f:
+                    (expires,) = struct.unpack("<d", f.read(8))
+                if expires < now:
+                    path.unlink(missing_ok=True)
+            except (OSError, struct.error):
+                pass
+
+# ---------- Redis 协议后端 ----------
+class RespClient:
+    """最小的 RESP2 客户端，只用到 AUTH / SELECT / GET / SET PX；Redis、Valkey、KeyDB 等兼容服务都能用"""
+    def __init__(self, url, timeout=2.0):
+        u = urlparse(url)
+        self.host, self.port = u.hostname or "localhost", u.port or 6379
+        self.password = u.password
+        self.db = int(u.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._buf = b""
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._buf = b""
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def _readline(self):
+        while b"\r\n" not in self._buf:
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("connection closed by server")
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\r\n", 1)
+        return line
+
+    def _readexact(self, n):
+        while len(self._buf) < n + 2:
+            chunk = self._sock.recv(max(65536, n + 2 - len(self._buf)))
+            if not chunk:
+                raise ConnectionError("connection closed by server")
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n + 2:]
+        return data
+
+    def _reply(self):
+        line = self._readline()
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            return None if n < 0 else self._readexact(n)
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._reply() for _ in range(n)]
+        raise ConnectionError(f"unexpected reply {line[:20]!r}")
+
+    def _call(self, *args):
+        parts = [a if isinstance(a, bytes) else str(a).encode() for a in args]
+        msg = b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(p), p) for p in parts)
+        self._sock.sendall(msg)
+        return self._reply()
+
+    def execute(self, *args):
+        """连接断了就重连一次再试"""
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._call(*args)
+                except (OSError, ConnectionError):
+                    self.close()
+                    if attempt:
+                        raise
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url):
+        self.client = RespClient(url)
+
+    def get(self, key):
+        return self.client.execute("GET", key)
+
+    def set(self, key, value, ttl_s):
+        self.client.execute("SET", key, value, "PX", int(ttl_s * 1000))
+
+# ---------- 对外接口 ----------
+_backend = None
+_backend_lock = threading.Lock()
+_stats = {}            # namespace -> {"hits", "misses", "errors", "bypassed"}
+_versions = {}         # 表名组合 -> (查询时间, 版本)
+
+def get_backend():
+    """按 CACHE_BACKEND 建一次后端，进程内复用；none 时返回 None"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = setting("CACHE_BACKEND", CACHE_DEFAULTS).strip().lower()
+                if kind == "redis":
+                    _backend = RedisBackend(setting("CACHE_REDIS_URL", CACHE_DEFAULTS))
+                elif kind == "disk":
+                    directory = setting("CACHE_DIR", CACHE_DEFAULTS) or Path(tempfile.gettempdir()) / "parking-app-cache"
+                    _backend = DiskBackend(directory)
+                else:
+                    _backend = False
+    return _backend or None
+
+def data_version(*tables):
+    """
+    返回一个函数：读 etl_watermarks 里这些表的最近更新时间作为数据版本
+    （sensor_status 由传感器 ETL 推进，其它表由 etl/db_load.upsert_frame 写入时记录）。
+    结果在进程内缓存 CACHE_VERSION_CHECK_S 秒。
+    连上了库但没有记录（etl_watermarks 还没建、表还没经过 ETL 写入）时版本为 UNVERSIONED，只靠 TTL 过期；
+    连不上库（演示模式、库出错且之前没查到过）时为 None，shared_cache 遇到 None 不走共享缓存。
+    """
+    def version():
+        now = time.monotonic()
+        cached = _versions.get(tables)
+        if cached and now - cached[0] < setting("CACHE_VERSION_CHECK_S", CACHE_DEFAULTS):
+            return cached[1]
+        try:
+            with get_read_engine().connect() as conn:
+                exists = conn.exec_driver_sql("SELECT to_regclass('etl_watermarks')").scalar()
+                rows = conn.exec_driver_sql(
+                    "SELECT name, updated_at FROM etl_watermarks WHERE name = ANY(%(names)s) ORDER BY name",
+                    {"names": list(tables)}).all() if exists else []
+            value = ";".join(f"{name}@{ts.isoformat()}" for name, ts in rows) or UNVERSIONED
+        except Exception:
+            value = cached[1] if cached else None
+        _versions[tables] = (now, value)
+        return value
+    return version
+
+def shared_cache(namespace, ttl_s=600, version=None):
+    """
+    装饰器：用法和 st.cache_data 类似，但结果放在共享后端里，所有 worker 进程共用。
+    key = 前缀:namespace:数据版本:参数哈希；后端出错时直接调用原函数（记到 errors），页面不受影响。
+    没有共享后端，或给了 version 但它返回 None（演示模式 / 连不上库）时，结果只放在进程内的 st.cache_data 里
+    （同样的 TTL，key 里也带数据版本），不读也不写共享缓存（后一种记到 bypassed）。
+    """
+    def decorator(fn):
+        def local(ver, args, kwargs):
+            return fn(*args, **kwargs)
+        # st.cache_data 按函数的模块名 + qualname + 源码区分缓存，这里的 local 源码都一样，用 namespace 区分
+        local.__qualname__ = f"shared_cache.{namespace}"
+        local = st.cache_data(ttl=ttl_s, max_entries=LOCAL_MAX_ENTRIES, show_spinner=False)(local)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            ver = version() if version else None
+            if backend is None:
+                return local(ver, args, kwargs)
+            stats = _stats.setdefault(namespace, {"hits": 0, "misses": 0, "errors": 0, "bypassed": 0})
+            if version and ver is None:
+                stats["bypassed"] += 1
+                return local(ver, args, kwargs)
+            digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+            key = f"{KEY_PREFIX}:{namespace}:{ver}:{digest}"
+            try:
+                blob = backend.get(key)
+                if blob is not None:
+                    stats["hits"] += 1
+                    return loads(blob)
+            except Exception:
+                stats["errors"] += 1
+            stats["misses"] += 1
+            value = fn(*args, **kwargs)
+            try:
+                backend.set(key, dumps(value), ttl_s)
+            except Exception:
+                stats["errors"] += 1
+            return value
+        return wrapper
+    return decorator
+
+def cache_stats():
+    """本进程的共享缓存命中统计（按 namespace）；没启用共享缓存时返回 None"""
+    backend = get_backend()
+    if backend is None:
+        return None
+    return {"backend": backend.name, **{ns: dict(s) for ns, s in _stats.items()}}
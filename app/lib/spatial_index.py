@@ -0,0 +1,131 @@
+# app/lib/spatial_index.py
+# 不依赖数据库的车位搜索：把传感器快照载入 numpy 数组，建均匀网格索引，
+# 半径查询 / 最近 k 个的结果和 get_bays_within 同样的列、同样的排序，演示模式和离线部署用。
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lib.db_config import setting
+from lib.search_cache import M_PER_DEG_LAT, distance_m
+
+INDEX_DEFAULTS = {
+    "BAY_SNAPSHOT": "",        # 快照文件（csv / parquet）；空：项目根目录的 data/sensors_raw.csv
+    "SEARCH_BACKEND": "db",    # db：有数据库时查库；local：总是查本地快照（离线 / 边缘部署）
+}
+BAY_COLUMNS = ["bay_id", "lat", "lon", "is_occupied", "status_timestamp"]
+OCCUPIED = "Present"
+# 按度数换算网格时留的余量：椭球上 1 度纬度 110.57~111.69 km，经度同理，放宽 2% 保证不漏
+_MARGIN = 1.02
+
+def snapshot_path():
+    path = setting("BAY_SNAPSHOT", INDEX_DEFAULTS)
+    return Path(path) if path else Path(__file__).resolve().parents[2] / "data" / "sensors_raw.csv"
+
+def prefer_local():
+    return setting("SEARCH_BACKEND", INDEX_DEFAULTS).strip().lower() == "local"
+
+def load_snapshot(path):
+    """
+    读传感器快照：data/sensors_raw.csv（API 原始导出，location.lat / location.lon）
+    或 Parquet（sensor_latest 导出，或已经是 get_bays_within 的列）。每个传感器只保留最新一条；
+    没有时间的记录排在最前面，只有在这个传感器没有别的记录时才会留下。
+    """
+    path = Path(path)
+    df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+    df = df.rename(columns={"kerbsideid": "bay_id", "location.lat": "lat", "location.lon": "lon"})
+    if "is_occupied" not in df.columns:
+        df["is_occupied"] = df["status_description"] == OCCUPIED
+    df["status_timestamp"] = pd.to_datetime(df["status_timestamp"], utc=True)
+    df = df.dropna(subset=["bay_id", "lat", "lon"])
+    df = df.sort_values("status_timestamp", na_position="first", kind="stable").drop_duplicates("bay_id", keep="last")
+    return df[BAY_COLUMNS].astype({"bay_id": "int64", "lat": "float64", "lon": "float64", "is_occupied": bool})
+
+class BayIndex:
+    """
+    均匀网格（按度数切格子，格子边长约 cell_m 米）+ CSR 排列：
+      order     点按格子编号排序后的下标
+      offsets   第 c 个格子的点是 order[offsets[c]:offsets[c + 1]]
+    同一行的相邻格子在 order 里是连续的一段，查询时每行只切一次片。空快照也可以建索引，所有查询返回空结果。
+    """
+    def __init__(self, df, cell_m=100):
+        df = df.reset_index(drop=True)
+        self.df = df
+        self.lat = df["lat"].to_numpy(dtype=float)
+        self.lon = df["lon"].to_numpy(dtype=float)
+        self.cell_m = cell_m
+        self.lat0, self.lon0 = float(self.lat.min(initial=0.0)), float(self.lon.min(initial=0.0))
+        mid = np.radians((self.lat0 + self.lat.max(initial=0.0)) / 2)
+        self.step_lat = cell_m / M_PER_DEG_LAT
+        self.step_lon = cell_m / (M_PER_DEG_LAT * float(np.cos(mid)))
+        iy = ((self.lat - self.lat0) / self.step_lat).astype(np.int64)
+        ix = ((self.lon - self.lon0) / self.step_lon).astype(np.int64)
+        self.ny, self.nx = int(iy.max(initial=-1)) + 1, int(ix.max(initial=-1)) + 1   # 空快照：0 x 0 个格子
+        cell = iy * self.nx + ix
+        self.order = np.argsort(cell, kind="stable")
+        self.offsets = np.searchsorted(cell[self.order], np.arange(self.ny * self.nx + 1))
+
+    @classmethod
+    def from_file(cls, path, cell_m=100):
+        return cls(load_snapshot(path), cell_m)
+
+    def __len__(self):
+        return len(self.df)
+
+    def _cells(self, min_lon, min_lat, max_lon, max_lat):
+        """和经纬度矩形相交的所有格子里的点"""
+        y0 = max(int(np.floor((min_lat - self.lat0) / self.step_lat)), 0)
+        y1 = min(int(np.floor((max_lat - self.lat0) / self.step_lat)), self.ny - 1)
+        x0 = max(int(np.floor((min_lon - self.lon0) / self.step_lon)), 0)
+        x1 = min(int(np.floor((max_lon - self.lon0) / self.step_lon)), self.nx - 1)
+        if y0 > y1 or x0 > x1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(y0, y1 + 1) * self.nx
+        return np.concatenate([self.order[self.offsets[r + x0]:self.offsets[r + x1 + 1]] for r in rows])
+
+    def _candidates(self, lat, lon, radius):
+        """和 (lat, lon, radius) 外接矩形相交的所有格子里的点"""
+        dlat = radius * _MARGIN / M_PER_DEG_LAT
+        dlon = radius * _MARGIN / (M_PER_DEG_LAT * max(float(np.cos(np.radians(abs(lat) + dlat))), 1e-6))
+        return self._cells(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+
+    def _within(self, lat, lon, radius):
+        idx = self._candidates(lat, lon, radius)
+        d = distance_m(lat, lon, self.lat[idx], self.lon[idx])
+        keep = d <= radius
+        return idx[keep], d[keep]
+
+    def _top(self, idx, d, limit):
+        """由近到远排好的前 limit 个"""
+        if limit is not None and len(idx) > limit:
+            top = np.argpartition(d, limit - 1)[:limit]
+            idx, d = idx[top], d[top]
+        out = self.df.iloc[idx[np.argsort(d, kind="stable")]]
+        return out.reset_index(drop=True)
+
+    def within(self, lat, lon, radius, limit=None):
+        """半径 radius 米以内的车位，由近到远，最多 limit 个（等价于 get_bays_within）"""
+        return self._top(*self._within(lat, lon, radius), limit)
+
+    def nearest(self, lat, lon, k, max_radius=None):
+        """最近的 k 个车位：从一个格子大小的半径开始，不够 k 个就把半径翻倍"""
+        if max_radius is None:
+            # 到网格两个对角的距离之和的两倍，一定能覆盖整个索引范围
+            corners = distance_m(lat, lon, [self.lat0, self.lat0 + self.ny * self.step_lat],
+                                 [self.lon0, self.lon0 + self.nx * self.step_lon])
+            max_radius = 2 * float(corners.sum())
+        radius = float(self.cell_m)
+        while True:
+            radius = min(radius, max_radius)
+            idx, d = self._within(lat, lon, radius)
+            if len(idx) >= k or radius >= max_radius:
+                return self._top(idx, d, k)
+            radius *= 2
+
+    def in_bbox(self, min_lon, min_lat, max_lon, max_lat, limit=None):
+        """经纬度矩形里的车位（等价于 get_bays_in_bbox：按 bay_id 排序，最多 limit 个）"""
+        idx = self._cells(min_lon, min_lat, max_lon, max_lat)
+        lat, lon = self.lat[idx], self.lon[idx]
+        idx = idx[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+        out = self.df.iloc[idx].sort_values("bay_id", kind="stable")
+        return out.iloc[:limit].reset_index(drop=True)
@@ -0,0 +1,51 @@
+# app/lib/viewport.py
+# 地图视野 <-> 经纬度矩形 <-> 固定缩放级别的瓦片（Web Mercator / slippy map 编号，和 Leaflet 一致）。
+# 视野加载模式按瓦片取数：瓦片边界固定，平移后大部分瓦片和上一次相同，可以直接用缓存。
+import math
+
+from lib.clustering import TILE_SIZE, mercator_px
+
+TILE_ZOOM = 15        # 取数用的瓦片级别：墨尔本一带一块约 1 公里见方
+MAX_TILES = 64        # 视野需要的瓦片超过这么多时（缩得太小）不再加载单个车位
+
+def unproject(x, y, zoom):
+    """世界像素坐标 -> (lat, lon)"""
+    scale = TILE_SIZE * 2.0 ** zoom
+    lon = x / scale * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / scale))))
+    return lat, lon
+
+def view_bounds(lat, lon, zoom, width, height):
+    """以 (lat, lon) 为中心、width × height 像素的地图在 zoom 级别下的视野 (min_lon, min_lat, max_lon, max_lat)"""
+    x, y = mercator_px(lat, lon, zoom)
+    north, west = unproject(float(x) - width / 2, float(y) - height / 2, zoom)
+    south, east = unproject(float(x) + width / 2, float(y) + height / 2, zoom)
+    return west, south, east, north
+
+def folium_bounds(b):
+    """
+    st_folium 回传的 bounds（_southWest / _northEast）-> (min_lon, min_lat, max_lon, max_lat)。
+    浏览器还没回传时 st_folium 给的是地图内容的范围（可能只是一个点），这种情况和缺失一样返回 None。
+    """
+    try:
+        sw, ne = b["_southWest"], b["_northEast"]
+        out = float(sw["lng"]), float(sw["lat"]), float(ne["lng"]), float(ne["lat"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return out if out[2] > out[0] and out[3] > out[1] else None
+
+def tile_bounds(z, x, y):
+    """瓦片 -> (min_lon, min_lat, max_lon, max_lat)"""
+    north, west = unproject(x * TILE_SIZE, y * TILE_SIZE, z)
+    south, east = unproject((x + 1) * TILE_SIZE, (y + 1) * TILE_SIZE, z)
+    return west, south, east, north
+
+def tiles_for_bounds(bounds, zoom=TILE_ZOOM):
+    """覆盖矩形的所有瓦片 [(z, x, y)]"""
+    min_lon, min_lat, max_lon, max_lat = bounds
+    x0, y0 = mercator_px(max_lat, min_lon, zoom)
+    x1, y1 = mercator_px(min_lat, max_lon, zoom)
+    n = 2 ** zoom
+    xs = range(max(int(x0 // TILE_SIZE), 0), min(int(x1 // TILE_SIZE), n - 1) + 1)
+    ys = range(max(int(y0 // TILE_SIZE), 0), min(int(y1 // TILE_SIZE), n - 1) + 1)
+    return [(zoom, x, y) for y in ys for x in xs]
@@ -6,7 +6,8 @@ import altair as alt
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
-from lib.db import get_engine
+from lib.db import get_read_engine, read_frame
+from lib.shared_cache import shared_cache, data_version
 from lib.ui_components import (
     apply_safe_custom_css, create_header, create_info_box, 
     create_footer, create_metric_card
@@ -28,9 +29,9 @@ create_header(
     "Compare Victoria with other Australian states (2016–2020)"
 )
 
-# 数据库连接
+# 数据库连接（页面只读，配置了只读副本时优先走副本）
 try:
-    engine = get_engine()
+    engine = get_read_engine()
     db_available = True
 except Exception as e:
     st.warning("⚠️ **Database unavailable, running in Demo Mode** - " + str(e)[:100] + "...")
@@ -63,16 +64,18 @@ demo_data = {
     })
 }
 
-@st.cache_data(ttl=600)
+# 查询结果放在所有 worker 共享的缓存里，car_ownership_by_state 重新加载后自动作废
+CAR_OWNERSHIP_VERSION = data_version("car_ownership_by_state")
+
+@shared_cache("car_states", ttl_s=600, version=CAR_OWNERSHIP_VERSION)
 def fetch_states():
     if db_available:
         sql = text("SELECT DISTINCT state FROM car_ownership_by_state ORDER BY state")
-        with engine.begin() as conn:
-            return pd.read_sql(sql, conn)["state"].tolist()
+        return read_frame(sql, engine=engine)["state"].tolist()
     else:
         return demo_data['states']
 
-@st.cache_data(ttl=600)
+@shared_cache("car_ownership", ttl_s=600, version=CAR_OWNERSHIP_VERSION)
 def fetch_car_ownership(vic_label: str, other: str | None):
     if db_available:
         if other is None:
@@ -91,8 +94,7 @@ def fetch_car_ownership(vic_label: str, other: str | None):
                 ORDER BY year
             """)
             params = {"vic": vic_label, "other": other}
-        with engine.begin() as conn:
-            return pd.read_sql(sql, conn, params=params)
+        return read_frame(sql, params, engine)
     else:
         # 使用演示数据
         df = demo_data['car_ownership'].copy()
@@ -6,7 +6,8 @@ import altair as alt
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
-from lib.db import get_engine
+from lib.db import get_read_engine, read_frame
+from lib.shared_cache import shared_cache, data_version
 from lib.ui_components import (
     apply_safe_custom_css, create_header, create_info_box, 
     create_footer, create_metric_card
@@ -28,9 +29,9 @@ create_header(
     "Victoria's demographic trends and urban development (2001–2021)"
 )
 
-# 数据库连接
+# 数据库连接（页面只读，配置了只读副本时优先走副本）
 try:
-    engine = get_engine()
+    engine = get_read_engine()
     db_available = True
 except Exception as e:
     st.warning("⚠️ **Database unavailable, running in Demo Mode** - " + str(e)[:100] + "...")
@@ -48,12 +49,12 @@ demo_population_data = pd.DataFrame({
     ]
 })
 
-@st.cache_data(ttl=600)
+# 查询结果放在所有 worker 共享的缓存里，population_cbd 重新加载后自动作废
+@shared_cache("population", ttl_s=600, version=data_version("population_cbd"))
 def fetch_population():
     if db_available:
         sql = text("SELECT * FROM population_cbd ORDER BY year")
-        with engine.begin() as conn:
-            return pd.read_sql(sql, conn)
+        return read_frame(sql, engine=engine)
     else:
         return demo_population_data
 
@@ -9,11 +9,31 @@ from streamlit_folium import st_folium
 import folium
 
 # ---------- 1) 连接数据库 ----------
-from lib.db import get_engine
+from lib.db import get_read_engine, read_frame
 from lib.ui_components import (
     apply_safe_custom_css, create_header, create_info_box, 
     create_footer, create_metric_card, create_status_badge
 )
+from lib.occupancy import hourly_occupancy, occupancy_summary
+from lib.search_cache import RadiusSearchCache, TileCache
+from lib.shared_cache import shared_cache, data_version, cache_stats
+from lib.spatial_index import BayIndex, snapshot_path, prefer_local
+from lib.map_layers import BayLayer, ClusterLayer
+from lib.clustering import grid_clusters
+from lib.viewport import MAX_TILES, view_bounds, folium_bounds, tile_bounds, tiles_for_bounds
+from lib.deck_layers import HEX_RADIUS_M, bay_deck
+
+RAW_HISTORY_HOURS = 24   # 回看超过这个小时数时，明细也改用小时汇总，不再拉原始快照
+MAP_ZOOM = 16            # 地图初始缩放级别
+BAY_ZOOM = 17            # 聚合模式下，缩放到这一级及以上才逐个显示车位
+CLUSTER_CELL_PX = 60     # 聚合格子在屏幕上的大小（像素）
+MAX_BAY_MARKERS = 1000   # 结果不超过这么多时不聚合，直接逐个显示
+MAP_WIDTH, MAP_HEIGHT = 1200, 700
+RADIUS_MODE = "Radius around location"
+VIEW_MODE = "Visible map area"
+LEAFLET = "Leaflet (folium)"
+WEBGL = "WebGL (pydeck)"
+MAX_RESULTS = {LEAFLET: 5000, WEBGL: 50000}   # WebGL 渲染几万个车位也能流畅交互
 
 # 页面配置
 st.set_page_config(
@@ -31,17 +51,54 @@ create_header(
     "Find available parking spots in Melbourne CBD with real-time data"
 )
 
-# 数据库连接
+# 数据库连接（页面只读，配置了只读副本时优先走副本）
 try:
-    engine = get_engine()
+    engine = get_read_engine()
     db_available = True
 except Exception as e:
     st.warning("⚠️ **Database unavailable, running in Demo Mode** - " + str(e)[:100] + "...")
     db_available = False
 
+@st.cache_resource
+def get_search_cache():
+    """
+    半径搜索结果缓存，所有会话共享；ETL 水位线变了（有新数据入库）就整体作废。
+    取数按格子中心进行，各个 worker 的 key 一样，所以取到的结果再放一层跨进程的共享缓存。
+    """
+    @shared_cache("bays_within", ttl_s=300, version=data_version("sensor_status"))
+    def fetch(lon, lat, radius, limit):
+        # 缓存在内存里按距离再过滤，坐标要 float64，float32 会让半径 / limit 边界上的车位和直接查库不一致
+        return read_frame("SELECT * FROM get_bays_within(:lon, :lat, :radius, :limit)",
+                          {"lon": lon, "lat": lat, "radius": radius, "limit": limit}, float32_coords=False)
+
+    return RadiusSearchCache(fetch, data_version("sensor_status"))
+
+@st.cache_resource
+def load_bay_index():
+    """本地传感器快照的网格索引（没有数据库或 SEARCH_BACKEND=local 时用）；快照文件不存在时返回 None"""
+    path = snapshot_path()
+    return BayIndex.from_file(path) if path.exists() else None
+
+bay_index = load_bay_index() if (not db_available or prefer_local()) else None
+
+@st.cache_resource
+def get_tile_cache(local):
+    """视野模式的瓦片缓存：local 时从本地快照索引取，否则查 get_bays_in_bbox（再放一层跨进程共享缓存）"""
+    if local:
+        return TileCache(lambda *bbox: load_bay_index().in_bbox(*bbox))
+
+    @shared_cache("bays_in_bbox", ttl_s=300, version=data_version("sensor_status"))
+    def fetch(min_lon, min_lat, max_lon, max_lat, limit):
+        return read_frame("SELECT * FROM get_bays_in_bbox(:min_lon, :min_lat, :max_lon, :max_lat, :limit)",
+                          {"min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat,
+                           "limit": limit})
+
+    return TileCache(fetch, data_version("sensor_status"))
+
 # 演示停车数据
 import numpy as np
 import datetime as dt
+import time
 
 def generate_demo_parking_data(lat, lon, radius_m, limit):
     """生成演示停车数据"""
@@ -105,22 +162,38 @@ with st.sidebar:
     
     # 搜索参数
     st.markdown("### 🔍 Search Parameters")
+    # 视野模式需要真实数据来源（数据库或本地快照），随机演示数据只支持半径搜索
+    search_area = st.radio(
+        "🗺️ Search area",
+        options=[RADIUS_MODE, VIEW_MODE] if (db_available or bay_index is not None) else [RADIUS_MODE],
+        help="Visible map area loads the bays in view as you pan and zoom; areas already loaded are not fetched again"
+    )
+    
+    # WebGL 地图不回传视野，视野模式只能用 Leaflet
+    renderer = st.radio(
+        "🖥️ Map renderer",
+        options=[LEAFLET, WEBGL] if search_area == RADIUS_MODE else [LEAFLET],
+        help="WebGL draws every bay on the GPU, so tens of thousands of results stay interactive"
+    )
+    
     radius_m = st.slider(
         "🎯 Search radius (meters)", 
         min_value=100, 
         max_value=3000, 
         value=600, 
         step=100,
-        help="Larger radius = more results but slower loading"
+        help="Larger radius = more results but slower loading",
+        disabled=search_area == VIEW_MODE
     )
     
     limit = st.slider(
         "📊 Maximum results", 
         min_value=200, 
-        max_value=5000, 
+        max_value=MAX_RESULTS[renderer], 
         value=2000, 
         step=200,
-        help="Limit results for better performance"
+        help="Limit results for better performance",
+        disabled=search_area == VIEW_MODE
     )
 
 # ---------- 3) 查询数据并添加过滤选项 ----------
@@ -133,17 +206,82 @@ with st.sidebar:
     
     if show_free_only and show_occupied_only:
         st.warning("⚠️ Both filters selected - showing all bays")
+    
+    cluster_bays = st.checkbox(
+        "🧩 Cluster bays when zoomed out", value=True,
+        help=f"With more than {MAX_BAY_MARKERS:,} results, bays are grouped into counts per map cell "
+             f"below zoom level {BAY_ZOOM}, so large searches stay fast",
+        disabled=renderer == WEBGL
+    )
+    
+    hex_bins = st.checkbox(
+        "⬡ Aggregate into hexagons", value=False,
+        help=f"WebGL map only: bays are grouped into {HEX_RADIUS_M} m hexagons, "
+             "height shows the number of bays and colour the share occupied",
+        disabled=renderer != WEBGL
+    )
+
+# 地图视野（缩放级别、中心、可见范围）由 st_folium 回传；换了位置、半径或搜索方式时回到初始视野
+view_key = (lat, lon, radius_m, search_area)
+if st.session_state.get("map_view_key") != view_key:
+    st.session_state.update(map_view_key=view_key, map_zoom=MAP_ZOOM, map_center=[lat, lon], map_bounds=None)
+zoom = st.session_state["map_zoom"]
 
 # 获取数据
+view_tiles = []
 with st.spinner("🔍 Searching for parking bays..."):
-    if db_available:
-        sql = text("SELECT * FROM get_bays_within(:lon, :lat, :radius, :limit)")
-        with engine.begin() as conn:
-            df = pd.read_sql(sql, conn, params={"lon": lon, "lat": lat, "radius": radius_m, "limit": limit})
+    if search_area == VIEW_MODE:
+        # 只取视野覆盖到的瓦片；已经取过的瓦片直接用缓存
+        bounds = st.session_state["map_bounds"] or view_bounds(*st.session_state["map_center"], zoom, MAP_WIDTH, MAP_HEIGHT)
+        view_tiles = tiles_for_bounds(bounds)
+        tile_cache = get_tile_cache(bay_index is not None)
+        if len(view_tiles) > MAX_TILES:
+            df = pd.DataFrame(columns=["bay_id", "lat", "lon", "is_occupied", "status_timestamp"])
+        else:
+            df, tiles_fetched, tiles_truncated = tile_cache.load(view_tiles, tile_bounds)
+    elif bay_index is not None:
+        # 本地快照 + 网格索引：真实车位位置和快照时的状态，不需要数据库
+        t0 = time.perf_counter()
+        df = bay_index.within(lat, lon, radius_m, limit)
+        lookup_ms = (time.perf_counter() - t0) * 1000
+    elif db_available:
+        # 同一格子 / 被之前更大的搜索覆盖到的查询直接从缓存里过滤，不再查库
+        search_cache = get_search_cache()
+        df = search_cache.search(lat, lon, radius_m, limit)
     else:
         # 使用演示数据
         df = generate_demo_parking_data(lat, lon, radius_m, limit)
 
+if bay_index is not None:
+    as_of = bay_index.df["status_timestamp"].max()   # 快照为空或没有时间时是 NaT
+    as_of_text = "unknown" if pd.isna(as_of) else f"{as_of:%Y-%m-%d %H:%M} UTC"
+    st.info(f"📦 Searching the local sensor snapshot ({len(bay_index):,} bays, status as of {as_of_text})")
+if search_area == VIEW_MODE:
+    ts = tile_cache.stats()
+    if len(view_tiles) > MAX_TILES:
+        st.warning(f"🔍 Zoom in to load parking bays (the current view needs {len(view_tiles)} map tiles, up to {MAX_TILES} are loaded)")
+    else:
+        st.sidebar.caption(
+            f"Map tiles: {len(view_tiles)} in view, {tiles_fetched} fetched now · "
+            f"tile cache {ts['hits']} hits, {ts['misses']} misses ({ts['entries']} cached)"
+        )
+        if tiles_truncated:
+            # 每块瓦片按 kerbsideid 取前 limit 个，截断时拿到的是瓦片里分布随意的一部分，不是离中心最近的
+            st.warning(f"⚠️ {tiles_truncated} map tile(s) hold more bays than the per-tile limit, so only an arbitrary "
+                       f"subset of their bays (not the nearest ones) is shown; zoom in to see all of them")
+elif bay_index is not None:
+    st.sidebar.caption(f"Local index lookup: {lookup_ms:.2f} ms")
+elif db_available:
+    cs = search_cache.stats()
+    st.sidebar.caption(
+        f"Search cache: {cs['hits']} hits, {cs['superset_hits']} superset hits, {cs['misses']} misses "
+        f"({cs['hit_rate']:.0%} hit rate, {cs['entries']} cached areas)"
+    )
+    shared = cache_stats()
+    if shared and "bays_within" in shared:
+        bs = shared["bays_within"]
+        st.sidebar.caption(f"Shared cache ({shared['backend']}): {bs['hits']} hits, {bs['misses']} misses")
+
 # 应用过滤器
 original_count = len(df)
 if show_free_only and not show_occupied_only:
@@ -152,7 +290,11 @@ elif show_occupied_only and not show_free_only:
     df = df[df["is_occupied"] == True]
 
 # 状态消息
-if df.empty:
+area_desc = "in the visible map area" if search_area == VIEW_MODE else f"within {radius_m}m"
+if df.empty and search_area == VIEW_MODE:
+    if len(view_tiles) <= MAX_TILES:
+        st.info("🗺️ No parking bays in the visible map area. Pan or zoom the map to load more.")
+elif df.empty:
     create_info_box(
         "No Results Found",
         f"No parking bays found within {radius_m}m of the selected location. Try increasing the search radius or selecting a different location.",
@@ -177,7 +319,7 @@ if not df.empty:
         st.markdown(create_metric_card(
             "Total Bays", 
             f"{total:,}", 
-            f"Within {radius_m}m"
+            area_desc.capitalize()
         ), unsafe_allow_html=True)
     
     with col2:
@@ -204,7 +346,8 @@ if not df.empty:
         ), unsafe_allow_html=True)
 
 # ---------- 5) 改进的地图渲染 ----------
-if not df.empty:
+# 视野模式下即使当前视野没有车位也要显示地图，才能继续平移 / 缩放
+if not df.empty or search_area == VIEW_MODE:
     st.markdown("---")
     st.markdown("### 🗺️ Interactive Parking Map")
     
@@ -223,107 +366,105 @@ if not df.empty:
         )
     
     with col_map1:
-        st.markdown(f"📍 **Location**: {location_choice} | **Radius**: {radius_m}m | **Results**: {len(df)} bays")
-    
-    # 创建地图
-    m = folium.Map(
-        location=[lat, lon], 
-        zoom_start=16, 
-        tiles=map_style,
-        prefer_canvas=True
-    )
+        area_label = "Visible map area" if search_area == VIEW_MODE else f"{radius_m}m"
+        st.markdown(f"📍 **Location**: {location_choice} | **Radius**: {area_label} | **Results**: {len(df)} bays")
     
-    # 中心点标记 - 更美观的样式
-    folium.Marker(
-        location=[lat, lon],
-        popup=f"<b>Search Center</b><br/>{location_choice}",
-        icon=folium.Icon(color="blue", icon="bullseye", prefix="fa"),
-        tooltip="Search Center"
-    ).add_to(m)
-    
-    # 搜索半径圆圈
-    folium.Circle(
-        location=[lat, lon], 
-        radius=radius_m, 
-        color="#3b82f6", 
-        fill=False,
-        weight=2,
-        opacity=0.8,
-        popup=f"Search Radius: {radius_m}m"
-    ).add_to(m)
-    
-    # 添加停车位标记
-    for _, r in df.iterrows():
-        color = "#ef4444" if r["is_occupied"] else "#10b981"  # 红色/绿色
-        icon_color = "red" if r["is_occupied"] else "green"
-        status = "Occupied" if r["is_occupied"] else "Available"
-        icon_symbol = "car" if r["is_occupied"] else "check"
-        
-        # Google Maps导航链接
-        gmaps_url = (
-            f"https://www.google.com/maps/dir/?api=1"
-            f"&destination={r['lat']},{r['lon']}"
-            f"&travelmode=driving"
+    free_cnt = int((df["is_occupied"] == False).sum())
+    occ_cnt = int((df["is_occupied"] == True).sum())
+    
+    if renderer == WEBGL:
+        # WebGL：车位直接按列交给 deck.gl 在显卡上画，几万个点也不需要服务端聚合
+        t0 = time.perf_counter()
+        deck = bay_deck(df, lat, lon, radius_m, MAP_ZOOM, hexagons=hex_bins, map_style=map_style)
+        build_ms = (time.perf_counter() - t0) * 1000
+        st.pydeck_chart(deck, height=MAP_HEIGHT)
+        if hex_bins:
+            st.markdown(f"⬡ Column height = number of bays, colour from 🟢 all available to 🔴 all occupied "
+                        f"({free_cnt:,} available, {occ_cnt:,} occupied) | 🔵 Search center")
+        else:
+            st.markdown(f"🟢 Available ({free_cnt:,} bays) | 🔴 Occupied ({occ_cnt:,} bays) | 🔵 Search center")
+        layer_desc = f"{len(df):,} bays" + (f" in {HEX_RADIUS_M} m hexagons" if hex_bins else "")
+        st.caption(f"🗺️ WebGL map built in {build_ms:.0f} ms for {layer_desc}")
+    else:
+        # 创建地图
+        m = folium.Map(
+            location=st.session_state["map_center"], 
+            zoom_start=zoom, 
+            tiles=map_style,
+            prefer_canvas=True
         )
-        
-        # 美化的弹窗内容
-        popup_html = f"""
-        <div style="font-family: Arial, sans-serif; min-width: 250px;">
-            <div style="background: {'#fef2f2' if r['is_occupied'] else '#f0fdf4'}; 
-                        padding: 10px; border-radius: 8px; margin-bottom: 10px;
-                        border-left: 4px solid {color};">
-                <h4 style="margin: 0 0 8px 0; color: #1f2937;">
-                    🅿️ Bay #{int(r['bay_id'])}
-                </h4>
-                <p style="margin: 4px 0; color: #374151;">
-                    <b>Status:</b> 
-                    <span style="color: {color}; font-weight: bold;">
-                        {'🔴' if r['is_occupied'] else '🟢'} {status}
-                    </span>
-                </p>
-                <p style="margin: 4px 0; color: #6b7280; font-size: 0.9em;">
-                    <b>Last Updated:</b><br/>{r['status_timestamp']}
-                </p>
-            </div>
-            <div style="text-align: center;">
-                <a href="{gmaps_url}" target="_blank" 
-                   style="display: inline-block; background: #3b82f6; color: white; 
-                          padding: 8px 16px; text-decoration: none; border-radius: 6px;
-                          font-weight: bold;">
-                    🧭 Navigate Here
-                </a>
-            </div>
+    
+        # 中心点标记 - 更美观的样式
+        folium.Marker(
+            location=[lat, lon],
+            popup=f"<b>Search Center</b><br/>{location_choice}",
+            icon=folium.Icon(color="blue", icon="bullseye", prefix="fa"),
+            tooltip="Search Center"
+        ).add_to(m)
+    
+        # 搜索半径圆圈（视野模式没有半径）
+        if search_area == RADIUS_MODE:
+            folium.Circle(
+                location=[lat, lon], 
+                radius=radius_m, 
+                color="#3b82f6", 
+                fill=False,
+                weight=2,
+                opacity=0.8,
+                popup=f"Search Radius: {radius_m}m"
+            ).add_to(m)
+    
+        # 添加停车位标记：缩放级别不够时按格子聚合成数量，否则所有车位一个图层（弹窗在浏览器端按模板生成）
+        t0 = time.perf_counter()
+        if cluster_bays and zoom < BAY_ZOOM and len(df) > MAX_BAY_MARKERS:
+            clusters = grid_clusters(df, zoom, CLUSTER_CELL_PX)
+            layer = ClusterLayer(clusters).add_to(m)
+            layer_desc = f"{len(clusters):,} clusters of {len(df):,} bays at zoom {zoom} (individual bays from zoom {BAY_ZOOM})"
+        else:
+            layer = BayLayer(df).add_to(m)
+            layer_desc = f"{len(df):,} bays"
+    
+        # 添加图例
+        legend_html = f"""
+        <div style="position: fixed; 
+                    top: 10px; right: 10px; width: 200px; height: 120px; 
+                    background-color: white; border: 2px solid grey; z-index:9999; 
+                    font-size: 14px; border-radius: 8px; padding: 10px;">
+        <h4 style="margin-top: 0;">Legend</h4>
+        <p><span style="color: #10b981;">🟢</span> Available ({free_cnt} bays)</p>
+        <p><span style="color: #ef4444;">🔴</span> Occupied ({occ_cnt} bays)</p>
+        <p><span style="color: #3b82f6;">📍</span> Search Center</p>
         </div>
         """
-        
-        folium.CircleMarker(
-            location=[r["lat"], r["lon"]],
-            radius=6,
-            color=color,
-            fill=True,
-            fillColor=color,
-            fillOpacity=0.8,
-            weight=2,
-            popup=folium.Popup(popup_html, max_width=300),
-            tooltip=f"Bay #{int(r['bay_id'])} - {status}"
-        ).add_to(m)
+        m.get_root().html.add_child(folium.Element(legend_html))
     
-    # 添加图例
-    legend_html = f"""
-    <div style="position: fixed; 
-                top: 10px; right: 10px; width: 200px; height: 120px; 
-                background-color: white; border: 2px solid grey; z-index:9999; 
-                font-size: 14px; border-radius: 8px; padding: 10px;">
-    <h4 style="margin-top: 0;">Legend</h4>
-    <p><span style="color: #10b981;">🟢</span> Available ({free_cnt} bays)</p>
-    <p><span style="color: #ef4444;">🔴</span> Occupied ({occ_cnt} bays)</p>
-    <p><span style="color: #3b82f6;">📍</span> Search Center</p>
-    </div>
-    """
-    m.get_root().html.add_child(folium.Element(legend_html))
+        # 图层构建耗时和车位数据的体积（发给浏览器的主要部分）；HTML 由 st_folium 渲染，这里不为了量体积再渲染一遍
+        payload_kb = len(layer.data.encode()) / 1024
+        build_ms = (time.perf_counter() - t0) * 1000
+    
+        # 显示地图
+        # 回传的每一项变了都会让整个页面重跑：可见范围（bounds）只有视野模式用得到，半径模式不要，否则每次平移都重新查询、重建地图
+        returned = ["last_object_clicked", "zoom", "center"] + (["bounds"] if search_area == VIEW_MODE else [])
+        st_map = st_folium(m, width=MAP_WIDTH, height=MAP_HEIGHT, returned_objects=returned)
+        st.caption(f"🗺️ Map built in {build_ms:.0f} ms for {layer_desc} · layer data {payload_kb:,.0f} KB")
     
-    # 显示地图
-    st_map = st_folium(m, width=1200, height=700, returned_objects=["last_object_clicked"])
+        # 缩放级别变了：记下当前视野，按新的级别重新聚合；
+        # 视野模式下平移到需要新瓦片的地方也重新取数（在已加载的瓦片里平移不重画）
+        st_map = st_map or {}
+        new_zoom = st_map.get("zoom")
+        zoom_changed = new_zoom is not None and int(new_zoom) != zoom
+        new_bounds = folium_bounds(st_map.get("bounds"))
+        tiles_changed = (search_area == VIEW_MODE and new_bounds is not None
+                         and set(tiles_for_bounds(new_bounds)) != set(view_tiles))
+        if tiles_changed or (zoom_changed and (search_area == VIEW_MODE or (cluster_bays and len(df) > MAX_BAY_MARKERS))):
+            center = st_map.get("center") or {}
+            if new_zoom is not None:
+                st.session_state["map_zoom"] = int(new_zoom)
+            if "lat" in center and "lng" in center:
+                st.session_state["map_center"] = [center["lat"], center["lng"]]
+            if new_bounds is not None:
+                st.session_state["map_bounds"] = new_bounds
+            st.rerun()
 
 # ---------- 6) 改进的历史数据分析 ----------
 if not df.empty:
@@ -356,10 +497,12 @@ if not df.empty:
 
     if bay_id:
         with st.spinner(f"📈 Loading history for Bay #{bay_id}..."):
+            params = {"bay_id": int(bay_id), "hrs": int(hours)}
             if db_available:
-                hist_sql = text("SELECT * FROM get_bay_history(:bay_id, :hrs)")
-                with engine.begin() as conn:
-                    hist = pd.read_sql(hist_sql, conn, params={"bay_id": int(bay_id), "hrs": int(hours)})
+                # 占用率等统计来自小时汇总（按时间加权）；回看较短时才拉原始快照画明细
+                occ = read_frame("SELECT * FROM get_bay_occupancy(:bay_id, :hrs)", params, engine)
+                if hours <= RAW_HISTORY_HOURS:
+                    hist = read_frame("SELECT * FROM get_bay_history(:bay_id, :hrs)", params, engine)
             else:
                 # 生成演示历史数据
                 np.random.seed(int(bay_id))
@@ -375,26 +518,30 @@ if not df.empty:
                     })
                 
                 hist = pd.DataFrame(hist_data).sort_values('status_timestamp')
+                occ = hourly_occupancy(hist, hours)
+
+            if hours > RAW_HISTORY_HOURS:
+                # 长回看：明细表和曲线也用逐小时数据（每小时结束时的状态）
+                hist = occ.dropna(subset=["is_occupied"]).rename(columns={"hour": "status_timestamp"})
+                hist = hist[["bay_id", "is_occupied", "status_timestamp"]]
 
-        if hist.empty:
+        if occ["observed_minutes"].sum() == 0:
             create_info_box(
                 "No Historical Data",
                 f"No historical data found for Bay #{bay_id} in the last {hours} hours. This could mean the bay is new or has no recorded status changes.",
                 "ℹ️"
             )
         else:
-            # 历史数据统计
-            total_records = len(hist)
-            occupied_records = hist["is_occupied"].sum()
-            occupancy_rate = (occupied_records / total_records * 100) if total_records > 0 else 0
+            # 历史数据统计：按时间加权的占用率
+            occupancy_rate, occupied_hours, observed_hours, changes = occupancy_summary(occ)
             
             # 统计卡片
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
                 st.markdown(create_metric_card(
-                    "Total Records", 
-                    f"{total_records:,}", 
+                    "Observed Time", 
+                    f"{observed_hours:.1f} h", 
                     f"Last {hours}h"
                 ), unsafe_allow_html=True)
             
@@ -402,22 +549,22 @@ if not df.empty:
                 st.markdown(create_metric_card(
                     "Occupied Time", 
                     f"{occupancy_rate:.1f}%", 
-                    f"{occupied_records} records"
+                    f"{occupied_hours:.1f} h occupied"
                 ), unsafe_allow_html=True)
             
             with col3:
                 st.markdown(create_metric_card(
                     "Available Time", 
                     f"{100-occupancy_rate:.1f}%", 
-                    f"{total_records-occupied_records} records"
+                    f"{observed_hours - occupied_hours:.1f} h free"
                 ), unsafe_allow_html=True)
             
             with col4:
-                pattern = "High Turnover" if total_records > 20 else "Stable" if total_records > 5 else "Low Activity"
+                pattern = "High Turnover" if changes > 20 else "Stable" if changes > 5 else "Low Activity"
                 st.markdown(create_metric_card(
                     "Activity Level", 
                     pattern, 
-                    f"{total_records} changes"
+                    f"{changes} changes"
                 ), unsafe_allow_html=True)
             
             # 数据表格
@@ -534,7 +681,7 @@ if not df.empty:
             
             create_info_box(
                 "Usage Insights",
-                insight + f" Based on {total_records} status changes in the last {hours} hours.",
+                insight + f" Based on {observed_hours:.1f} observed hours and {changes} status changes in the last {hours} hours.",
                 "💡"
             )
 
@@ -0,0 +1,155 @@
+# etl/api_client.py
+# Melbourne Open Data (Opendatasoft v2.1) 分页抓取的公共引擎：
+# 第一页拿 total_count，剩余页用有界线程池并发请求，共享一个 keep-alive Session，
+# 失败自动重试+退避，最后按 offset 顺序合并。
+# /records 端点只允许 offset + limit <= 10000，记录数超过时改走 /exports/jsonl 一次流式导出。
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+PAGE_SIZE = 100
+DEFAULT_WORKERS = int(os.getenv("ETL_FETCH_WORKERS", "8"))
+DEFAULT_RETRIES = int(os.getenv("ETL_FETCH_RETRIES", "5"))
+TIMEOUT = 30
+MAX_OFFSET_WINDOW = 10000   # /records 的分页上限，超过返回 HTTP 400
+
+
+def make_session(workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=0.5):
+    """创建带连接池和重试的 Session（429/5xx 指数退避重试）"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers), max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def extract_rows(data):
+    """结果结构可能不同：有的在 results[*]['fields']，有的在 'record'，有的直接平铺"""
+    results = data.get("results", [])
+    if not results:
+        return []
+    if "fields" in results[0]:
+        return [rec["fields"] for rec in results]
+    if "record" in results[0]:
+        return [rec["record"] for rec in results]
+    return results
+
+
+def fetch_page(session, base_url, offset, page_size=PAGE_SIZE, params=None):
+    """请求一页，返回 (total_count, rows)"""
+    q = dict(params or {})
+    q.update({"limit": page_size, "offset": offset})
+    r = session.get(base_url, params=q, timeout=TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    return data.get("total_count"), extract_rows(data)
+
+
+def exports_url(base_url, fmt="jsonl"):
+    """.../datasets/<id>/records -> .../datasets/<id>/exports/<fmt>"""
+    root, sep, tail = base_url.rstrip("/").rpartition("/records")
+    if not sep or tail:
+        raise ValueError(f"not a /records endpoint: {base_url}")
+    return f"{root}/exports/{fmt}"
+
+
+def iter_export(session, base_url, total, page_size=PAGE_SIZE, params=None):
+    """
+    /exports/jsonl 一次请求拿全部记录（同样的 where / order_by），边下载边按 page_size 切成页，
+    产出 (offset, rows)，和分页抓取的结果一致。
+    """
+    q = dict(params or {})
+    q["limit"] = total
+    with session.get(exports_url(base_url), params=q, timeout=TIMEOUT, stream=True) as r:
+        r.raise_for_status()
+        off, page = 0, []
+        for line in r.iter_lines():
+            if not line:
+                continue
+            page.append(json.loads(line))
+            if len(page) == page_size:
+                yield off, page
+                off += len(page)
+                page = []
+        if page:
+            yield off, page
+
+
+def iter_pages(base_url, page_size=PAGE_SIZE, max_total=None, workers=DEFAULT_WORKERS,
+               params=None, session=None, verbose=True):
+    """
+    按 offset 顺序逐页产出 (offset, rows)。
+    - 第一页确定 total_count（再用 max_total 截断）
+    - 其余页并发抓取，但同时在途的页数不超过 workers*2，内存有上限
+    - total 超过 MAX_OFFSET_WINDOW 时 /records 翻不到后面的页，全部改从 /exports 流式读取
+    """
+    own_session = session is None
+    if own_session:
+        session = make_session(workers)
+    try:
+        total, rows = fetch_page(session, base_url, 0, page_size, params)
+        if total is None:
+            total = max_total if max_total is not None else len(rows)
+        if max_total is not None:
+            total = min(total, max_total)
+        if verbose:
+            print(f"total_count={total}")
+        if not rows:
+            return
+        if total > MAX_OFFSET_WINDOW:
+            if verbose:
+                print(f"more than {MAX_OFFSET_WINDOW} records, streaming from the exports endpoint")
+            for off, page_rows in iter_export(session, base_url, total, page_size, params):
+                if verbose:
+                    print(f"fetched {off} ~ {off + len(page_rows)}")
+                yield off, page_rows
+            return
+        yield 0, rows[:total]
+
+        offsets = list(range(page_size, total, page_size))
+        if not offsets:
+            return
+
+        window = max(1, workers) * 2
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            pending = {}
+            nxt = 0
+            for off in offsets:
+                # 提交窗口内的页；按顺序等待最早的那一页
+                while nxt < len(offsets) and len(pending) < window:
+                    o = offsets[nxt]
+                    pending[o] = pool.submit(fetch_page, session, base_url, o, page_size, params)
+                    nxt += 1
+                _, page_rows = pending.pop(off).result()
+                if not page_rows:
+                    # 数据在抓取期间缩短了：后面的页也不会有数据
+                    for f in pending.values():
+                        f.cancel()
+                    break
+                page_rows = page_rows[:total - off]
+                if verbose:
+                    print(f"fetched {off} ~ {off + len(page_rows)}")
+                yield off, page_rows
+    finally:
+        if own_session:
+            session.close()
+
+
+def fetch_all_rows(base_url, page_size=PAGE_SIZE, max_total=None, workers=DEFAULT_WORKERS,
+                   params=None, session=None, verbose=True):
+    """抓取全部页并按 offset 顺序合并成一个列表"""
+    all_rows = []
+    for _, rows in iter_pages(base_url, page_size, max_total, workers, params, session, verbose):
+        all_rows.extend(rows)
+    return all_rows
@@ -0,0 +1,45 @@
+# etl/backfill_geom.py
+# 一次性迁移：给历史遗留的 geom IS NULL 行补上 geom。
+# 之后的加载都会在写入时直接算 geom（见 load_sensor_csv.GEOM_EXPR），不需要再跑这个。
+# 按 kerbsideid 区间分批 UPDATE、逐批提交，走主键索引，避免一次锁住/重写整张表。
+import argparse
+
+import psycopg2
+
+from load_sensor_csv import DATABASE_URL, GEOM_EXPR
+
+STEP = 1000  # 每批覆盖多少个 kerbsideid
+
+def backfill(step=STEP):
+    total = 0
+    with psycopg2.connect(DATABASE_URL) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT min(kerbsideid), max(kerbsideid) FROM sensor_status")
+            lo, hi = cur.fetchone()
+        conn.commit()
+        if lo is None:
+            print("sensor_status is empty")
+            return 0
+
+        for start in range(lo, hi + 1, step):
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE sensor_status
+                       SET geom = {GEOM_EXPR}
+                     WHERE kerbsideid >= %s AND kerbsideid < %s
+                       AND geom IS NULL AND lon IS NOT NULL AND lat IS NOT NULL
+                """, (start, start + step))
+                n = cur.rowcount
+            conn.commit()
+            total += n
+            if n:
+                print(f"kerbsideid {start} ~ {start + step - 1}: {n} rows")
+
+    print(f"backfilled geom for {total} rows")
+    return total
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="One-time geom backfill for existing sensor_status rows")
+    ap.add_argument("--step", type=int, default=STEP, help="每批覆盖多少个 kerbsideid")
+    args = ap.parse_args()
+    backfill(args.step)
@@ -0,0 +1,68 @@
+# etl/db_load.py
+# ETL 写库的公共部分：
+#   - 复用 app/lib/db_config.py 的连接配置（secrets / .env / 环境变量），不再每个脚本各建一个 engine；
+#     db_config 不依赖 streamlit，语句超时用 ETL 自己的 ETL_STATEMENT_TIMEOUT_MS（默认不限制），
+#     不继承页面的 DB_STATEMENT_TIMEOUT_MS
+#   - 基于 unnest 数组的批量 upsert：不管多少行都只有一次往返
+#   - 写入后在 etl_watermarks 里记录这张表的更新时间，页面的共享缓存（app/lib/shared_cache.py）按它作废
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import text
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+from lib.db_config import build_db_url, create_engine, setting  # noqa: E402
+from watermark import advance_watermark  # noqa: E402
+
+ETL_DEFAULTS = {
+    "ETL_STATEMENT_TIMEOUT_MS": 0,   # ETL 连接的服务端语句超时，0 表示不限制（大表批量写入可能很久）
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """ETL 写库用的主库 engine：和页面同样的 URL / 连接池配置，语句超时单独配置"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                db_url = build_db_url()
+                if db_url is None:
+                    raise RuntimeError("No database URL configured (DATABASE_URL)")
+                _engine = create_engine(db_url, setting("ETL_STATEMENT_TIMEOUT_MS", ETL_DEFAULTS))
+    return _engine
+
+def _column_values(s: pd.Series):
+    """转成 Python 原生值（numpy 标量驱动不认），缺失值变 None"""
+    return [None if pd.isna(v) else v for v in s.astype(object).tolist()]
+
+def upsert_frame(conn, table, df: pd.DataFrame, types: dict, key: list):
+    """
+    把 df 一次性 upsert 到 table：
+      INSERT ... SELECT * FROM unnest(:col1::type[], ...) ON CONFLICT (key) DO UPDATE
+    types: {列名: Postgres 类型}，决定写入哪些列及顺序；key: 冲突键。
+    返回写入（插入或更新）的行数。
+    """
+    if df.empty:
+        return 0
+    cols = list(types)
+    arrays = ", ".join(f"CAST(:{c} AS {t}[])" for c, t in types.items())
+    updates = [c for c in cols if c not in key]
+    on_conflict = (f"DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updates)
+                   if updates else "DO NOTHING")
+    sql = text(f"""
+        INSERT INTO {table} ({", ".join(cols)})
+        SELECT * FROM unnest({arrays})
+        ON CONFLICT ({", ".join(key)}) {on_conflict}
+    """)
+    result = conn.execute(sql, {c: _column_values(df[c]) for c in cols})
+    with conn.connection.cursor() as cur:   # 同一个事务
+        advance_watermark(cur, datetime.now(timezone.utc), name=table)
+    return result.rowcount
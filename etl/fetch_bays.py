@@ -1,43 +1,34 @@
 # etl/fetch_bays.py
-import requests
+import argparse
 import pandas as pd
 from pandas import json_normalize
 
+from api_client import fetch_all_rows, DEFAULT_WORKERS
+
 BASE_URL = "https://data.melbourne.vic.gov.au/api/explore/v2.1/catalog/datasets/on-street-parking-bays/records"
 PAGE_SIZE = 100
-TOTAL = 32000  # 这个数据集记录更多；先拉几千行试下，OK 再拉全量
-
-def fetch_all(max_total=2000):
-    all_rows = []
-    for offset in range(0, max_total, PAGE_SIZE):
-        url = f"{BASE_URL}?limit={PAGE_SIZE}&offset={offset}"
-        r = requests.get(url, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        results = data.get("results", [])
-        if not results:
-            break
 
-        if "fields" in results[0]:
-            rows = [rec["fields"] for rec in results]
-        elif "record" in results[0]:
-            rows = [rec["record"] for rec in results]
-        else:
-            rows = results
-        all_rows.extend(rows)
-        print(f"fetched {offset} ~ {offset+PAGE_SIZE}")
+KEEP = [
+    "bay_id", "marker_id", "rd_seg_id", "rd_seg_dsc", "street_marker",
+    "street_name", "sign_plate_id", "parking_zone", "location.lat", "location.lon", "lat", "lon"
+]
 
+def fetch_all(max_total=None, workers=DEFAULT_WORKERS, base_url=BASE_URL):
+    # 记录数（~32k）由第一页的 total_count 决定；max_total 只用于试跑
+    all_rows = fetch_all_rows(base_url, PAGE_SIZE, max_total=max_total, workers=workers)
     df = json_normalize(all_rows)
-    keep = [
-        "bay_id", "marker_id", "rd_seg_id", "rd_seg_dsc", "street_marker",
-        "street_name", "sign_plate_id", "parking_zone", "location.lat", "location.lon", "lat", "lon"
-    ]
-    keep = [c for c in keep if c in df.columns]
+    keep = [c for c in KEEP if c in df.columns]
     return df[keep] if keep else df
 
 if __name__ == "__main__":
-    df = fetch_all(max_total=5000)  # 先拉 5000 行验证
-    out = "data/bays_raw.csv"
-    df.to_csv(out, index=False)
-    print(f"saved: {out}  ({len(df)} rows)")
+    ap = argparse.ArgumentParser(description="Fetch on-street parking bays")
+    ap.add_argument("--max-total", type=int, default=None, help="最多抓取多少条（默认全部）")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并发请求数")
+    ap.add_argument("--out", default="data/bays_raw.csv")
+    ap.add_argument("--base-url", default=BASE_URL, help="API 地址（/records 端点），默认官方数据集；测试时可指向本地替身服务")
+    args = ap.parse_args()
+
+    df = fetch_all(max_total=args.max_total, workers=args.workers, base_url=args.base_url)
+    df.to_csv(args.out, index=False)
+    print(f"saved: {args.out}  ({len(df)} rows)")
     print(df.head())
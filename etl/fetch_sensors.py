@@ -1,48 +1,76 @@
 # etl/fetch_sensors.py
-import requests
+import argparse
+from datetime import datetime, timezone
 import pandas as pd
 from pandas import json_normalize
 
+from api_client import fetch_all_rows, DEFAULT_WORKERS
+
 BASE_URL = "https://data.melbourne.vic.gov.au/api/explore/v2.1/catalog/datasets/on-street-parking-bay-sensors/records"
 PAGE_SIZE = 100
-TOTAL = 3309   # 你页面左上角显示的 records 数，先写死；也可以先请求一页拿 total_count
-
-def fetch_all():
-    all_rows = []
-    for offset in range(0, TOTAL, PAGE_SIZE):
-        url = f"{BASE_URL}?limit={PAGE_SIZE}&offset={offset}"
-        r = requests.get(url, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-
-        results = data.get("results", [])
-        if not results:
-            break
-
-        # 结果结构可能不同：有的在 results[*]['fields']，有的直接平铺
-        if "fields" in results[0]:
-            rows = [rec["fields"] for rec in results]
-        elif "record" in results[0]:
-            rows = [rec["record"] for rec in results]
-        else:
-            rows = results  # 直接平铺
-
-        all_rows.extend(rows)
-        print(f"fetched {offset} ~ {offset+PAGE_SIZE}")
 
+# 统一挑一些常用字段（存在就保留）
+KEEP = [
+    "bay_id", "status", "status_description", "status_timestamp", "statusupdated",
+    "zone_number", "kerbsideid", "streetname", "rd_seg_dsc",
+    "location.lat", "location.lon", "lat", "lon"   # 不同结构兜底
+]
+
+# 没有新记录时也要写出表头，下游 loader 才能正常读
+EMPTY_COLUMNS = ["status_description", "status_timestamp", "zone_number", "kerbsideid",
+                 "location.lat", "location.lon"]
+
+def parse_since(since):
+    """
+    水位线 -> 带时区的 UTC datetime。字符串必须是 ISO 时间（datetime.fromisoformat 能解析），
+    否则 ValueError；不带时区的按 UTC。拼进 ODSQL 的只会是规范化后的时间，不会是原样的输入。
+    """
+    if not isinstance(since, datetime):
+        since = datetime.fromisoformat(str(since).strip())
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since.astimezone(timezone.utc)
+
+def incremental_params(since):
+    """只要 status_timestamp 晚于水位线的记录，按时间升序（分页期间新数据只会追加在末尾）"""
+    since = parse_since(since).isoformat()
+    return {"where": f"status_timestamp > date'{since}'", "order_by": "status_timestamp"}
+
+def fetch_all(max_total=None, workers=DEFAULT_WORKERS, base_url=BASE_URL, since=None):
+    """since=None 为全量快照；传入时间戳则只拉增量"""
+    params = incremental_params(since) if since is not None else None
+    # total_count 由第一页返回，不再写死
+    all_rows = fetch_all_rows(base_url, PAGE_SIZE, max_total=max_total, workers=workers, params=params)
     df = json_normalize(all_rows)
-    # 统一挑一些常用字段（存在就保留）
-    keep = [
-        "bay_id", "status", "status_description", "status_timestamp", "statusupdated",
-        "zone_number", "kerbsideid", "streetname", "rd_seg_dsc",
-        "location.lat", "location.lon", "lat", "lon"   # 不同结构兜底
-    ]
-    keep = [c for c in keep if c in df.columns]
+    if df.empty:
+        return pd.DataFrame(columns=EMPTY_COLUMNS)
+    keep = [c for c in KEEP if c in df.columns]
     return df[keep] if keep else df
 
 if __name__ == "__main__":
-    df = fetch_all()
-    out = "data/sensors_raw.csv"
-    df.to_csv(out, index=False)
-    print(f"saved: {out}  ({len(df)} rows)")
+    ap = argparse.ArgumentParser(description="Fetch on-street parking bay sensors")
+    ap.add_argument("--max-total", type=int, default=None, help="最多抓取多少条（默认全部）")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并发请求数")
+    ap.add_argument("--out", default="data/sensors_raw.csv")
+    ap.add_argument("--incremental", action="store_true",
+                    help="只拉取比数据库水位线更新的记录（默认全量快照，用于恢复）")
+    ap.add_argument("--since", default=None, type=parse_since,
+                    help="手动指定水位线（ISO 时间），覆盖数据库中的值")
+    ap.add_argument("--base-url", default=BASE_URL, help="API 地址（/records 端点），默认官方数据集；测试时可指向本地替身服务")
+    args = ap.parse_args()
+
+    since = None
+    if args.since:
+        since = args.since
+    elif args.incremental:
+        from watermark import load_watermark
+        since = load_watermark()
+        if since is None:
+            print("no watermark yet, falling back to full snapshot")
+    if since is not None:
+        print(f"incremental since {since}")
+
+    df = fetch_all(max_total=args.max_total, workers=args.workers, base_url=args.base_url, since=since)
+    df.to_csv(args.out, index=False)
+    print(f"saved: {args.out}  ({len(df)} rows)")
     print(df.head())
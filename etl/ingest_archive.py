@@ -0,0 +1,205 @@
+# etl/ingest_archive.py
+# 批量导入归档的每日传感器快照 CSV：
+#   - 进程池并行解析（列式解析，见 load_sensor_csv.parse_frame）
+#   - 少量数据库连接并行写入
+#   - 每个文件按内容 sha256 记一条导入记录，重跑时跳过已导入的文件
+#   - 单个文件解析或写入失败只记为 failed（不写导入记录，下次重跑会再试），其它文件照常导入；有失败时退出码非 0
+# 用法：python etl/ingest_archive.py archive/            （目录下所有 *.csv）
+#       python etl/ingest_archive.py "archive/2024-*.csv" --procs 8 --db-conns 3
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from load_sensor_csv import DATABASE_URL, parse_frame, load, ensure_derived_tables
+from watermark import advance_watermark
+
+DB_CONNS = 2
+RETRIES = 3
+
+def expand_paths(patterns):
+    """目录 → 目录下的 *.csv；其它按 glob 展开；去重后按文件名排序"""
+    out = []
+    for p in patterns:
+        if os.path.isdir(p):
+            out.extend(glob.glob(os.path.join(p, "*.csv")))
+        else:
+            out.extend(glob.glob(p))
+    return sorted(set(os.path.realpath(p) for p in out))
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_ingested_files(
+            sha256        text PRIMARY KEY,
+            path          text NOT NULL,
+            rows_valid    bigint NOT NULL,
+            rows_inserted bigint NOT NULL,
+            rows_rejected bigint NOT NULL,
+            loaded_at     timestamptz NOT NULL DEFAULT now()
+        );
+    """)
+
+def _parse_file(path, sha):
+    """在子进程里跑：读 + 列式解析"""
+    t0 = time.perf_counter()
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8")
+    frame, reasons = parse_frame(raw)
+    return path, sha, frame, reasons, time.perf_counter() - t0
+
+def _load_file(pool, parsed, mode):
+    """在线程里跑：导入记录和数据在同一个事务里，要么都提交要么都回滚"""
+    path, sha, frame, reasons, parse_s = parsed
+    rejected = sum(reasons.values())
+    conn = pool.getconn()
+    try:
+        for attempt in range(1, RETRIES + 1):
+            t0 = time.perf_counter()
+            try:
+                with conn.cursor() as cur:
+                    # 先占位：别的进程/线程已经导入（或正在导入）同一文件时直接跳过
+                    cur.execute("""
+                        INSERT INTO etl_ingested_files(sha256, path, rows_valid, rows_inserted, rows_rejected)
+                        VALUES (%s, %s, %s, 0, %s)
+                        ON CONFLICT (sha256) DO NOTHING
+                        RETURNING 1
+                    """, (sha, path, len(frame), rejected))
+                    if cur.fetchone() is None:
+                        conn.rollback()
+                        return path, "skipped", 0, 0, parse_s, 0.0
+                    inserted = load(cur, frame, mode) if not frame.empty else 0
+                    if not frame.empty:
+                        advance_watermark(cur, frame["status_timestamp"].max().to_pydatetime())
+                    cur.execute("UPDATE etl_ingested_files SET rows_inserted = %s WHERE sha256 = %s",
+                                (inserted, sha))
+                conn.commit()
+                return path, "loaded", len(frame), inserted, parse_s, time.perf_counter() - t0
+            except (psycopg2.errors.DeadlockDetected, psycopg2.errors.SerializationFailure):
+                # 并行合并同一批主键时偶发死锁，重试即可
+                conn.rollback()
+                if attempt == RETRIES:
+                    raise
+            except Exception:
+                # 回滚后连接才能还给连接池；导入记录也一起回滚，下次重跑会再导入这个文件
+                if not conn.closed:
+                    conn.rollback()
+                raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+def ingest(patterns, procs=None, db_conns=DB_CONNS, mode="copy", force=False):
+    """返回失败的文件列表"""
+    paths = expand_paths(patterns)
+    if not paths:
+        print("no CSV files matched")
+        return []
+    procs = procs or os.cpu_count() or 1
+    t_start = time.perf_counter()
+
+    failed = []
+    pool = ThreadedConnectionPool(1, db_conns, DATABASE_URL)
+    try:
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                ensure_table(cur)
+                ensure_derived_tables(cur)
+                if force:
+                    cur.execute("DELETE FROM etl_ingested_files WHERE path = ANY(%s)", (paths,))
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+
+        with ProcessPoolExecutor(max_workers=procs) as parsers, \
+             ThreadPoolExecutor(max_workers=db_conns) as loaders:
+            # 1) 先算哈希，过滤掉已经导入过的文件
+            shas = dict(zip(paths, parsers.map(file_sha256, paths)))
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT sha256 FROM etl_ingested_files WHERE sha256 = ANY(%s)",
+                                (list(shas.values()),))
+                    done = {r[0] for r in cur.fetchall()}
+                conn.commit()
+            finally:
+                pool.putconn(conn)
+            todo = [p for p in paths if shas[p] not in done]
+            print(f"{len(paths)} files matched, {len(paths) - len(todo)} already ingested, {len(todo)} to load "
+                  f"({procs} parser procs, {db_conns} db conns)")
+
+            # 2) 解析和写入流水线；在途文件数有上限，避免解析结果堆积在内存里
+            window = procs + db_conns
+            queue = list(reversed(todo))
+            parsing, loading = {}, {}   # future -> 文件路径
+            n_done = 0
+            total_rows = total_inserted = total_bytes = 0
+
+            def refill():
+                while queue and len(parsing) + len(loading) < window:
+                    p = queue.pop()
+                    parsing[parsers.submit(_parse_file, p, shas[p])] = p
+
+            refill()
+            while parsing or loading:
+                finished, _ = wait(set(parsing) | set(loading), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    stage = "parse" if fut in parsing else "load"
+                    path = parsing.pop(fut, None) or loading.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        # 这个文件失败不影响其它文件；没有写导入记录，下次重跑会再试
+                        n_done += 1
+                        failed.append(path)
+                        print(f"[{n_done}/{len(todo)}] {os.path.basename(path)}: failed ({stage}): "
+                              f"{type(e).__name__}: {e}")
+                        continue
+                    if stage == "parse":
+                        # 解析完成 → 交给写库线程
+                        loading[loaders.submit(_load_file, pool, result, mode)] = path
+                        continue
+                    path, status, rows, inserted, parse_s, load_s = result
+                    n_done += 1
+                    size = os.path.getsize(path)
+                    if status == "loaded":
+                        total_rows += rows
+                        total_inserted += inserted
+                        total_bytes += size
+                    print(f"[{n_done}/{len(todo)}] {os.path.basename(path)}: {status}, "
+                          f"{rows:,} rows, {inserted:,} inserted, parse {parse_s:.2f}s"
+                          + (f", load {load_s:.2f}s ({rows / load_s:,.0f} rows/s)" if load_s else ""))
+                refill()
+    finally:
+        pool.closeall()
+
+    dt = time.perf_counter() - t_start
+    print(f"ingested {total_rows:,} rows ({total_inserted:,} new) from {total_bytes / 1e6:,.1f} MB "
+          f"in {dt:.1f}s -> {total_rows / dt if dt else 0:,.0f} rows/s, {total_bytes / 1e6 / dt if dt else 0:,.1f} MB/s")
+    if failed:
+        print(f"{len(failed)} file(s) failed: " + ", ".join(os.path.basename(p) for p in failed))
+    return failed
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Parallel ingest of archived sensor snapshot CSVs")
+    ap.add_argument("paths", nargs="+", help="目录或 glob（记得加引号）")
+    ap.add_argument("--procs", type=int, default=None, help="解析进程数（默认 CPU 核数）")
+    ap.add_argument("--db-conns", type=int, default=DB_CONNS, help="并行写库的连接数")
+    ap.add_argument("--mode", choices=["copy", "values"], default="copy")
+    ap.add_argument("--force", action="store_true", help="忽略导入记录，重新导入这些文件")
+    args = ap.parse_args()
+
+    failed = ingest(args.paths, args.procs, args.db_conns, args.mode, args.force)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,128 @@
+# etl/load_bays.py
+# 车位维表：把 fetch_bays.py 导出的 data/bays_raw.csv 批量导入 parking_bays（带 GiST 空间索引），
+# 然后一次性做最近邻匹配，把每个传感器（kerbsideid）对应的车位和路段存进 sensor_bay_match，
+# 之后搜索/历史查询直接按整数键 join，不用每次请求都做空间计算。
+import argparse
+import io
+import os
+import time
+
+import pandas as pd
+import psycopg2
+
+from load_sensor_csv import DATABASE_URL, GEOM_EXPR
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "bays_raw.csv")
+MAX_DISTANCE_M = 15   # 传感器离最近车位超过这个距离就不匹配
+
+BAY_COLUMNS = ["bay_id", "marker_id", "rd_seg_id", "rd_seg_dsc", "street_name", "parking_zone", "lat", "lon"]
+
+def ensure_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS parking_bays(
+            bay_key      bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            bay_id       integer,
+            marker_id    text,
+            rd_seg_id    integer,
+            rd_seg_dsc   text,
+            street_name  text,
+            parking_zone integer,
+            lat          double precision NOT NULL,
+            lon          double precision NOT NULL,
+            geom         geography(Point, 4326) NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS parking_bays_geom_gix ON parking_bays USING gist (geom);
+        CREATE INDEX IF NOT EXISTS parking_bays_rd_seg_idx ON parking_bays (rd_seg_id);
+
+        CREATE TABLE IF NOT EXISTS sensor_bay_match(
+            kerbsideid integer PRIMARY KEY,
+            bay_key    bigint NOT NULL REFERENCES parking_bays (bay_key) ON DELETE CASCADE,
+            bay_id     integer,
+            rd_seg_id  integer,
+            distance_m double precision NOT NULL,
+            matched_at timestamptz NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS sensor_bay_match_bay_idx ON sensor_bay_match (bay_key);
+    """)
+
+def read_bays(csv_path=CSV_PATH):
+    """读 bays_raw.csv，统一列名和类型；坐标无效的行丢掉"""
+    raw = pd.read_csv(csv_path)
+    df = pd.DataFrame(index=raw.index)
+    for c in ("bay_id", "rd_seg_id", "parking_zone"):
+        df[c] = pd.to_numeric(raw[c], errors="coerce").round().astype("Int64") if c in raw else pd.NA
+    for c in ("marker_id", "rd_seg_dsc", "street_name"):
+        df[c] = raw[c].astype("string") if c in raw else pd.NA
+    # 列名可能是 location.lat / location.lon 或 lat / lon
+    for c in ("lat", "lon"):
+        col = pd.Series(float("nan"), index=raw.index)
+        for name in (f"location.{c}", c):
+            if name in raw:
+                col = col.fillna(pd.to_numeric(raw[name], errors="coerce"))
+        df[c] = col
+    bad = df["lat"].isna() | df["lon"].isna()
+    return df.loc[~bad, BAY_COLUMNS], int(bad.sum())
+
+def load_bays(cur, df):
+    """整表替换：COPY 到临时表，再带 geom 一次性写入（车位维表是快照，不做增量）"""
+    cur.execute("""
+        CREATE TEMP TABLE parking_bays_stage (
+            bay_id integer, marker_id text, rd_seg_id integer, rd_seg_dsc text,
+            street_name text, parking_zone integer, lat double precision, lon double precision
+        ) ON COMMIT DROP
+    """)
+    buf = io.StringIO()
+    df.to_csv(buf, header=False, index=False, na_rep=r"\N")
+    buf.seek(0)
+    cur.copy_expert(f"COPY parking_bays_stage ({', '.join(BAY_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                    buf)
+    cur.execute("TRUNCATE sensor_bay_match, parking_bays RESTART IDENTITY")
+    cur.execute(f"""
+        INSERT INTO parking_bays ({', '.join(BAY_COLUMNS)}, geom)
+        SELECT {', '.join(BAY_COLUMNS)}, {GEOM_EXPR}
+          FROM parking_bays_stage
+    """)
+    n = cur.rowcount
+    cur.execute("ANALYZE parking_bays")
+    return n
+
+def match_sensors(cur, max_distance_m=MAX_DISTANCE_M):
+    """每个传感器取最近一次的位置，用 KNN（<->，走 GiST 索引）找最近的车位"""
+    cur.execute("TRUNCATE sensor_bay_match")
+    cur.execute("""
+        INSERT INTO sensor_bay_match (kerbsideid, bay_key, bay_id, rd_seg_id, distance_m)
+        SELECT s.kerbsideid, b.bay_key, b.bay_id, b.rd_seg_id, b.distance_m
+          FROM (SELECT DISTINCT ON (kerbsideid) kerbsideid, geom
+                  FROM sensor_status
+                 WHERE geom IS NOT NULL
+                 ORDER BY kerbsideid, status_timestamp DESC) s
+         CROSS JOIN LATERAL (
+                SELECT p.bay_key, p.bay_id, p.rd_seg_id, ST_Distance(p.geom, s.geom) AS distance_m
+                  FROM parking_bays p
+                 ORDER BY p.geom <-> s.geom
+                 LIMIT 1) b
+         WHERE b.distance_m <= %s
+    """, (max_distance_m,))
+    matched = cur.rowcount
+    cur.execute("SELECT count(DISTINCT kerbsideid) FROM sensor_status")
+    return matched, cur.fetchone()[0]
+
+def main(csv_path=CSV_PATH, max_distance_m=MAX_DISTANCE_M, match_only=False):
+    t0 = time.perf_counter()
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        ensure_tables(cur)
+        if not match_only:
+            df, bad = read_bays(csv_path)
+            n = load_bays(cur, df)
+            print(f"parking_bays: loaded {n} bays ({bad} rows without coordinates skipped)")
+        matched, sensors = match_sensors(cur, max_distance_m)
+        print(f"sensor_bay_match: {matched} / {sensors} sensors matched within {max_distance_m} m")
+    print(f"done in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load parking bays and match sensors to bays")
+    ap.add_argument("--csv", default=CSV_PATH)
+    ap.add_argument("--max-distance", type=float, default=MAX_DISTANCE_M, help="最近邻匹配的最大距离（米）")
+    ap.add_argument("--match-only", action="store_true", help="不重新导入车位，只重算匹配")
+    args = ap.parse_args()
+    main(args.csv, args.max_distance, args.match_only)
@@ -1,11 +1,10 @@
-import os, re
+import re
 import pandas as pd
 from pathlib import Path
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+from sqlalchemy import text
 
-load_dotenv()
-ENGINE = create_engine(os.getenv("DATABASE_URL"), pool_pre_ping=True)
+from db_load import get_engine, upsert_frame
+from xlsx_cache import read_excel_cached
 
 XLSX  = Path("app/data/car_ownership.xlsx")
 SHEET = 0  # 如需指定工作表名改这里
@@ -20,7 +19,8 @@ def to_int(s):
   return int(re.sub(r"[,\s]","", str(s)))
 
 def load_all_states():
-  raw = pd.read_excel(XLSX, sheet_name=SHEET, header=None, engine="openpyxl")
+  # 源文件没变时直接读 Parquet 缓存
+  raw = read_excel_cached(XLSX, sheet_name=SHEET, header=None)
 
   # 找到州名所在的行（第一列）
   rows = []
@@ -45,7 +45,7 @@ def load_all_states():
   return df
 
 def upsert(df: pd.DataFrame):
-  with ENGINE.begin() as conn:
+  with get_engine().begin() as conn:
     conn.execute(text("""
       create table if not exists car_ownership_by_state(
         state text not null,
@@ -55,13 +55,10 @@ def upsert(df: pd.DataFrame):
         primary key (state, year)
       );
     """))
-    for rec in df.to_dict(orient="records"):
-      conn.execute(text("""
-        insert into car_ownership_by_state(state, year, number, pct)
-        values(:state, :year, :number, :pct)
-        on conflict (state, year)
-        do update set number=excluded.number, pct=excluded.pct
-      """), rec)
+    # 一条语句批量写入，行数再多也只一次往返
+    upsert_frame(conn, "car_ownership_by_state", df,
+                 {"state": "text", "year": "int", "number": "int", "pct": "numeric"},
+                 key=["state", "year"])
 
 if __name__ == "__main__":
   df = load_all_states()
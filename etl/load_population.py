@@ -1,18 +1,17 @@
-import os
 import pandas as pd
 from pathlib import Path
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+from sqlalchemy import text
 
-load_dotenv()
-ENGINE = create_engine(os.getenv("DATABASE_URL"), pool_pre_ping=True)
+from db_load import get_engine, upsert_frame
+from xlsx_cache import read_excel_cached
 
 XLSX  = Path("app/data/vicpopulation2001-2021.xlsx")
 SHEET = 0  # 或 "Table 4"
 
 def tidy_from_wide():
   # 用第二行当表头（通常 2001..2021 能被识别为列名）
-  df = pd.read_excel(XLSX, sheet_name=SHEET, header=1, engine="openpyxl")
+  # 源文件没变时直接读 Parquet 缓存
+  df = read_excel_cached(XLSX, sheet_name=SHEET, header=1)
 
   # 找到 Victoria & Greater Melb 那一行（兼容列名是否存在）
   name_col = df.columns[0]
@@ -45,19 +44,17 @@ def tidy_from_wide():
   return out
 
 def upsert(df: pd.DataFrame):
-  with ENGINE.begin() as conn:
+  with get_engine().begin() as conn:
     conn.execute(text("""
       create table if not exists population_cbd(
         year int primary key,
         residents bigint not null
       );
     """))
-    for rec in df.to_dict(orient="records"):
-      conn.execute(text("""
-        insert into population_cbd(year, residents)
-        values(:year, :residents)
-        on conflict (year) do update set residents=excluded.residents
-      """), rec)
+    # 一条语句批量写入，行数再多也只一次往返
+    upsert_frame(conn, "population_cbd", df,
+                 {"year": "int", "residents": "bigint"},
+                 key=["year"])
 
 if __name__ == "__main__":
   df = tidy_from_wide()
@@ -1,14 +1,38 @@
-import os, csv, math
+import os, io, csv, math, time, argparse
+from itertools import islice
 from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import psycopg2
 from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
+from watermark import advance_watermark
+from rollup import HOURLY_TABLE, refresh_hourly, ensure_table as ensure_hourly_table
+
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "sensors_raw.csv")
 
+COLUMNS = "kerbsideid, zone_number, status_description, status_timestamp, lat, lon"
+STAGE_TABLE = "sensor_status_stage"
+LATEST_TABLE = "sensor_latest"   # 每个传感器只保留最新一条，给半径搜索用（见 sensor_latest.py）
+LATEST_MIGRATION = 2             # 建 sensor_latest 的迁移：migrations/sql/0002_sensor_latest.sql
+CHUNK_MB = float(os.getenv("ETL_CHUNK_MB", "16"))   # 分块加载时每块读入的字节数（MB），决定峰值内存
+
+# 目标列 → CSV 里可能出现的列名（按优先级，和 row_to_tuple 的 `or` 链一致）
+ALIASES = {
+    "status_description": ["status_description", "status"],
+    "status_timestamp":   ["status_timestamp", "last_updated"],
+    "kerbsideid":         ["kerbsideid", "kerbside_id", "sensor_id"],
+    "zone_number":        ["zone_number", "zone"],
+    "lat":                ["location.lat", "lat"],
+    "lon":                ["location.lon", "lon"],
+}
+
 def parse_ts(x: str):
     if not x:
         return None
@@ -43,53 +67,407 @@ def to_int_like(x):
     except Exception:
         return None
 
-def main():
-    rows = []
-    with open(CSV_PATH, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for i, row in enumerate(r):
-            status_desc = (row.get("status_description") or row.get("status") or "").strip()
-            ts = parse_ts(row.get("status_timestamp") or row.get("last_updated") or "")
+def row_to_tuple(row):
+    """一行原始记录（CSV 行或展开后的 API 记录）→ 入库元组；无效返回 None"""
+    status_desc = (row.get("status_description") or row.get("status") or "").strip()
+    ts = parse_ts(row.get("status_timestamp") or row.get("last_updated") or "")
+
+    kerb = row.get("kerbsideid") or row.get("kerbside_id") or row.get("sensor_id")
+    zone = row.get("zone_number") or row.get("zone")
+
+    # 列名可能是 location.lat / location.lon 或 lat / lon
+    lat = row.get("location.lat") or row.get("lat")
+    lon = row.get("location.lon") or row.get("lon")
+
+    kerb = to_int_like(kerb)
+    zone = to_int_like(zone)
+    lat = to_float(lat)
+    lon = to_float(lon)
+
+    if not (kerb and ts and lat is not None and lon is not None and
+            not math.isnan(lat) and not math.isnan(lon)):
+        return None
+
+    return (kerb, zone, status_desc, ts, lat, lon)
+
+# geom 在写入时直接算出来，不再事后全表 UPDATE
+GEOM_EXPR = "ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography"
+
+VALUES_TEMPLATE = "(%s::integer, %s::integer, %s::text, %s::timestamptz, %s::float8, %s::float8)"
+
+def latest_upsert_sql(source, latest=LATEST_TABLE):
+    """
+    source（带 COLUMNS 这几列的表或子查询）里每个传感器取最新一条 upsert 进 latest；
+    只有 status_timestamp 更新时才覆盖，乱序到达的旧快照不会把状态改回去。
+    """
+    return f"""
+        INSERT INTO {latest} ({COLUMNS}, geom)
+        SELECT DISTINCT ON (kerbsideid) {COLUMNS}, {GEOM_EXPR}
+          FROM {source}
+         ORDER BY kerbsideid, status_timestamp DESC
+        ON CONFLICT (kerbsideid) DO UPDATE
+           SET zone_number        = excluded.zone_number,
+               status_description = excluded.status_description,
+               status_timestamp   = excluded.status_timestamp,
+               lat                = excluded.lat,
+               lon                = excluded.lon,
+               geom               = excluded.geom,
+               updated_at         = now()
+         WHERE excluded.status_timestamp > {latest}.status_timestamp
+    """
+
+def ensure_latest_table(cur):
+    """
+    sensor_latest 的表结构只在 migrations/sql/0002_sensor_latest.sql 里维护（建表、索引、补历史数据），
+    这里只确认这个迁移已经执行过，没有就报错提示先跑迁移，不再另建一份可能和迁移不一致的表。
+    每个进程开始加载前调用一次。
+    """
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    applied = False
+    if cur.fetchone()[0]:
+        cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (LATEST_MIGRATION,))
+        applied = cur.fetchone() is not None
+    if not applied:
+        raise RuntimeError(f"{LATEST_TABLE} is not set up: run `python migrations/migrate.py` first "
+                           f"(migration {LATEST_MIGRATION:04d}_sensor_latest.sql)")
+
+def ensure_derived_tables(cur):
+    """加载前确认由 sensor_status 派生的表已就绪：sensor_latest（迁移 0002）和 sensor_hourly（迁移 0004）都要求已跑迁移"""
+    ensure_latest_table(cur)
+    ensure_hourly_table(cur)
+
+def insert_rows(cur, rows, table="sensor_status", latest=LATEST_TABLE, hourly=HOURLY_TABLE):
+    """写入基本列和 geom，冲突（相同 kerbsideid+timestamp）忽略，同时刷新 latest 和小时汇总；返回实际插入行数"""
+    inserted = execute_values(cur, f"""
+        INSERT INTO {table}
+         ({COLUMNS}, geom)
+        SELECT {COLUMNS}, {GEOM_EXPR}
+          FROM (VALUES %s) AS v({COLUMNS})
+        ON CONFLICT (kerbsideid, status_timestamp) DO NOTHING
+        RETURNING kerbsideid, status_timestamp
+    """, rows, template=VALUES_TEMPLATE, page_size=2000, fetch=True)
+    if latest:
+        execute_values(cur, latest_upsert_sql(f"(VALUES %s) AS v({COLUMNS})", latest),
+                       rows, template=VALUES_TEMPLATE, page_size=2000)
+    if hourly:
+        refresh_hourly(cur, inserted, hourly)
+    return len(inserted)
+
+class _CsvStream:
+    """把行元组惰性编码成 CSV，给 COPY FROM STDIN 按需读取（不会一次性生成整个文件）"""
+    def __init__(self, rows, chunk_rows=5000):
+        self._it = iter(rows)
+        self._chunk_rows = chunk_rows
+        self._buf = ""
+
+    def _fill(self):
+        chunk = list(islice(self._it, self._chunk_rows))
+        if not chunk:
+            return False
+        out = io.StringIO()
+        w = csv.writer(out)
+        for row in chunk:
+            w.writerow([r"\N" if v is None else (v.isoformat() if isinstance(v, datetime) else v)
+                        for v in row])
+        self._buf += out.getvalue()
+        return True
+
+    def read(self, size=-1):
+        while (size is None or size < 0 or len(self._buf) < size) and self._fill():
+            pass
+        if size is None or size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+def copy_rows(cur, rows, table="sensor_status", latest=LATEST_TABLE, hourly=HOURLY_TABLE):
+    """
+    COPY 到临时暂存表（不写 WAL，会话私有，并行加载互不干扰），
+    再用一条 INSERT ... SELECT ... ON CONFLICT 合并进目标表，同一份暂存数据再刷新 latest，
+    真正新插入的行再去刷新小时汇总。
+    rows 可以是元组列表，也可以是 parse_frame 得到的 DataFrame。
+    返回 (暂存行数, 实际插入行数)
+    """
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+            kerbsideid         integer,
+            zone_number        integer,
+            status_description text,
+            status_timestamp   timestamptz,
+            lat                double precision,
+            lon                double precision
+        ) ON COMMIT DELETE ROWS
+    """)
+    cur.execute(f"TRUNCATE {STAGE_TABLE}")
+    if isinstance(rows, pd.DataFrame):
+        src = io.StringIO()
+        rows.to_csv(src, header=False, index=False, na_rep=r"\N")
+        src.seek(0)
+    else:
+        src = _CsvStream(rows)
+    cur.copy_expert(f"COPY {STAGE_TABLE} ({COLUMNS}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", src)
+    cur.execute(f"SELECT count(*) FROM {STAGE_TABLE}")
+    staged = cur.fetchone()[0]
+    # 文件内部的重复先用 DISTINCT ON 去掉，和表里已有的重复交给 ON CONFLICT；
+    # 按传感器返回新插入行的最早时间和行数
+    cur.execute(f"""
+        WITH ins AS (
+            INSERT INTO {table} ({COLUMNS}, geom)
+            SELECT DISTINCT ON (kerbsideid, status_timestamp) {COLUMNS}, {GEOM_EXPR}
+              FROM {STAGE_TABLE}
+             ORDER BY kerbsideid, status_timestamp
+            ON CONFLICT (kerbsideid, status_timestamp) DO NOTHING
+            RETURNING kerbsideid, status_timestamp)
+        SELECT kerbsideid, min(status_timestamp), count(*) FROM ins GROUP BY kerbsideid
+    """)
+    new_rows = cur.fetchall()
+    inserted = sum(n for _, _, n in new_rows)
+    if latest:
+        cur.execute(latest_upsert_sql(STAGE_TABLE, latest))
+    if hourly:
+        refresh_hourly(cur, [(kerb, ts) for kerb, ts, _ in new_rows], hourly)
+    return staged, inserted
+
+def _coalesce(df, names):
+    """
+    按列做 `row.get(a) or row.get(b)`：只有空字符串视为缺失，取第一个非空列。
+    不先去空格：只有空格的值和 row_to_tuple 一样算“有值”（之后解析失败），不会退到后面的别名列。
+    """
+    out = None
+    for n in names:
+        if n not in df.columns:
+            continue
+        col = df[n]
+        out = col if out is None else out.where(out != "", col)
+    if out is None:
+        return pd.Series("", index=df.index, dtype=object)
+    return out
+
+def _to_number(s):
+    """整列版 to_float：去掉首尾空格和千分位逗号，无法解析的变 NaN"""
+    s = s.str.strip().str.replace(",", "", regex=False)
+    num = pd.to_numeric(s, errors="coerce")
+    # to_numeric 的快速解析末位可能差 1ulp，能解析的部分再精确转换一次，结果与 float() 一致
+    ok = num.notna()
+    if ok.any():
+        num[ok] = s[ok].astype("float64")
+    return num
+
+def _to_int_like(s):
+    """整列版 to_int_like：'7394.0' / '7,394' → 7394，异常为 <NA>"""
+    f = _to_number(s)
+    f = f.where(np.isfinite(f))
+    return f.round().astype("Int64")
+
+_TZ_SUFFIX = r"(?:Z|[+-]\d{2}:?\d{2})$"
+
+def _to_timestamp(s):
+    """
+    整列版 parse_ts：带时区的按各自的时区换算成 UTC，不带时区的当作 UTC。
+    两种分开解析：pandas 在一列里混着两种时，会把不带时区的按前面出现过的时区算；
+    首尾有空格的和 fromisoformat 一样算无效。
+    """
+    aware = pc.match_substring_regex(pa.array(s, type=pa.string()), _TZ_SUFFIX).to_numpy(zero_copy_only=False)
+    padded = (s != s.str.strip()).to_numpy()
+    if not padded.any() and (aware.all() or not aware.any()):
+        return pd.to_datetime(s, utc=True, errors="coerce", format="ISO8601")   # 常见情况：整列同一种写法
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns, UTC]")
+    for mask in (aware & ~padded, ~aware & ~padded):
+        if mask.any():
+            out[mask] = pd.to_datetime(s[mask], utc=True, errors="coerce", format="ISO8601")
+    return out
+
+def parse_frame(raw):
+    """
+    列式解析：raw 是全部按字符串读入的 DataFrame。
+    返回 (有效行 DataFrame[COLUMNS], {无效原因: 行数})
+    """
+    out = pd.DataFrame({
+        "kerbsideid":         _to_int_like(_coalesce(raw, ALIASES["kerbsideid"])),
+        "zone_number":        _to_int_like(_coalesce(raw, ALIASES["zone_number"])),
+        "status_description": _coalesce(raw, ALIASES["status_description"]).str.strip(),
+        "status_timestamp":   _to_timestamp(_coalesce(raw, ALIASES["status_timestamp"])),
+        "lat":                _to_number(_coalesce(raw, ALIASES["lat"])),
+        "lon":                _to_number(_coalesce(raw, ALIASES["lon"])),
+    })
+
+    # 和 row_to_tuple 相同的有效性条件；每行只记第一个不合格的原因
+    bad_kerb = out["kerbsideid"].isna() | (out["kerbsideid"] == 0)
+    bad_ts = ~bad_kerb & out["status_timestamp"].isna()
+    bad_loc = ~bad_kerb & ~bad_ts & (out["lat"].isna() | out["lon"].isna())
+    reasons = {
+        "missing_kerbsideid": int(bad_kerb.sum()),
+        "bad_timestamp": int(bad_ts.sum()),
+        "bad_location": int(bad_loc.sum()),
+    }
+    valid = out[~(bad_kerb | bad_ts | bad_loc)]
+    return valid, reasons
+
+def read_frame(csv_path=CSV_PATH):
+    raw = pd.read_csv(csv_path, dtype=str, keep_default_na=False, encoding="utf-8")
+    return parse_frame(raw)
+
+def frame_to_rows(frame):
+    """DataFrame → execute_values 需要的元组（NA 转成 None）"""
+    obj = frame.astype(object)
+    return list(obj.where(frame.notna(), None).itertuples(index=False, name=None))
+
+def load(cur, frame, mode="copy", table="sensor_status", latest=LATEST_TABLE, hourly=HOURLY_TABLE):
+    """按模式写入，返回实际插入行数；values 模式是原来的 execute_values 路径，作为兜底"""
+    if mode == "copy":
+        _, inserted = copy_rows(cur, frame, table, latest, hourly)
+        return inserted
+    return insert_rows(cur, frame_to_rows(frame), table, latest, hourly)
 
-            kerb = row.get("kerbsideid") or row.get("kerbside_id") or row.get("sensor_id")
-            zone = row.get("zone_number") or row.get("zone")
+def ensure_checkpoint_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_load_checkpoints(
+            path        text PRIMARY KEY,
+            file_size   bigint NOT NULL,
+            file_mtime  double precision NOT NULL,
+            byte_offset bigint NOT NULL,
+            rows_loaded bigint NOT NULL DEFAULT 0,
+            updated_at  timestamptz NOT NULL DEFAULT now()
+        );
+    """)
 
-            # 列名可能是 location.lat / location.lon 或 lat / lon
-            lat = row.get("location.lat") or row.get("lat")
-            lon = row.get("location.lon") or row.get("lon")
+def get_checkpoint(cur, path, size, mtime):
+    """同一个文件（路径+大小+修改时间都一致）才续传，否则从头开始；返回 (byte_offset, rows_loaded)"""
+    ensure_checkpoint_table(cur)
+    cur.execute("SELECT file_size, file_mtime, byte_offset, rows_loaded FROM etl_load_checkpoints WHERE path = %s",
+                (path,))
+    row = cur.fetchone()
+    if row and row[0] == size and row[1] == mtime:
+        return row[2], row[3]
+    return 0, 0
 
-            kerb = to_int_like(kerb)
-            zone = to_int_like(zone)
-            lat = to_float(lat)
-            lon = to_float(lon)
+def save_checkpoint(cur, path, size, mtime, offset, rows_loaded):
+    cur.execute("""
+        INSERT INTO etl_load_checkpoints(path, file_size, file_mtime, byte_offset, rows_loaded)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (path) DO UPDATE
+           SET file_size = excluded.file_size, file_mtime = excluded.file_mtime,
+               byte_offset = excluded.byte_offset, rows_loaded = excluded.rows_loaded,
+               updated_at = now()
+    """, (path, size, mtime, offset, rows_loaded))
 
-            if not (kerb and ts and lat is not None and lon is not None and
-                    not math.isnan(lat) and not math.isnan(lon)):
-                continue
+def iter_chunks(csv_path, start_offset=0, chunk_bytes=int(CHUNK_MB * 1024 * 1024)):
+    """
+    按字节分块读 CSV，每块都是完整的行：产出 (原始字符串 DataFrame, 块结束的字节偏移)。
+    注意：按行切分，要求字段里没有换行（传感器导出文件满足这一点）。
+    """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        if start_offset > f.tell():
+            f.seek(start_offset)
+        while True:
+            lines = f.readlines(chunk_bytes)
+            if not lines:
+                break
+            raw = pd.read_csv(io.BytesIO(header + b"".join(lines)), dtype=str,
+                              keep_default_na=False, encoding="utf-8")
+            yield raw, f.tell()
 
-            rows.append((kerb, zone, status_desc, ts, lat, lon))
+def load_chunked(csv_path=CSV_PATH, mode="copy", chunk_mb=CHUNK_MB, restart=False):
+    """
+    分块加载：每块解析、校验、写入后连同字节偏移检查点一起提交。
+    中断后再次运行会从检查点继续；内存只和 chunk_mb 有关，与文件大小无关。
+    """
+    path = os.path.realpath(csv_path)
+    st = os.stat(path)
+    totals = {"inserted": 0, "valid": 0}
+    reasons_total = {}
+    t0 = time.perf_counter()
 
-    if not rows:
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            ensure_derived_tables(cur)
+            offset, rows_loaded = (0, 0) if restart else get_checkpoint(cur, path, st.st_size, st.st_mtime)
+        conn.commit()
+        if offset >= st.st_size:
+            print(f"{path} already fully loaded ({rows_loaded} rows)")
+            return 0
+        if offset:
+            print(f"resuming {path} at byte {offset:,} / {st.st_size:,}")
+
+        for raw, end in iter_chunks(path, offset, int(chunk_mb * 1024 * 1024)):
+            frame, reasons = parse_frame(raw)
+            for k, v in reasons.items():
+                reasons_total[k] = reasons_total.get(k, 0) + v
+            with conn.cursor() as cur:
+                inserted = load(cur, frame, mode) if not frame.empty else 0
+                if not frame.empty:
+                    advance_watermark(cur, frame["status_timestamp"].max().to_pydatetime())
+                rows_loaded += len(frame)
+                save_checkpoint(cur, path, st.st_size, st.st_mtime, end, rows_loaded)
+            conn.commit()   # 数据和检查点在同一个事务里，不会重复也不会丢
+            totals["inserted"] += inserted
+            totals["valid"] += len(frame)
+            print(f"  {end / st.st_size:6.1%}  chunk rows {len(raw):,}, inserted {inserted:,}")
+    finally:
+        conn.close()
+
+    dt = time.perf_counter() - t0
+    rejected = sum(reasons_total.values())
+    print(f"[{mode}/chunked] inserted {totals['inserted']}, duplicates {totals['valid'] - totals['inserted']}, "
+          f"rejected {rejected} ({totals['valid'] / dt if dt else 0:,.0f} rows/s)")
+    if rejected:
+        print("  rejected by reason: " + ", ".join(f"{k}={v}" for k, v in reasons_total.items() if v))
+    return totals["inserted"]
+
+def compare(frame):
+    """两种写入方式各跑一遍（写到临时表，事务回滚，不影响正式数据），对比吞吐"""
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        for mode in ("values", "copy"):
+            bench = f"sensor_status_bench_{mode}"
+            cur.execute(f"CREATE TEMP TABLE {bench} (LIKE sensor_status INCLUDING DEFAULTS INCLUDING INDEXES)")
+            t0 = time.perf_counter()
+            inserted = load(cur, frame, mode, bench, latest=None, hourly=None)
+            dt = time.perf_counter() - t0
+            print(f"{mode:>6}: {inserted} rows in {dt:.2f}s  ({inserted / dt if dt else 0:,.0f} rows/s)")
+        conn.rollback()
+
+def main(csv_path=CSV_PATH, mode="copy"):
+    frame, reasons = read_frame(csv_path)
+    rejected = sum(reasons.values())
+
+    if frame.empty:
         print("No valid rows parsed. Check CSV headers?")
         return
 
+    t0 = time.perf_counter()
     with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
-        # 1) 先写入基本列，冲突（相同 kerbsideid+timestamp）忽略
-        execute_values(cur, """
-            INSERT INTO sensor_status
-             (kerbsideid, zone_number, status_description, status_timestamp, lat, lon)
-            VALUES %s
-            ON CONFLICT (kerbsideid, status_timestamp) DO NOTHING
-        """, rows, page_size=2000)
+        ensure_derived_tables(cur)
 
-        # 2) 统一补 geom
-        cur.execute("""
-            UPDATE sensor_status
-               SET geom = ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography
-             WHERE geom IS NULL AND lon IS NOT NULL AND lat IS NOT NULL;
-        """)
+        # 1) 写入（geom 随行一起算好）
+        inserted = load(cur, frame, mode)
 
-    print(f"Inserted/considered {len(rows)} rows (duplicates skipped).")
+        # 2) 同一事务内推进增量同步的水位线
+        advance_watermark(cur, frame["status_timestamp"].max().to_pydatetime())
+    dt = time.perf_counter() - t0
+
+    print(f"[{mode}] inserted {inserted}, duplicates {len(frame) - inserted}, "
+          f"rejected {rejected} ({len(frame) / dt if dt else 0:,.0f} rows/s)")
+    if rejected:
+        print("  rejected by reason: " + ", ".join(f"{k}={v}" for k, v in reasons.items() if v))
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Load sensor CSV into sensor_status")
+    ap.add_argument("--csv", default=CSV_PATH)
+    ap.add_argument("--mode", choices=["copy", "values"], default="copy",
+                    help="copy: COPY 到暂存表再合并（默认）；values: 原 execute_values 写法")
+    ap.add_argument("--compare", action="store_true", help="只对比两种写入方式的吞吐，不写正式表")
+    ap.add_argument("--chunked", action="store_true", help="分块加载大文件，按块提交并记录字节偏移，可断点续传")
+    ap.add_argument("--chunk-mb", type=float, default=CHUNK_MB, help="每块读入多少 MB（决定峰值内存）")
+    ap.add_argument("--restart", action="store_true", help="忽略检查点，从文件开头重新加载")
+    args = ap.parse_args()
+
+    if args.chunked:
+        load_chunked(args.csv, args.mode, args.chunk_mb, args.restart)
+    elif args.compare:
+        frame, _ = read_frame(args.csv)
+        compare(frame)
+    else:
+        main(args.csv, args.mode)
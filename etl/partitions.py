@@ -0,0 +1,189 @@
+# etl/partitions.py
+# sensor_status 按 status_timestamp 做声明式范围分区（按月或按天）的维护命令：
+#   migrate   把现有的普通表迁移成分区表（旧表改名为 sensor_status_legacy，数据搬进各分区）
+#   maintain  预建未来的分区（建议每天定时跑）
+#   retention 按保留策略 detach（默认）或 drop 过期分区
+#   list      查看当前分区
+# 带时间下界的查询（如 get_bay_history 的 hours 回看）只会扫描相关分区。
+import argparse
+import re
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+
+from load_sensor_csv import DATABASE_URL
+
+PARENT = "sensor_status"
+LEGACY = "sensor_status_legacy"
+DEFAULT_PART = "sensor_status_default"
+INTERVALS = ("month", "day")
+AHEAD = 3
+
+def period_start(ts, interval):
+    ts = ts.astimezone(timezone.utc)
+    if interval == "month":
+        return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+    return datetime(ts.year, ts.month, ts.day, tzinfo=timezone.utc)
+
+def next_period(start, interval):
+    if interval == "month":
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start + timedelta(days=1)
+
+def partition_name(start, interval):
+    return f"{PARENT}_p{start:%Y_%m}" if interval == "month" else f"{PARENT}_p{start:%Y_%m_%d}"
+
+def is_partitioned(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (PARENT,))
+    row = cur.fetchone()
+    return row is not None and row[0] == "p"
+
+def get_interval(cur):
+    """分区粒度记在父表的注释里（migrate 时写入）"""
+    cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (PARENT,))
+    m = re.search(r"partition_interval=(\w+)", (cur.fetchone() or [""])[0] or "")
+    return m.group(1) if m else "month"
+
+def list_partitions(cur):
+    """返回 [(分区名, 下界, 上界)]，默认分区的上下界为 None"""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+          FROM pg_inherits i
+          JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = to_regclass(%s)
+         ORDER BY c.relname
+    """, (PARENT,))
+    out = []
+    for name, bound in cur.fetchall():
+        m = re.search(r"FROM \('([^']+)'\) TO \('([^']+)'\)", bound or "")
+        if m:
+            lo, hi = (datetime.fromisoformat(x).astimezone(timezone.utc) for x in m.groups())
+            out.append((name, lo, hi))
+        else:
+            out.append((name, None, None))
+    return out
+
+def create_partition(cur, start, interval):
+    """
+    建一个分区；如果默认分区里已经有落在这个范围的数据，先搬过来再 ATTACH，
+    否则 ATTACH 会因为默认分区违反约束而失败。已存在则跳过。
+    """
+    end = next_period(start, interval)
+    name = partition_name(start, interval)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    if cur.fetchone()[0]:
+        return False
+    cur.execute(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (DEFAULT_PART,))
+    if cur.fetchone()[0]:
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PART}
+                 WHERE status_timestamp >= %s AND status_timestamp < %s
+                RETURNING *)
+            INSERT INTO {name} SELECT * FROM moved
+        """, (start, end))
+    cur.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (start, end))
+    return True
+
+def ensure_partitions(cur, start, until, interval):
+    """建好覆盖 [start, until] 的所有分区"""
+    created = []
+    p = period_start(start, interval)
+    while p <= until:
+        if create_partition(cur, p, interval):
+            created.append(partition_name(p, interval))
+        p = next_period(p, interval)
+    return created
+
+def migrate(cur, interval="month", ahead=AHEAD, drop_legacy=False):
+    """普通表 → 分区表。整个过程在一个事务里，失败会整体回滚"""
+    if is_partitioned(cur):
+        print(f"{PARENT} is already partitioned")
+        return
+    cur.execute(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE")
+    cur.execute(f"ALTER TABLE {PARENT} RENAME TO {LEGACY}")
+    # 索引名（包括主键约束）要让出来，新父表才能用同样的名字（见 migrations/sql/0001）
+    cur.execute("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = to_regclass(%s)",
+                (LEGACY,))
+    for (index,) in cur.fetchall():
+        cur.execute(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"')
+
+    cur.execute(f"""
+        CREATE TABLE {PARENT} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE (status_timestamp);
+        ALTER TABLE {PARENT} ADD PRIMARY KEY (kerbsideid, status_timestamp);
+        CREATE INDEX IF NOT EXISTS {PARENT}_ts_idx ON {PARENT} (status_timestamp);
+        CREATE INDEX IF NOT EXISTS {PARENT}_geom_gix ON {PARENT} USING gist (geom);
+        COMMENT ON TABLE {PARENT} IS 'partition_interval={interval}';
+    """)
+
+    cur.execute(f"SELECT min(status_timestamp), max(status_timestamp) FROM {LEGACY}")
+    lo, hi = cur.fetchone()
+    now = datetime.now(timezone.utc)
+    lo = lo or now
+    until = max(hi or now, now)
+    until = _advance(period_start(until, interval), interval, ahead)
+    created = ensure_partitions(cur, lo, until, interval)
+    cur.execute(f"CREATE TABLE {DEFAULT_PART} PARTITION OF {PARENT} DEFAULT")
+
+    cur.execute(f"INSERT INTO {PARENT} SELECT * FROM {LEGACY}")
+    moved = cur.rowcount
+    if drop_legacy:
+        cur.execute(f"DROP TABLE {LEGACY}")
+    cur.execute(f"ANALYZE {PARENT}")
+    print(f"migrated {moved} rows into {len(created)} {interval}ly partitions"
+          + ("" if drop_legacy else f"; old table kept as {LEGACY}"))
+
+def _advance(start, interval, n):
+    for _ in range(n):
+        start = next_period(start, interval)
+    return start
+
+def maintain(cur, ahead=AHEAD):
+    """预建从当前周期开始往后 ahead 个周期的分区"""
+    interval = get_interval(cur)
+    now = period_start(datetime.now(timezone.utc), interval)
+    created = ensure_partitions(cur, now, _advance(now, interval, ahead), interval)
+    print(f"created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+
+def retention(cur, keep, drop=False):
+    """上界早于（当前周期 - keep 个周期）的分区全部 detach（或 drop）"""
+    interval = get_interval(cur)
+    cutoff = period_start(datetime.now(timezone.utc), interval)
+    for _ in range(keep):
+        cutoff = period_start(cutoff - timedelta(days=1), interval)
+    expired = [name for name, lo, hi in list_partitions(cur) if hi is not None and hi <= cutoff]
+    for name in expired:
+        cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+        if drop:
+            cur.execute(f"DROP TABLE {name}")
+    action = "dropped" if drop else "detached"
+    print(f"{action} {len(expired)} partitions older than {cutoff:%Y-%m-%d}"
+          + (f": {', '.join(expired)}" if expired else ""))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Partition management for sensor_status")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate", help="把现有 sensor_status 迁移为分区表")
+    p.add_argument("--interval", choices=INTERVALS, default="month")
+    p.add_argument("--ahead", type=int, default=AHEAD, help="额外预建多少个未来周期")
+    p.add_argument("--drop-legacy", action="store_true", help="迁移后删除旧表")
+    p = sub.add_parser("maintain", help="预建未来分区")
+    p.add_argument("--ahead", type=int, default=AHEAD)
+    p = sub.add_parser("retention", help="按保留策略移除过期分区")
+    p.add_argument("--keep", type=int, required=True, help="保留最近多少个周期（不含当前周期）")
+    p.add_argument("--drop", action="store_true", help="直接删除（默认只 detach，数据还在独立的表里）")
+    sub.add_parser("list", help="列出分区")
+    args = ap.parse_args()
+
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        if args.cmd == "migrate":
+            migrate(cur, args.interval, args.ahead, args.drop_legacy)
+        elif args.cmd == "maintain":
+            maintain(cur, args.ahead)
+        elif args.cmd == "retention":
+            retention(cur, args.keep, args.drop)
+        else:
+            for name, lo, hi in list_partitions(cur):
+                print(f"{name:40s} {lo or 'DEFAULT'} -> {hi or ''}")
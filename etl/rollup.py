@@ -0,0 +1,151 @@
+# etl/rollup.py
+# 每个传感器按小时汇总的占用情况（sensor_hourly），给长回看的历史面板用：
+#   occupied_minutes / observed_minutes  这一小时里被占用 / 有已知状态的分钟数（按时间加权，不是按记录数）
+#   change_count                         这一小时里状态变化的次数
+#   first_state / last_state             这一小时第一条 / 最后一条快照的状态
+# 只存有快照的小时；两条快照之间没有事件的整小时由查询函数 get_bay_occupancy 沿用上一条状态补齐。
+# 加载时（load_sensor_csv.insert_rows / copy_rows）只对新插入的行所属传感器，
+# 从新数据最早的那个小时开始重算。表由迁移 0004 建；已有历史数据时用 --rebuild 全量补齐一次。
+import argparse
+import os
+import time
+from collections import defaultdict
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+HOURLY_TABLE = "sensor_hourly"
+HOURLY_MIGRATION = 4          # migrations/sql/0004_sensor_hourly.sql 建表
+OCCUPIED = "Present"
+_LOCK_KEY = "sensor_hourly"   # 并行加载时重算步骤串行执行，后提交的一方能看到先提交的数据
+
+def ensure_table(cur):
+    """
+    sensor_hourly 的表结构只在 migrations/sql/0004_sensor_hourly.sql 里维护，
+    这里只确认这个迁移已经执行过，没有就报错提示先跑迁移（和 load_sensor_csv.ensure_latest_table 一样）。
+    已有历史数据时的全量补齐不在加载过程中做，用 python etl/rollup.py --rebuild。
+    """
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    applied = False
+    if cur.fetchone()[0]:
+        cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (HOURLY_MIGRATION,))
+        applied = cur.fetchone() is not None
+    if not applied:
+        raise RuntimeError(f"{HOURLY_TABLE} is not set up: run `python migrations/migrate.py` first "
+                           f"(migration {HOURLY_MIGRATION:04d}_sensor_hourly.sql)")
+
+def refresh_sql(touched, hourly=HOURLY_TABLE):
+    """
+    touched：产出 (kerbsideid, since) 的子查询，since 已经取整到小时。
+    每个传感器取 since 之后的所有快照，再加上 since 之前最近的一条（决定这一段开头的状态），
+    把「一条快照到下一条快照」之间的时间按状态切到所在的小时里：
+      - 快照所在小时：从快照时刻到下一条快照或小时结束
+      - 下一条快照所在小时（如果跨了小时）：从小时开始到下一条快照
+    中间的整小时不存，由 get_bay_occupancy 沿用上一条状态。
+    """
+    return f"""
+        WITH touched AS {touched},
+        ev AS (
+            SELECT s.kerbsideid, s.status_timestamp AS ts, s.status_description = '{OCCUPIED}' AS occ, true AS fresh
+              FROM sensor_status s
+              JOIN touched t ON t.kerbsideid = s.kerbsideid AND s.status_timestamp >= t.since
+            UNION ALL
+            SELECT t.kerbsideid, p.ts, p.occ, false
+              FROM touched t
+             CROSS JOIN LATERAL (
+                    SELECT s.status_timestamp AS ts, s.status_description = '{OCCUPIED}' AS occ
+                      FROM sensor_status s
+                     WHERE s.kerbsideid = t.kerbsideid AND s.status_timestamp < t.since
+                     ORDER BY s.status_timestamp DESC
+                     LIMIT 1) p
+        ),
+        seg AS (
+            SELECT kerbsideid, ts, occ, fresh,
+                   date_trunc('hour', ts) AS hour,
+                   lag(occ) OVER w AS prev_occ,
+                   lead(ts) OVER w AS nxt
+              FROM ev
+            WINDOW w AS (PARTITION BY kerbsideid ORDER BY ts)
+        ),
+        piece AS (
+            SELECT kerbsideid, hour, occ,
+                   extract(epoch FROM least(coalesce(nxt, 'infinity'), hour + interval '1 hour') - ts) AS secs
+              FROM seg
+             WHERE fresh
+            UNION ALL
+            SELECT kerbsideid, date_trunc('hour', nxt), occ,
+                   extract(epoch FROM nxt - date_trunc('hour', nxt))
+              FROM seg
+             WHERE nxt IS NOT NULL AND date_trunc('hour', nxt) > hour
+        ),
+        minutes AS (
+            SELECT kerbsideid, hour,
+                   coalesce(sum(secs) FILTER (WHERE occ), 0) / 60.0 AS occupied_minutes,
+                   sum(secs) / 60.0 AS observed_minutes
+              FROM piece
+             GROUP BY kerbsideid, hour
+        ),
+        stats AS (
+            SELECT kerbsideid, hour,
+                   count(*) FILTER (WHERE prev_occ IS NOT NULL AND prev_occ <> occ) AS change_count,
+                   count(*) AS snapshots,
+                   (array_agg(occ ORDER BY ts))[1] AS first_state,
+                   (array_agg(occ ORDER BY ts DESC))[1] AS last_state
+              FROM seg
+             WHERE fresh
+             GROUP BY kerbsideid, hour
+        )
+        INSERT INTO {hourly} (kerbsideid, hour, occupied_minutes, observed_minutes,
+                              change_count, snapshots, first_state, last_state)
+        SELECT s.kerbsideid, s.hour, m.occupied_minutes, m.observed_minutes,
+               s.change_count, s.snapshots, s.first_state, s.last_state
+          FROM stats s
+          JOIN minutes m USING (kerbsideid, hour)
+        ON CONFLICT (kerbsideid, hour) DO UPDATE
+           SET occupied_minutes = excluded.occupied_minutes,
+               observed_minutes = excluded.observed_minutes,
+               change_count     = excluded.change_count,
+               snapshots        = excluded.snapshots,
+               first_state      = excluded.first_state,
+               last_state       = excluded.last_state
+    """
+
+def refresh_hourly(cur, new_rows, hourly=HOURLY_TABLE):
+    """new_rows：刚插入 sensor_status 的 (kerbsideid, status_timestamp)；必须在同一事务里、插入之后调用"""
+    since = defaultdict(lambda: None)
+    for kerb, ts in new_rows:
+        if since[kerb] is None or ts < since[kerb]:
+            since[kerb] = ts
+    if not since:
+        return 0
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (_LOCK_KEY,))
+    cur.execute(refresh_sql("""
+        (SELECT k AS kerbsideid, date_trunc('hour', t) AS since
+           FROM unnest(%s::integer[], %s::timestamptz[]) AS u(k, t))""", hourly),
+        (list(since), list(since.values())))
+    return cur.rowcount
+
+def rebuild(cur, hourly=HOURLY_TABLE):
+    """从 sensor_status 全量重算（已有历史数据时，跑完迁移 0004 后执行一次）"""
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (_LOCK_KEY,))
+    cur.execute(f"TRUNCATE {hourly}")
+    cur.execute(refresh_sql("""
+        (SELECT kerbsideid, date_trunc('hour', min(status_timestamp)) AS since
+           FROM sensor_status GROUP BY kerbsideid)""", hourly))
+    cur.execute(f"SELECT count(*) FROM {hourly}")
+    return cur.fetchone()[0]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Check / rebuild the hourly occupancy rollup")
+    ap.add_argument("--rebuild", action="store_true", help="从 sensor_status 全量重算")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        ensure_table(cur)
+        if args.rebuild:
+            print(f"{HOURLY_TABLE}: {rebuild(cur)} sensor-hours")
+    print(f"done in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,32 @@
+# etl/sensor_latest.py
+# sensor_latest：每个传感器（kerbsideid）只保留最新一条状态，带 geography 列和 GiST 索引。
+# 加载路径（load_sensor_csv / stream_sensors / ingest_archive）写 sensor_status 的同时会 upsert 它，
+# get_bays_within 只读这张表，半径查询的耗时只和范围内的车位数有关，和历史数据量无关。
+# 表结构和 get_bays_within 的定义只在 migrations/sql/0002、0003 里，加载前要先跑 migrations/migrate.py。
+# 用法：python etl/sensor_latest.py --rebuild  从 sensor_status 全量重算一遍
+import argparse
+import time
+
+import psycopg2
+
+from load_sensor_csv import DATABASE_URL, LATEST_TABLE, latest_upsert_sql, ensure_latest_table
+
+def rebuild(cur):
+    """从 sensor_status 全量重算（第一次建表或怀疑不一致时用）"""
+    cur.execute(f"TRUNCATE {LATEST_TABLE}")
+    cur.execute(latest_upsert_sql("sensor_status WHERE lat IS NOT NULL AND lon IS NOT NULL"))
+    n = cur.rowcount
+    cur.execute(f"ANALYZE {LATEST_TABLE}")
+    return n
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rebuild the sensor_latest table")
+    ap.add_argument("--rebuild", action="store_true", help="从 sensor_status 全量重算 sensor_latest")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        ensure_latest_table(cur)
+        if args.rebuild:
+            print(f"{LATEST_TABLE}: {rebuild(cur)} sensors")
+    print(f"done in {time.perf_counter() - t0:.1f}s")
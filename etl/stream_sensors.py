@@ -0,0 +1,150 @@
+# etl/stream_sensors.py
+# 抓取 → 入库一条流水线：每页到达即规范化，通过有界队列交给写库线程按批插入，
+# 抓取和写库并行，内存占用与总记录数无关。CSV 只是可选的旁路输出。
+import argparse
+import csv
+import queue
+import threading
+import time
+
+import psycopg2
+
+from api_client import iter_pages, DEFAULT_WORKERS
+from fetch_sensors import BASE_URL, PAGE_SIZE, KEEP, incremental_params, parse_since
+from load_sensor_csv import DATABASE_URL, row_to_tuple, insert_rows, ensure_derived_tables
+from watermark import get_watermark, advance_watermark
+
+BATCH_SIZE = 2000
+QUEUE_PAGES = 16   # 队列里最多积压多少页，满了抓取线程就会阻塞等待
+PUT_POLL_S = 0.5   # 队列满时抓取线程每隔这么久检查一次是否该停下
+JOIN_TIMEOUT_S = 60
+
+_DONE = object()
+
+def flatten(rec, prefix=""):
+    """和 json_normalize 一样把嵌套字段展开成 location.lat 这种列名（单条记录）"""
+    out = {}
+    for k, v in rec.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, key + "."))
+        else:
+            out[key] = v
+    return out
+
+def _put(q, item, stop):
+    """放进队列；写库线程已经出错退出（stop 被设置）时返回 False，不会一直阻塞在满的队列上"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=PUT_POLL_S)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _producer(q, stop, since, workers, max_total, csv_path, base_url):
+    writer = None
+    f = None
+    try:
+        params = incremental_params(since) if since is not None else None
+        for _, page in iter_pages(base_url, PAGE_SIZE, max_total=max_total, workers=workers, params=params):
+            if stop.is_set():
+                return
+            flat = [flatten(rec) for rec in page]
+            if csv_path:
+                if writer is None:
+                    cols = [c for c in KEEP if c in flat[0]] or list(flat[0])
+                    f = open(csv_path, "w", newline="", encoding="utf-8")
+                    writer = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
+                    writer.writeheader()
+                writer.writerows(flat)
+            batch = [t for t in map(row_to_tuple, flat) if t is not None]
+            if not _put(q, (len(flat), batch), stop):
+                return
+        _put(q, _DONE, stop)
+    except BaseException as e:   # 把异常交给主线程抛出
+        _put(q, e, stop)
+    finally:
+        if f is not None:
+            f.close()
+
+def run(incremental=False, since=None, workers=DEFAULT_WORKERS, max_total=None,
+        batch_size=BATCH_SIZE, queue_pages=QUEUE_PAGES, csv_path=None, base_url=BASE_URL):
+    t0 = time.perf_counter()
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            ensure_derived_tables(cur)
+            if since is None and incremental:
+                since = get_watermark(cur)
+                print(f"incremental since {since}" if since else "no watermark yet, full snapshot")
+        conn.commit()
+
+        q = queue.Queue(maxsize=queue_pages)
+        stop = threading.Event()
+        th = threading.Thread(target=_producer, daemon=True,
+                              args=(q, stop, since, workers, max_total, csv_path, base_url))
+        th.start()
+
+        fetched = valid = 0
+        max_ts = None
+        pending = []
+
+        def flush():
+            nonlocal pending
+            if not pending:
+                return
+            with conn.cursor() as cur:
+                insert_rows(cur, pending)
+            conn.commit()   # 每批提交一次；中断后重跑时重复记录会被 ON CONFLICT 跳过
+            pending = []
+
+        try:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                n, batch = item
+                fetched += n
+                valid += len(batch)
+                for t in batch:
+                    if max_ts is None or t[3] > max_ts:
+                        max_ts = t[3]
+                pending.extend(batch)
+                if len(pending) >= batch_size:
+                    flush()
+            flush()
+        finally:
+            # 写库出错时通知抓取线程停下：它不再往队列里放数据，关闭 CSV 和 HTTP 连接后退出
+            stop.set()
+            th.join(timeout=JOIN_TIMEOUT_S)
+
+        # 全部写完后再推进水位线，保证水位线之前的数据都已入库
+        with conn.cursor() as cur:
+            advance_watermark(cur, max_ts)
+        conn.commit()
+    finally:
+        conn.close()
+
+    dt = time.perf_counter() - t0
+    print(f"streamed {fetched} records, {valid} valid rows in {dt:.1f}s "
+          f"({valid / dt if dt else 0:.0f} rows/s)")
+    return valid
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Stream sensor records from the API straight into sensor_status")
+    ap.add_argument("--incremental", action="store_true", help="只拉取比水位线更新的记录")
+    ap.add_argument("--since", default=None, type=parse_since, help="手动指定水位线（ISO 时间）")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并发请求数")
+    ap.add_argument("--max-total", type=int, default=None)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每次写库的行数")
+    ap.add_argument("--queue-pages", type=int, default=QUEUE_PAGES, help="队列最多积压的页数")
+    ap.add_argument("--csv", default=None, help="可选：同时把原始记录写到这个 CSV")
+    ap.add_argument("--base-url", default=BASE_URL, help="API 地址（/records 端点），默认官方数据集；测试时可指向本地替身服务")
+    args = ap.parse_args()
+
+    run(incremental=args.incremental, since=args.since, workers=args.workers,
+        max_total=args.max_total, batch_size=args.batch_size, queue_pages=args.queue_pages,
+        csv_path=args.csv, base_url=args.base_url)
@@ -0,0 +1,48 @@
+# etl/watermark.py
+# 增量同步的高水位线：记录已经入库的 sensor_status 最大 status_timestamp
+# 其它表（db_load.upsert_frame 写入的）也在这里记一行，watermark 是写入时间，当作数据版本用
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+SENSOR_STATUS = "sensor_status"
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_watermarks(
+            name       text PRIMARY KEY,
+            watermark  timestamptz NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now()
+        );
+    """)
+
+def get_watermark(cur, name=SENSOR_STATUS):
+    """读取水位线；还没记录过时用 sensor_status 里已有的最大时间戳兜底"""
+    ensure_table(cur)
+    cur.execute("SELECT watermark FROM etl_watermarks WHERE name = %s", (name,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    if name == SENSOR_STATUS:
+        cur.execute("SELECT max(status_timestamp) FROM sensor_status")
+        return cur.fetchone()[0]
+    return None
+
+def advance_watermark(cur, ts, name=SENSOR_STATUS):
+    """只前进不后退（重跑旧文件不会把水位线拉回去）"""
+    if ts is None:
+        return
+    ensure_table(cur)
+    cur.execute("""
+        INSERT INTO etl_watermarks(name, watermark) VALUES (%s, %s)
+        ON CONFLICT (name) DO UPDATE
+           SET watermark  = greatest(etl_watermarks.watermark, excluded.watermark),
+               updated_at = now()
+    """, (name, ts))
+
+def load_watermark(name=SENSOR_STATUS):
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        return get_watermark(cur, name)
@@ -0,0 +1,140 @@
+# etl/xlsx_cache.py
+# 源工作簿的列式缓存：每个工作表第一次解析后存成 Parquet，以文件内容 sha256 作为键，
+# 源文件没变就直接读缓存（毫秒级）；需要重新解析时用 openpyxl 只读流式模式。
+#
+# 单元格类型混杂（同一列既有文字又有数字），不能直接按列存 Parquet，
+# 所以缓存里按 (行, 列, 类型, 值) 的长表存，读回来再还原成网格，
+# 最后交给 pandas 的 TextParser —— 和 pd.read_excel 内部走的是同一条路，结果一致。
+import hashlib
+import os
+from datetime import date, datetime, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.io.parsers import TextParser
+
+CACHE_DIR = Path(os.getenv("XLSX_CACHE_DIR", Path(__file__).resolve().parents[1] / "app" / "data" / ".cache"))
+
+# 单元格类型
+_INT, _FLOAT, _STR, _BOOL, _DATETIME, _TIME = range(6)
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _parse_sheet(path, sheet):
+    """openpyxl 只读模式逐行读出单元格值；和 pandas 一样去掉末尾的空行"""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        rows = []
+        last_nonempty = -1
+        for i, row in enumerate(ws.iter_rows(values_only=True)):
+            row = list(row)
+            while row and row[-1] in (None, ""):
+                row.pop()
+            rows.append(row)
+            if row:
+                last_nonempty = i
+        return rows[:last_nonempty + 1]
+    finally:
+        wb.close()
+
+def _to_cells(rows):
+    """网格 → 长表（只存非空单元格）"""
+    r, c, kind, i_val, f_val, s_val = [], [], [], [], [], []
+    for ri, row in enumerate(rows):
+        for ci, v in enumerate(row):
+            if v is None:
+                continue
+            if isinstance(v, bool):
+                k, iv, fv, sv = _BOOL, int(v), None, None
+            elif isinstance(v, int):
+                k, iv, fv, sv = _INT, v, None, None
+            elif isinstance(v, float):
+                # pandas 读 excel 时会把整数值的 float 变成 int
+                k, iv, fv, sv = (_INT, int(v), None, None) if v.is_integer() else (_FLOAT, None, v, None)
+            elif isinstance(v, (datetime, date)):
+                if not isinstance(v, datetime):
+                    v = datetime(v.year, v.month, v.day)
+                k, iv, fv, sv = _DATETIME, None, None, v.isoformat()
+            elif isinstance(v, time):
+                k, iv, fv, sv = _TIME, None, None, v.isoformat()
+            else:
+                k, iv, fv, sv = _STR, None, None, str(v)
+            r.append(ri); c.append(ci); kind.append(k)
+            i_val.append(iv); f_val.append(fv); s_val.append(sv)
+    return pa.table({
+        "r": pa.array(r, pa.int32()),
+        "c": pa.array(c, pa.int32()),
+        "kind": pa.array(kind, pa.int8()),
+        "i": pa.array(i_val, pa.int64()),
+        "f": pa.array(f_val, pa.float64()),
+        "s": pa.array(s_val, pa.string()),
+    })
+
+def _from_cells(table, nrows, ncols):
+    """长表 → 网格（按类型整列还原，不逐个单元格判断）；空单元格和 pandas 一样用 "" 表示"""
+    grid = np.full((nrows, ncols), "", dtype=object)
+    r = table.column("r").to_numpy()
+    c = table.column("c").to_numpy()
+    kind = table.column("kind").to_numpy()
+    for k, col in ((_INT, "i"), (_FLOAT, "f"), (_STR, "s"), (_BOOL, "i"), (_DATETIME, "s"), (_TIME, "s")):
+        m = kind == k
+        if not m.any():
+            continue
+        vals = table.column(col).filter(pa.array(m)).to_pylist()
+        if k == _BOOL:
+            vals = [bool(v) for v in vals]
+        elif k == _DATETIME:
+            vals = [datetime.fromisoformat(v) for v in vals]
+        elif k == _TIME:
+            vals = [time.fromisoformat(v) for v in vals]
+        out = np.empty(len(vals), dtype=object)
+        out[:] = vals
+        grid[r[m], c[m]] = out
+    return grid.tolist()
+
+def cache_path(path, sheet, digest):
+    return CACHE_DIR / f"{Path(path).stem}.{sheet}.{digest[:16]}.parquet"
+
+def load_grid(path, sheet=0, verbose=False):
+    """返回工作表的原始网格（list of rows）；命中缓存时不打开 xlsx"""
+    digest = file_sha256(path)
+    cp = cache_path(path, sheet, digest)
+    if cp.exists():
+        table = pq.read_table(cp)
+        meta = table.schema.metadata or {}
+        nrows, ncols = int(meta[b"nrows"]), int(meta[b"ncols"])
+        if verbose:
+            print(f"cache hit: {cp.name}")
+        return _from_cells(table, nrows, ncols)
+
+    rows = _parse_sheet(path, sheet)
+    ncols = max((len(r) for r in rows), default=0)
+    table = _to_cells(rows).replace_schema_metadata({"nrows": str(len(rows)), "ncols": str(ncols),
+                                                     "source": str(path), "sha256": digest})
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # 同一个源文件的旧缓存删掉
+    for old in CACHE_DIR.glob(f"{Path(path).stem}.{sheet}.*.parquet"):
+        old.unlink(missing_ok=True)
+    tmp = cp.with_suffix(".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, cp)
+    if verbose:
+        print(f"cache miss: parsed {path} -> {cp.name}")
+    return [["" if v is None else v for v in r] + [""] * (ncols - len(r)) for r in rows]
+
+def read_excel_cached(path, sheet_name=0, header=0, verbose=False):
+    """pd.read_excel(path, sheet_name, header, engine="openpyxl") 的带缓存版本"""
+    grid = load_grid(path, sheet_name, verbose)
+    if not grid:
+        return pd.DataFrame()
+    return TextParser(grid, header=header).read()
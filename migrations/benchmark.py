@@ -0,0 +1,170 @@
+# migrations/benchmark.py
+# 查询计划基准：在一个临时 schema 里跑全部迁移、灌入合成数据，
+# 对 get_bays_within 的不同 半径 × limit 组合、get_bays_in_bbox 的不同视野大小（半边长记在 radius 列）
+# 和 get_bay_history 的不同回看小时数
+# 跑 EXPLAIN (ANALYZE, BUFFERS)，记录规划/执行耗时、缓冲区命中和客户端实测延迟。
+# 用法：python migrations/benchmark.py --sensors 5000 --snapshots 200 --out bench.csv
+#       python migrations/benchmark.py --show-plan      顺便打印每个组合的文本执行计划
+import argparse
+import csv
+import json
+import math
+import statistics
+import time
+
+import psycopg2
+
+from migrate import DATABASE_URL, migrate
+
+SCHEMA = "bench_search"
+CENTER = (144.9631, -37.8136)   # Melbourne CBD (lon, lat)
+RADII = [100, 300, 600, 1000, 3000]
+LIMITS = [200, 1000, 2000, 5000]
+BBOX_HALF_M = [250, 500, 1500]   # 视野矩形的半边长（米）
+BBOX_LIMIT = 5000
+HOURS = [6, 48, 168]
+REPS = 5
+
+def seed(cur, sensors, snapshots, spread_m=3000, step_minutes=15, seed_value=0.42):
+    """
+    在 CBD 周围 spread_m 米的方形范围内随机放 sensors 个传感器，每个 snapshots 条历史快照
+    （每 step_minutes 分钟一条，最近一条是现在），最后按最新一条生成 sensor_latest。
+    """
+    cur.execute("SELECT setseed(%s)", (seed_value,))
+    cur.execute("""
+        CREATE TEMP TABLE bench_sensors ON COMMIT DROP AS
+        SELECT id AS kerbsideid,
+               (id %% 700) + 1 AS zone_number,
+               %(lat)s + (random() - 0.5) * 2 * %(spread)s / 111000.0 AS lat,
+               %(lon)s + (random() - 0.5) * 2 * %(spread)s / (111000.0 * cos(radians(%(lat)s))) AS lon
+          FROM generate_series(1, %(n)s) AS id
+    """, {"lat": CENTER[1], "lon": CENTER[0], "spread": spread_m, "n": sensors})
+    cur.execute("""
+        INSERT INTO sensor_status (kerbsideid, zone_number, status_description, status_timestamp, lat, lon, geom)
+        SELECT s.kerbsideid, s.zone_number,
+               CASE WHEN random() < 0.4 THEN 'Present' ELSE 'Unoccupied' END,
+               date_trunc('minute', now()) - h * make_interval(mins => %s),
+               s.lat, s.lon, ST_SetSRID(ST_MakePoint(s.lon, s.lat), 4326)::geography
+          FROM bench_sensors s, generate_series(0, %s - 1) AS h
+    """, (step_minutes, snapshots))
+    history = cur.rowcount
+    cur.execute("""
+        INSERT INTO sensor_latest (kerbsideid, zone_number, status_description, status_timestamp, lat, lon, geom)
+        SELECT DISTINCT ON (kerbsideid) kerbsideid, zone_number, status_description, status_timestamp, lat, lon, geom
+          FROM sensor_status
+         ORDER BY kerbsideid, status_timestamp DESC
+    """)
+    cur.execute("ANALYZE sensor_status; ANALYZE sensor_latest")
+    return history
+
+def explain(cur, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) → (规划 ms, 执行 ms, 返回行数, 缓冲区命中, 读盘)"""
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    doc = cur.fetchone()[0]
+    doc = json.loads(doc)[0] if isinstance(doc, str) else doc[0]
+    plan = doc["Plan"]
+    return (doc.get("Planning Time", 0.0), doc["Execution Time"], plan.get("Actual Rows", 0),
+            plan.get("Shared Hit Blocks", 0), plan.get("Shared Read Blocks", 0))
+
+def text_plan(cur, sql, params):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+    return "\n".join(r[0] for r in cur.fetchall())
+
+def measure(cur, sql, params, reps=REPS):
+    """先预热一次，再跑 reps 次：EXPLAIN 的耗时取中位数，另外量一遍不带 EXPLAIN 的客户端往返"""
+    cur.execute(sql, params)
+    cur.fetchall()
+    runs = [explain(cur, sql, params) for _ in range(reps)]
+    wall = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        wall.append((time.perf_counter() - t0) * 1000)
+    return {
+        "planning_ms": statistics.median(r[0] for r in runs),
+        "execution_ms": statistics.median(r[1] for r in runs),
+        "rows": runs[-1][2],
+        "shared_hit": runs[-1][3],
+        "shared_read": runs[-1][4],
+        "client_p50_ms": statistics.median(wall),
+        "client_max_ms": max(wall),
+    }
+
+def run(sensors=5000, snapshots=200, reps=REPS, out=None, show_plan=False, keep=False):
+    conn = psycopg2.connect(DATABASE_URL)
+    results = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"SET search_path TO {SCHEMA}, public")
+        conn.commit()
+        migrate(conn, verbose=False)
+
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            history = seed(cur, sensors, snapshots)
+        conn.commit()
+        print(f"seeded {sensors:,} sensors / {history:,} history rows into schema {SCHEMA} "
+              f"in {time.perf_counter() - t0:.1f}s")
+
+        with conn.cursor() as cur:
+            sql = "SELECT * FROM get_bays_within(%s, %s, %s, %s)"
+            for radius in RADII:
+                for limit in LIMITS:
+                    params = (CENTER[0], CENTER[1], radius, limit)
+                    r = measure(cur, sql, params, reps)
+                    results.append({"query": "get_bays_within", "radius_m": radius, "limit": limit, "hours": "", **r})
+                    if show_plan:
+                        print(f"\n-- get_bays_within radius={radius} limit={limit}\n" + text_plan(cur, sql, params))
+
+            sql = "SELECT * FROM get_bays_in_bbox(%s, %s, %s, %s, %s)"
+            for half in BBOX_HALF_M:
+                dlat = half / 111320
+                dlon = half / (111320 * math.cos(math.radians(CENTER[1])))
+                params = (CENTER[0] - dlon, CENTER[1] - dlat, CENTER[0] + dlon, CENTER[1] + dlat, BBOX_LIMIT)
+                r = measure(cur, sql, params, reps)
+                results.append({"query": "get_bays_in_bbox", "radius_m": half, "limit": BBOX_LIMIT, "hours": "", **r})
+                if show_plan:
+                    print(f"\n-- get_bays_in_bbox half={half}\n" + text_plan(cur, sql, params))
+
+            sql = "SELECT * FROM get_bay_history(%s, %s)"
+            for hours in HOURS:
+                params = (sensors // 2, hours)
+                r = measure(cur, sql, params, reps)
+                results.append({"query": "get_bay_history", "radius_m": "", "limit": "", "hours": hours, **r})
+                if show_plan:
+                    print(f"\n-- get_bay_history hours={hours}\n" + text_plan(cur, sql, params))
+        conn.rollback()
+    finally:
+        if not keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+    print(f"\n{'query':16s} {'radius':>6s} {'limit':>6s} {'hours':>5s} {'rows':>6s} "
+          f"{'plan ms':>8s} {'exec ms':>8s} {'hit':>7s} {'read':>6s} {'p50 ms':>8s} {'max ms':>8s}")
+    for r in results:
+        print(f"{r['query']:16s} {r['radius_m']!s:>6s} {r['limit']!s:>6s} {r['hours']!s:>5s} {r['rows']:>6,} "
+              f"{r['planning_ms']:>8.2f} {r['execution_ms']:>8.2f} {r['shared_hit']:>7,} {r['shared_read']:>6,} "
+              f"{r['client_p50_ms']:>8.2f} {r['client_max_ms']:>8.2f}")
+    if out:
+        with open(out, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(results[0]))
+            w.writeheader()
+            w.writerows(results)
+        print(f"results written to {out}")
+    return results
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Seed synthetic data and benchmark the search functions")
+    ap.add_argument("--sensors", type=int, default=5000, help="合成传感器个数")
+    ap.add_argument("--snapshots", type=int, default=200, help="每个传感器的历史快照条数（每 15 分钟一条）")
+    ap.add_argument("--reps", type=int, default=REPS, help="每个组合重复次数")
+    ap.add_argument("--out", default=None, help="可选：把结果写到 CSV")
+    ap.add_argument("--show-plan", action="store_true", help="打印每个组合的文本执行计划")
+    ap.add_argument("--keep", action="store_true", help="跑完保留临时 schema，方便手动分析")
+    args = ap.parse_args()
+
+    run(args.sensors, args.snapshots, args.reps, args.out, args.show_plan, args.keep)
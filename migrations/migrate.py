@@ -0,0 +1,102 @@
+# migrations/migrate.py
+# 版本化的 SQL 迁移：migrations/sql/NNNN_name.sql 按编号顺序执行，
+# 已执行的记录在 schema_migrations 里（带文件校验和），每个文件一个事务，失败整体回滚。
+# 用法：python migrations/migrate.py            执行所有未执行的迁移
+#       python migrations/migrate.py --status   只查看状态
+import argparse
+import hashlib
+import os
+import re
+from pathlib import Path
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+SQL_DIR = Path(__file__).resolve().parent / "sql"
+_NAME = re.compile(r"^(\d+)_(.+)\.sql$")
+
+def discover(sql_dir=SQL_DIR):
+    """[(版本号, 名称, 路径)]，按版本号排序；编号重复直接报错"""
+    out = {}
+    for p in sorted(Path(sql_dir).glob("*.sql")):
+        m = _NAME.match(p.name)
+        if not m:
+            continue
+        version = int(m.group(1))
+        if version in out:
+            raise ValueError(f"duplicate migration version {version}: {out[version][2].name}, {p.name}")
+        out[version] = (version, m.group(2), p)
+    return [out[v] for v in sorted(out)]
+
+def checksum(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations(
+            version    integer PRIMARY KEY,
+            name       text NOT NULL,
+            checksum   text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        );
+    """)
+
+def applied(cur):
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cur.fetchall())
+
+def migrate(conn, sql_dir=SQL_DIR, verbose=True):
+    """执行所有未执行的迁移，返回执行了的版本号列表"""
+    with conn.cursor() as cur:
+        ensure_table(cur)
+        done = applied(cur)
+    conn.commit()
+
+    ran = []
+    for version, name, path in discover(sql_dir):
+        if version in done:
+            if done[version] != checksum(path) and verbose:
+                print(f"warning: {path.name} changed after it was applied")
+            continue
+        with conn.cursor() as cur:
+            # 同一个版本只允许一个进程执行
+            cur.execute("LOCK TABLE schema_migrations IN EXCLUSIVE MODE")
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+            if cur.fetchone():
+                conn.rollback()
+                continue
+            cur.execute(path.read_text(encoding="utf-8"))
+            cur.execute("INSERT INTO schema_migrations(version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, checksum(path)))
+        conn.commit()
+        ran.append(version)
+        if verbose:
+            print(f"applied {path.name}")
+    return ran
+
+def status(conn, sql_dir=SQL_DIR):
+    with conn.cursor() as cur:
+        ensure_table(cur)
+        done = applied(cur)
+    conn.commit()
+    for version, name, path in discover(sql_dir):
+        state = "pending" if version not in done else ("changed" if done[version] != checksum(path) else "applied")
+        print(f"{version:04d}  {name:30s} {state}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Apply versioned SQL migrations")
+    ap.add_argument("--status", action="store_true", help="只列出迁移状态，不执行")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        if args.status:
+            status(conn)
+        else:
+            ran = migrate(conn)
+            print(f"{len(ran)} migrations applied" if ran else "database is up to date")
+    finally:
+        conn.close()
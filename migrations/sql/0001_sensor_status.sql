@@ -0,0 +1,18 @@
+-- 0001: 传感器状态历史表。主键 (kerbsideid, status_timestamp) 同时服务于
+-- 加载时的 ON CONFLICT 去重和 get_bay_history 的按传感器 + 时间范围扫描。
+-- 需要按月/天分区时用 etl/partitions.py migrate 转换，索引名保持一致。
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+CREATE TABLE IF NOT EXISTS sensor_status(
+    kerbsideid         integer NOT NULL,
+    zone_number        integer,
+    status_description text,
+    status_timestamp   timestamptz NOT NULL,
+    lat                double precision,
+    lon                double precision,
+    geom               geography(Point, 4326),
+    PRIMARY KEY (kerbsideid, status_timestamp)
+);
+
+CREATE INDEX IF NOT EXISTS sensor_status_ts_idx ON sensor_status (status_timestamp);
+CREATE INDEX IF NOT EXISTS sensor_status_geom_gix ON sensor_status USING gist (geom);
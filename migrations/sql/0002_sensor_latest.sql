@@ -0,0 +1,25 @@
+-- 0002: 每个传感器的最新状态（加载时由 load_sensor_csv.latest_upsert_sql 维护），半径搜索只读这张表。
+CREATE TABLE IF NOT EXISTS sensor_latest(
+    kerbsideid         integer PRIMARY KEY,
+    zone_number        integer,
+    status_description text,
+    status_timestamp   timestamptz NOT NULL,
+    lat                double precision NOT NULL,
+    lon                double precision NOT NULL,
+    geom               geography(Point, 4326) NOT NULL,
+    updated_at         timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sensor_latest_geom_gix ON sensor_latest USING gist (geom);
+
+-- 已有历史数据时补一遍
+INSERT INTO sensor_latest (kerbsideid, zone_number, status_description, status_timestamp, lat, lon, geom)
+SELECT DISTINCT ON (kerbsideid)
+       kerbsideid, zone_number, status_description, status_timestamp, lat, lon,
+       ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography
+  FROM sensor_status
+ WHERE lat IS NOT NULL AND lon IS NOT NULL
+ ORDER BY kerbsideid, status_timestamp DESC
+ON CONFLICT (kerbsideid) DO NOTHING;
+
+ANALYZE sensor_latest;
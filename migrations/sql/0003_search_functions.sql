@@ -0,0 +1,31 @@
+-- 0003: 页面调用的两个查询函数。
+-- 都写成单条 SELECT 的 LANGUAGE sql STABLE 函数，规划器会把它内联进调用方的查询，
+-- 参数直接参与选择索引（不会像 plpgsql 那样用通用计划）。
+
+-- 半径搜索：ST_DWithin 用 geography 上的 GiST 索引圈出范围，
+-- ORDER BY <-> 是索引支持的 KNN 排序，拿够 p_limit 个最近的就停，不用把范围内的全排一遍。
+DROP FUNCTION IF EXISTS get_bays_within(double precision, double precision, double precision, integer);
+CREATE FUNCTION get_bays_within(p_lon double precision, p_lat double precision,
+                                p_radius double precision, p_limit integer)
+RETURNS TABLE(bay_id integer, lat double precision, lon double precision,
+              is_occupied boolean, status_timestamp timestamptz)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT l.kerbsideid, l.lat, l.lon, l.status_description = 'Present', l.status_timestamp
+      FROM sensor_latest l
+     WHERE ST_DWithin(l.geom, ST_SetSRID(ST_MakePoint(p_lon, p_lat), 4326)::geography, p_radius)
+     ORDER BY l.geom <-> ST_SetSRID(ST_MakePoint(p_lon, p_lat), 4326)::geography
+     LIMIT p_limit
+$$;
+
+-- 单个传感器的历史：主键 (kerbsideid, status_timestamp) 上的范围扫描；
+-- 时间下界是 now() - 小时数，sensor_status 分区后只会扫到相关分区。
+DROP FUNCTION IF EXISTS get_bay_history(integer, integer);
+CREATE FUNCTION get_bay_history(p_bay_id integer, p_hours integer)
+RETURNS TABLE(bay_id integer, is_occupied boolean, status_timestamp timestamptz)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT s.kerbsideid, s.status_description = 'Present', s.status_timestamp
+      FROM sensor_status s
+     WHERE s.kerbsideid = p_bay_id
+       AND s.status_timestamp >= now() - make_interval(hours => p_hours)
+     ORDER BY s.status_timestamp
+$$;
@@ -0,0 +1,46 @@
+-- 0004: 每个传感器按小时的占用汇总（由 etl/rollup.py 在加载时增量维护），长回看的历史面板只读这张表。
+-- 只存有快照的小时；中间没有事件的整小时由 get_bay_occupancy 沿用上一条状态补齐。
+-- 已有历史数据时，跑完这个迁移后执行一次 python etl/rollup.py --rebuild 全量补齐；加载脚本只做增量，不会自动补。
+CREATE TABLE IF NOT EXISTS sensor_hourly(
+    kerbsideid       integer NOT NULL,
+    hour             timestamptz NOT NULL,
+    occupied_minutes double precision NOT NULL,
+    observed_minutes double precision NOT NULL,
+    change_count     integer NOT NULL,
+    snapshots        integer NOT NULL,
+    first_state      boolean NOT NULL,
+    last_state       boolean NOT NULL,
+    PRIMARY KEY (kerbsideid, hour)
+);
+
+-- 最近 p_hours 个整点小时（含当前小时）的逐小时占用，按时间加权：
+--   有汇总行的小时直接用汇总值；当前小时只算到 now()（汇总里最后一段默认延续到小时末）
+--   没有汇总行的小时沿用此前最后一个状态；再往前完全没有数据的小时 observed_minutes = 0
+DROP FUNCTION IF EXISTS get_bay_occupancy(integer, integer);
+CREATE FUNCTION get_bay_occupancy(p_bay_id integer, p_hours integer)
+RETURNS TABLE(bay_id integer, hour timestamptz, occupied_minutes double precision,
+              observed_minutes double precision, change_count integer, is_occupied boolean)
+LANGUAGE sql STABLE AS $$
+    SELECT p_bay_id, g.hour,
+           CASE WHEN r.hour IS NOT NULL
+                THEN greatest(r.occupied_minutes - CASE WHEN r.last_state THEN g.future_min ELSE 0 END, 0)
+                WHEN c.last_state THEN 60 - g.future_min
+                ELSE 0 END,
+           CASE WHEN r.hour IS NOT NULL THEN greatest(r.observed_minutes - g.future_min, 0)
+                WHEN c.last_state IS NOT NULL THEN 60 - g.future_min
+                ELSE 0 END,
+           coalesce(r.change_count, 0),
+           coalesce(r.last_state, c.last_state)
+      FROM (SELECT h AS hour,
+                   greatest(extract(epoch FROM h + interval '1 hour' - now()) / 60.0, 0) AS future_min
+              FROM generate_series(date_trunc('hour', now()) - make_interval(hours => p_hours - 1),
+                                   date_trunc('hour', now()), interval '1 hour') AS h) g
+      LEFT JOIN sensor_hourly r ON r.kerbsideid = p_bay_id AND r.hour = g.hour
+      LEFT JOIN LATERAL (
+            SELECT p.last_state
+              FROM sensor_hourly p
+             WHERE r.hour IS NULL AND p.kerbsideid = p_bay_id AND p.hour < g.hour
+             ORDER BY p.hour DESC
+             LIMIT 1) c ON true
+     ORDER BY g.hour
+$$;
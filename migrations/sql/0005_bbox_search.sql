@@ -0,0 +1,21 @@
+-- 0005: 按矩形（地图视野 / 瓦片）取车位，给页面的视野加载模式用。
+-- geography 的包围盒是三维地心坐标下的盒子，和经纬度矩形并不完全一致；
+-- 这里在 geom::geometry（经纬度平面坐标）上另建一个 GiST 表达式索引，
+-- && ST_MakeEnvelope 就是精确的经纬度矩形判断，并且直接走索引。
+CREATE INDEX IF NOT EXISTS sensor_latest_geom_2d_gix ON sensor_latest USING gist ((geom::geometry));
+
+ANALYZE sensor_latest;
+
+DROP FUNCTION IF EXISTS get_bays_in_bbox(double precision, double precision, double precision, double precision, integer);
+CREATE FUNCTION get_bays_in_bbox(p_min_lon double precision, p_min_lat double precision,
+                                 p_max_lon double precision, p_max_lat double precision,
+                                 p_limit integer)
+RETURNS TABLE(bay_id integer, lat double precision, lon double precision,
+              is_occupied boolean, status_timestamp timestamptz)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT l.kerbsideid, l.lat, l.lon, l.status_description = 'Present', l.status_timestamp
+      FROM sensor_latest l
+     WHERE l.geom::geometry && ST_MakeEnvelope(p_min_lon, p_min_lat, p_max_lon, p_max_lat, 4326)
+     ORDER BY l.kerbsideid
+     LIMIT p_limit
+$$;
@@ -0,0 +1,9 @@
+# tests/conftest.py
+# etl/ 下的脚本按模块名互相导入，app/ 下的页面用 lib.xxx 导入，测试时两个目录都放进 sys.path
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+for d in (ROOT / "etl", ROOT / "app"):
+    if str(d) not in sys.path:
+        sys.path.insert(0, str(d))
@@ -0,0 +1,139 @@
+# tests/test_api_client.py
+# 分页抓取引擎对着本地的替身 HTTP 服务（http.server）测试：
+# 按 offset 顺序合并、5xx 重试、total_count 发现，以及超过 /records 分页上限时改走 /exports。
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import api_client
+import fetch_bays
+
+
+class StandIn:
+    """模拟 Opendatasoft v2.1：/records 分页返回 total_count + results，/exports/jsonl 每行一条"""
+
+    def __init__(self, total, offset_window=api_client.MAX_OFFSET_WINDOW):
+        self.total = total
+        self.offset_window = offset_window
+        self.fail_once = set()      # 这些 offset 第一次请求返回 503
+        self.requests = []          # (path, offset)
+        self.lock = threading.Lock()
+
+    def rows(self, start, stop):
+        return [{"kerbsideid": i, "location": {"lat": -37.8, "lon": 144.9 + i * 1e-6}}
+                for i in range(start, min(stop, self.total))]
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b""):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(url.query).items()}
+                limit = int(q["limit"])
+                if url.path.endswith("/exports/jsonl"):
+                    with server.lock:
+                        server.requests.append(("exports", None))
+                    self.send(200, "".join(json.dumps(r) + "\n" for r in server.rows(0, limit)).encode())
+                    return
+                offset = int(q["offset"])
+                with server.lock:
+                    server.requests.append(("records", offset))
+                    fail = offset in server.fail_once
+                    server.fail_once.discard(offset)
+                if fail:
+                    self.send(503)
+                    return
+                if offset + limit > server.offset_window:
+                    self.send(400, b'{"error_code": "InvalidRESTParameterError"}')
+                    return
+                # 每页随机延迟，让并发请求乱序完成
+                time.sleep(random.uniform(0, 0.01))
+                body = {"total_count": server.total, "results": server.rows(offset, offset + limit)}
+                self.send(200, json.dumps(body).encode())
+
+        return Handler
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def start(total, **kwargs):
+        s = StandIn(total, **kwargs)
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), s.handler())
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        s.url = f"http://127.0.0.1:{httpd.server_port}/api/explore/v2.1/catalog/datasets/test/records"
+        return s
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def ids(rows):
+    return [r["kerbsideid"] for r in rows]
+
+
+def test_pages_merged_in_offset_order(stand_in):
+    s = stand_in(1234)
+    rows = api_client.fetch_all_rows(s.url, page_size=100, workers=8, verbose=False)
+    assert ids(rows) == list(range(1234))
+    assert sorted(o for _, o in s.requests) == list(range(0, 1234, 100))
+
+
+def test_total_count_discovery(stand_in):
+    s = stand_in(250)
+    rows = api_client.fetch_all_rows(s.url, page_size=100, verbose=False)
+    assert ids(rows) == list(range(250))
+    # 第一页之后只请求 total_count 以内的页
+    assert sorted(o for _, o in s.requests) == [0, 100, 200]
+
+    s = stand_in(1000)
+    rows = api_client.fetch_all_rows(s.url, page_size=100, max_total=150, verbose=False)
+    assert ids(rows) == list(range(150))
+    assert sorted(o for _, o in s.requests) == [0, 100]
+
+
+def test_retry_on_5xx(stand_in):
+    s = stand_in(500)
+    s.fail_once = {0, 300}
+    session = api_client.make_session(workers=4, backoff=0)
+    rows = api_client.fetch_all_rows(s.url, page_size=100, workers=4, session=session, verbose=False)
+    session.close()
+    assert ids(rows) == list(range(500))
+    offsets = [o for _, o in s.requests]
+    assert offsets.count(0) == 2 and offsets.count(300) == 2
+
+
+def test_exports_beyond_offset_window(stand_in, monkeypatch):
+    monkeypatch.setattr(api_client, "MAX_OFFSET_WINDOW", 500)
+    s = stand_in(1234, offset_window=500)
+    pages = list(api_client.iter_pages(s.url, page_size=100, verbose=False))
+    assert [off for off, _ in pages] == list(range(0, 1234, 100))
+    assert ids(r for _, page in pages for r in page) == list(range(1234))
+    assert ("exports", None) in s.requests
+    assert all(o is None or o + 100 <= 500 for _, o in s.requests)
+
+
+def test_fetch_bays_against_stand_in(stand_in):
+    s = stand_in(321)
+    df = fetch_bays.fetch_all(workers=4, base_url=s.url)
+    assert len(df) == 321
+    assert {"location.lat", "location.lon"} <= set(df.columns)
@@ -0,0 +1,19 @@
+# tests/test_fetch_sensors.py
+from datetime import datetime, timezone
+
+import pytest
+
+from fetch_sensors import incremental_params, parse_since
+
+
+def test_since_normalised_to_utc():
+    assert parse_since("2025-01-02T03:04:05+10:00") == datetime(2025, 1, 1, 17, 4, 5, tzinfo=timezone.utc)
+    assert parse_since("2025-01-02") == datetime(2025, 1, 2, tzinfo=timezone.utc)
+    where = incremental_params("2025-01-02T03:04:05Z")["where"]
+    assert where == "status_timestamp > date'2025-01-02T03:04:05+00:00'"
+
+
+@pytest.mark.parametrize("bad", ["2025' OR 1=1 --", "yesterday", ""])
+def test_since_rejects_non_iso(bad):
+    with pytest.raises(ValueError):
+        incremental_params(bad)
@@ -0,0 +1,61 @@
+# tests/test_load_sensor_csv.py
+# 列式解析 parse_frame 和逐行的 row_to_tuple 对比：随机生成各种合法 / 不合法的取值和列名别名，
+# 有效行逐个相同，无效行按第一个不合格的原因计数也相同
+import numpy as np
+import pandas as pd
+
+from load_sensor_csv import frame_to_rows, parse_frame, parse_ts, row_to_tuple, to_int_like
+
+KERBS = ["7394", "7394.0", "7,394", " 12 ", "0", "0.4", "-5", "", " ", "abc", "nan", "inf", "1e3"]
+ZONES = ["7001", "7001.0", "", "x", "1,200", " "]
+TIMESTAMPS = ["2024-05-01T10:00:00+00:00", "2024-05-01T10:00:00Z", "2024-05-01T10:00:00",
+              "2024-05-01 10:00:00.123456+10:00", "2024-05-01", "", " ", "garbage", "2024-13-01T00:00:00",
+              " 2024-05-01T10:00:00Z", "2024-05-01T10:00:00+1000", "2024-05-01T10:00:00-05:30"]
+COORDS = ["-37.8136", "144.9631", "1,234.5", "", " ", "nan", "x", "-37.81e0", "inf"]
+STATUSES = ["Present", "Unoccupied", " Present ", ""]
+
+
+def random_raw(n, seed):
+    rng = np.random.default_rng(seed)
+    pick = lambda pool: rng.choice(pool, n)
+    return pd.DataFrame({
+        # 同一个字段有多个别名列：前面的列为空时取后面的
+        "kerbsideid": pick(KERBS), "sensor_id": pick(KERBS),
+        "zone_number": pick(ZONES), "zone": pick(ZONES),
+        "status_description": pick(STATUSES), "status": pick(STATUSES),
+        "status_timestamp": pick(TIMESTAMPS), "last_updated": pick(TIMESTAMPS),
+        "location.lat": pick(COORDS), "lat": pick(COORDS),
+        "location.lon": pick(COORDS), "lon": pick(COORDS),
+    }).astype(object)
+
+
+def reference(raw):
+    rows, reasons = [], {"missing_kerbsideid": 0, "bad_timestamp": 0, "bad_location": 0}
+    for rec in raw.to_dict("records"):
+        t = row_to_tuple(rec)
+        if t is not None:
+            rows.append(t)
+        elif not to_int_like(rec.get("kerbsideid") or rec.get("kerbside_id") or rec.get("sensor_id")):
+            reasons["missing_kerbsideid"] += 1
+        elif parse_ts(rec.get("status_timestamp") or rec.get("last_updated") or "") is None:
+            reasons["bad_timestamp"] += 1
+        else:
+            reasons["bad_location"] += 1
+    return rows, reasons
+
+
+def test_parse_frame_matches_row_to_tuple():
+    for seed in range(5):
+        raw = random_raw(2000, seed)
+        frame, reasons = parse_frame(raw)
+        want_rows, want_reasons = reference(raw)
+        assert reasons == want_reasons
+        assert frame_to_rows(frame) == want_rows
+
+
+def test_parse_frame_missing_alias_columns():
+    raw = pd.DataFrame({"kerbside_id": ["5", ""], "last_updated": ["2024-05-01T10:00:00Z"] * 2,
+                        "lat": ["-37.8", "-37.8"], "lon": ["144.9", "144.9"]})
+    frame, reasons = parse_frame(raw)
+    assert frame_to_rows(frame) == reference(raw)[0]
+    assert reasons == {"missing_kerbsideid": 1, "bad_timestamp": 0, "bad_location": 0}
@@ -0,0 +1,44 @@
+# tests/test_map_layers.py
+# 两种地图（folium 的 BayLayer、WebGL 的 deck_frame）对缺失编号 / 时间和空结果的处理一致
+import json
+
+import pandas as pd
+import pyarrow as pa
+
+from lib.deck_layers import deck_frame
+from lib.map_layers import MISSING, BayLayer, bay_columns
+
+
+def arrow_frame(ids, ts):
+    n = len(ids)
+    return pd.DataFrame({
+        "bay_id": pd.array(ids, dtype=pd.ArrowDtype(pa.int64())),
+        "lat": [-37.81] * n,
+        "lon": [144.96] * n,
+        "is_occupied": pd.array([True, None, False][:n], dtype=pd.ArrowDtype(pa.bool_())),
+        "status_timestamp": pd.array([pd.Timestamp(t, tz="UTC") if t else None for t in ts],
+                                     dtype=pd.ArrowDtype(pa.timestamp("us", "UTC"))),
+    }, index=range(10, 10 + n))
+
+
+def test_missing_id_and_timestamp():
+    df = arrow_frame([1, None, 3], ["2024-01-01 10:00:30", None, "2024-01-02 11:05"])
+    cols = bay_columns(df)
+    assert cols["id"] == [1, None, 3]
+    assert cols["ts"] == ["2024-01-01 10:00", MISSING, "2024-01-02 11:05"]
+    assert cols["occ"] == [1, 0, 0]
+    json.loads(BayLayer(df).data)
+
+    deck = deck_frame(df)
+    assert deck["bay_id"].tolist()[::2] == [1, 3] and pd.isna(deck["bay_id"][1])
+    assert deck["ts"].tolist() == cols["ts"]
+
+
+def test_all_missing_and_empty():
+    df = arrow_frame([None, None], [None, None])
+    assert bay_columns(df)["ts"] == [MISSING, MISSING]
+    assert deck_frame(df)["ts"].tolist() == [MISSING, MISSING]
+
+    empty = arrow_frame([], [])
+    assert bay_columns(empty) == {"id": [], "lat": [], "lon": [], "occ": [], "ts": []}
+    assert deck_frame(empty).empty
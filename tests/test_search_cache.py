@@ -0,0 +1,79 @@
+# tests/test_search_cache.py
+# 半径搜索缓存和直接查询（暴力计算）的结果逐条一致，包括半径边界和 limit 截断；
+# 视野模式的瓦片缓存：缺的瓦片并行取，已取过的直接用缓存，截断的瓦片计数
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from lib.search_cache import RadiusSearchCache, TileCache, distance_m
+
+CENTER = (-37.8136, 144.9631)
+
+
+def random_bays(n=20000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "bay_id": np.arange(n),
+        "lat": CENTER[0] + rng.uniform(-0.015, 0.015, n),
+        "lon": CENTER[1] + rng.uniform(-0.02, 0.02, n),
+        "is_occupied": rng.random(n) < 0.5,
+    })
+
+
+def direct(bays):
+    """get_bays_within 的参照实现：半径以内，由近到远，最多 limit 条"""
+    lat, lon = bays["lat"].to_numpy(), bays["lon"].to_numpy()
+
+    def fetch(qlon, qlat, radius, limit):
+        d = distance_m(qlat, qlon, lat, lon)
+        idx = np.flatnonzero(d <= radius)
+        return bays.iloc[idx[np.argsort(d[idx], kind="stable")][:limit]].reset_index(drop=True)
+    return fetch
+
+
+def test_radius_cache_matches_direct_query():
+    fetch = direct(random_bays())
+    cache = RadiusSearchCache(fetch, snap_m=50)
+    rng = np.random.default_rng(11)
+    for _ in range(1500):
+        # 中心集中在一小片，让同格命中和超集命中都经常发生
+        lat = CENTER[0] + rng.uniform(-0.004, 0.004)
+        lon = CENTER[1] + rng.uniform(-0.005, 0.005)
+        radius = int(rng.choice([50, 100, 200, 300, 500]))
+        limit = int(rng.choice([1, 20, 100, 500, 2000]))
+        got = cache.search(lat, lon, radius, limit)["bay_id"].tolist()
+        assert got == fetch(lon, lat, radius, limit)["bay_id"].tolist(), (lat, lon, radius, limit)
+    stats = cache.stats()
+    assert stats["hits"] > 0 and stats["superset_hits"] > 0
+
+
+def tile_bounds(z, x, y):
+    return (x, y, x + 1, y + 1)
+
+
+def test_tile_cache_fetches_missing_tiles_concurrently():
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def fetch(min_lon, min_lat, max_lon, max_lat, limit):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        n = 3 if min_lon == 0 else 1      # x=0 的瓦片正好到 limit，算截断
+        return pd.DataFrame({"bay_id": [min_lon * 100 + min_lat * 10 + i for i in range(n)]})
+
+    cache = TileCache(fetch, tile_limit=3, fetch_workers=4)
+    tiles = [(15, x, y) for x in range(2) for y in range(4)]
+    t0 = time.perf_counter()
+    df, fetched, truncated = cache.load(tiles, tile_bounds)
+    elapsed = time.perf_counter() - t0
+    assert (fetched, truncated, len(df)) == (8, 4, 4 * 3 + 4 * 1)
+    assert peak[0] == 4 and elapsed < 8 * 0.05
+
+    df2, fetched, truncated = cache.load(tiles[:3], tile_bounds)
+    assert (fetched, truncated, len(df2)) == (0, 3, 9)
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 8
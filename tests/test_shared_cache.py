@@ -0,0 +1,223 @@
+# tests/test_shared_cache.py
+# 共享缓存的两个后端和装饰器：
+# RespClient / RedisBackend 对着进程内的最小 RESP 服务测试（AUTH / SELECT / GET / SET PX、断线重连），
+# DiskBackend 测 TTL 过期和清理，shared_cache 测数据版本变化后失效、拿不到版本或没有共享后端时退回进程内缓存。
+import socketserver
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from lib import shared_cache
+from lib.shared_cache import DiskBackend, RedisBackend, RespClient
+
+
+class RespStandIn:
+    """只实现用到的命令；每个连接一个线程，数据按 db 编号分开，SET PX 带过期时间"""
+
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}             # (db, key) -> (value, 过期时间)
+        self.commands = []         # 收到的命令名
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                n = int(line[1:])
+                args = []
+                for _ in range(n):
+                    size = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(size + 2)[:-2])
+                return args
+
+            def handle(self):
+                with server.lock:
+                    server.connections += 1
+                db, authed = 0, server.password is None
+                while True:
+                    args = self.read_command()
+                    if args is None:
+                        return
+                    cmd = args[0].decode().upper()
+                    with server.lock:
+                        server.commands.append(cmd)
+                    if cmd == "AUTH":
+                        authed = args[1].decode() == server.password
+                        self.wfile.write(b"+OK\r\n" if authed else b"-WRONGPASS invalid password\r\n")
+                    elif not authed:
+                        self.wfile.write(b"-NOAUTH Authentication required.\r\n")
+                    elif cmd == "SELECT":
+                        db = int(args[1])
+                        self.wfile.write(b"+OK\r\n")
+                    elif cmd == "SET":
+                        ttl_ms = int(args[4]) if len(args) > 4 and args[3].upper() == b"PX" else None
+                        expires = time.time() + ttl_ms / 1000 if ttl_ms else None
+                        with server.lock:
+                            server.data[(db, args[1])] = (args[2], expires)
+                        self.wfile.write(b"+OK\r\n")
+                    elif cmd == "GET":
+                        with server.lock:
+                            value, expires = server.data.get((db, args[1]), (None, None))
+                        if value is None or (expires is not None and expires < time.time()):
+                            self.wfile.write(b"$-1\r\n")
+                        else:
+                            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+                    elif cmd == "QUIT":
+                        self.wfile.write(b"+OK\r\n")
+                        return
+                    else:
+                        self.wfile.write(b"-ERR unknown command '%s'\r\n" % cmd.encode())
+
+        return Handler
+
+
+@pytest.fixture
+def resp_server():
+    servers = []
+
+    def start(**kwargs):
+        s = RespStandIn(**kwargs)
+        srv = socketserver.ThreadingTCPServer(("127.0.0.1", 0), s.handler())
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        s.port = srv.server_address[1]
+        return s
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_resp_roundtrip_large_value(resp_server):
+    s = resp_server()
+    client = RespClient(f"redis://127.0.0.1:{s.port}/0")
+    blob = bytes(range(256)) * 1000          # 比一次 recv 大，且包含 \r\n
+    assert client.execute("SET", "k", blob, "PX", 60000) == "OK"
+    assert client.execute("GET", "k") == blob
+    assert client.execute("GET", "missing") is None
+    with pytest.raises(RuntimeError, match="unknown command"):
+        client.execute("FLUSHALL")
+    client.close()
+
+
+def test_resp_auth_and_select(resp_server):
+    s = resp_server(password="secret")
+    client = RespClient(f"redis://:secret@127.0.0.1:{s.port}/3")
+    client.execute("SET", "k", b"v")
+    assert s.commands[:3] == ["AUTH", "SELECT", "SET"]
+    assert (3, b"k") in s.data
+    client.close()
+
+    with pytest.raises(RuntimeError, match="WRONGPASS"):
+        RespClient(f"redis://:wrong@127.0.0.1:{s.port}/0").execute("GET", "k")
+
+
+def test_resp_reconnects_after_server_closes(resp_server):
+    s = resp_server()
+    client = RespClient(f"redis://127.0.0.1:{s.port}/0")
+    client.execute("SET", "k", b"v")
+    client.execute("QUIT")                   # 服务端关掉这个连接
+    assert client.execute("GET", "k") == b"v"
+    assert s.connections == 2
+    client.close()
+
+
+def test_redis_backend_ttl(resp_server):
+    s = resp_server()
+    backend = RedisBackend(f"redis://127.0.0.1:{s.port}/0")
+    backend.set("a", b"1", ttl_s=60)
+    backend.set("b", b"2", ttl_s=0.05)
+    time.sleep(0.1)
+    assert backend.get("a") == b"1"
+    assert backend.get("b") is None
+    backend.client.close()
+
+
+def test_disk_backend_ttl_and_prune(tmp_path):
+    backend = DiskBackend(tmp_path)
+    backend.set("a", b"1", ttl_s=60)
+    backend.set("b", b"2", ttl_s=0.05)
+    backend.set("c", b"3", ttl_s=0.05)
+    time.sleep(0.1)
+    assert backend.get("a") == b"1"
+    assert backend.get("b") is None
+    assert not backend._path("b").exists()    # 读到过期的顺手删掉
+    backend.prune()
+    assert sorted(tmp_path.glob("*.bin")) == [backend._path("a")]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_dumps_loads_roundtrip():
+    df = pd.DataFrame({"bay_id": [1, 2], "lat": [-37.8, -37.81], "status": ["Present", None]})
+    pd.testing.assert_frame_equal(shared_cache.loads(shared_cache.dumps(df)), df)
+    assert shared_cache.loads(shared_cache.dumps(["Vic.", "NSW"])) == ["Vic.", "NSW"]
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "_backend", DiskBackend(tmp_path))
+    monkeypatch.setattr(shared_cache, "_stats", {})
+    return tmp_path
+
+
+def test_version_change_invalidates(disk_cache):
+    state = {"version": "t@1", "calls": 0}
+
+    @shared_cache.shared_cache("test_ns", ttl_s=60, version=lambda: state["version"])
+    def fetch(x):
+        state["calls"] += 1
+        return pd.DataFrame({"x": [x], "call": [state["calls"]]})
+
+    assert fetch(1)["call"][0] == 1
+    assert fetch(1)["call"][0] == 1           # 命中
+    assert fetch(2)["call"][0] == 2           # 参数不同
+    state["version"] = "t@2"                  # ETL 写入后版本前进
+    assert fetch(1)["call"][0] == 3
+    assert shared_cache._stats["test_ns"] == {"hits": 1, "misses": 3, "errors": 0, "bypassed": 0}
+
+
+def test_no_version_bypasses_shared_cache(disk_cache):
+    calls = []
+
+    @shared_cache.shared_cache("demo_ns", ttl_s=60, version=lambda: None)
+    def fetch(x):
+        calls.append(x)
+        return ["demo", x]
+
+    assert fetch(1) == ["demo", 1] and fetch(1) == ["demo", 1] and fetch(2) == ["demo", 2]
+    assert calls == [1, 2]                     # 进程内缓存兜底，不会每次都调用
+    assert not list(disk_cache.glob("*.bin"))  # 演示数据没有写进共享缓存
+    assert shared_cache._stats["demo_ns"]["bypassed"] == 3
+
+
+def test_no_backend_falls_back_to_process_cache(monkeypatch):
+    monkeypatch.setattr(shared_cache, "_backend", False)   # CACHE_BACKEND=none
+    state = {"version": "t@1", "calls": 0}
+
+    @shared_cache.shared_cache("local_ns", ttl_s=60, version=lambda: state["version"])
+    def fetch(x):
+        state["calls"] += 1
+        return pd.DataFrame({"x": [x]})
+
+    @shared_cache.shared_cache("other_ns", ttl_s=60)
+    def other(x):
+        return pd.DataFrame({"y": [x]})
+
+    fetch(1)
+    fetch(1)
+    assert state["calls"] == 1
+    assert list(other(1).columns) == ["y"]     # 不同 namespace 不共用进程内缓存
+    state["version"] = "t@2"
+    fetch(1)
+    assert state["calls"] == 2
+    assert shared_cache.cache_stats() is None
@@ -0,0 +1,78 @@
+# tests/test_spatial_index.py
+# 本地网格索引和暴力计算对比（随机中心、半径、limit），以及快照里缺时间、空快照的处理
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.search_cache import distance_m
+from lib.spatial_index import BayIndex, load_snapshot
+
+CENTER = (-37.8136, 144.9631)
+
+
+@pytest.fixture(scope="module")
+def bays():
+    rng = np.random.default_rng(7)
+    n = 5000
+    return pd.DataFrame({
+        "bay_id": rng.permutation(np.arange(100000, 100000 + n)),
+        "lat": CENTER[0] + rng.uniform(-0.02, 0.02, n),
+        "lon": CENTER[1] + rng.uniform(-0.025, 0.025, n),
+        "is_occupied": rng.random(n) < 0.5,
+        "status_timestamp": pd.Timestamp("2024-05-01", tz="UTC"),
+    })
+
+
+def brute_within(df, lat, lon, radius, limit=None):
+    d = distance_m(lat, lon, df["lat"].to_numpy(), df["lon"].to_numpy())
+    idx = np.flatnonzero(d <= radius)
+    return df["bay_id"].to_numpy()[idx[np.argsort(d[idx], kind="stable")]][:limit].tolist()
+
+
+def test_within_and_nearest_match_brute_force(bays):
+    index = BayIndex(bays, cell_m=100)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        lat = CENTER[0] + rng.uniform(-0.025, 0.025)
+        lon = CENTER[1] + rng.uniform(-0.03, 0.03)
+        radius = float(rng.choice([30, 100, 250, 600, 1500]))
+        limit = int(rng.choice([1, 10, 100, 1000]))
+        assert index.within(lat, lon, radius, limit)["bay_id"].tolist() == brute_within(bays, lat, lon, radius, limit)
+        k = int(rng.choice([1, 5, 50]))
+        assert index.nearest(lat, lon, k)["bay_id"].tolist() == brute_within(bays, lat, lon, np.inf, k)
+
+
+def test_in_bbox_matches_brute_force(bays):
+    index = BayIndex(bays, cell_m=100)
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        lat, lon = CENTER[0] + rng.uniform(-0.025, 0.025), CENTER[1] + rng.uniform(-0.03, 0.03)
+        dlat, dlon = rng.uniform(0, 0.01), rng.uniform(0, 0.01)
+        limit = int(rng.choice([10, 100, 5000]))
+        box = (lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        inside = bays[bays["lon"].between(box[0], box[2]) & bays["lat"].between(box[1], box[3])]
+        want = sorted(inside["bay_id"])[:limit]
+        assert index.in_bbox(*box, limit)["bay_id"].tolist() == want
+
+
+def test_snapshot_keeps_latest_timestamped_row(tmp_path):
+    path = tmp_path / "sensors.csv"
+    pd.DataFrame({
+        "kerbsideid": [1, 1, 1, 2],
+        "location.lat": [-37.81] * 4,
+        "location.lon": [144.96] * 4,
+        "status_description": ["Present", "Unoccupied", "Present", "Unoccupied"],
+        "status_timestamp": ["2024-05-01T10:00:00+00:00", "2024-05-01T11:00:00+00:00", "", ""],
+    }).to_csv(path, index=False)
+    df = load_snapshot(path).set_index("bay_id")
+    assert not df.loc[1, "is_occupied"]                 # 11:00 那条，不是没有时间的那条
+    assert df.loc[1, "status_timestamp"] == pd.Timestamp("2024-05-01 11:00", tz="UTC")
+    assert pd.isna(df.loc[2, "status_timestamp"])       # 只有没有时间的记录也保留
+
+
+def test_empty_index(bays):
+    index = BayIndex(bays.iloc[:0])
+    assert len(index) == 0
+    assert index.within(*CENTER, 500, 10).empty
+    assert index.nearest(*CENTER, 5).empty
+    assert index.in_bbox(144.9, -37.9, 145.0, -37.7).empty
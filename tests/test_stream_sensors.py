@@ -0,0 +1,28 @@
+# tests/test_stream_sensors.py
+import queue
+import threading
+
+import stream_sensors
+
+
+def test_producer_stops_when_writer_fails(monkeypatch):
+    """写库线程不再取数据时，抓取线程不能一直阻塞在满的队列上"""
+    def pages(*args, **kwargs):
+        i = 0
+        while True:
+            yield i, [{"kerbsideid": i, "status_description": "Present",
+                       "status_timestamp": "2025-01-01T00:00:00+00:00",
+                       "location": {"lat": -37.8, "lon": 144.9}}]
+            i += 1
+
+    monkeypatch.setattr(stream_sensors, "iter_pages", pages)
+    monkeypatch.setattr(stream_sensors, "PUT_POLL_S", 0.05)
+    q = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    th = threading.Thread(target=stream_sensors._producer, daemon=True,
+                          args=(q, stop, None, 1, None, None, "http://unused"))
+    th.start()
+    q.get()            # 写库线程取了一页之后就出错退出
+    stop.set()
+    th.join(timeout=5)
+    assert not th.is_alive()